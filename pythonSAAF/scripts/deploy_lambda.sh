@@ -1,13 +1,15 @@
 #!/bin/bash
 # AWS Lambda Deployment Script
-# Usage: ./deploy_lambda.sh [FUNCTION_NAME]
+# Usage: ./deploy_lambda.sh [FUNCTION_NAME] [AUDIO_CACHE_BUCKET]
+#   With AUDIO_CACHE_BUCKET, a daily EventBridge rule evicts that bucket's audio cache.
 
 # Configuration
 FUNCTION_NAME="${1:-ProcessS3Uploads}"  # Default Lambda function name
+AUDIO_CACHE_BUCKET="$2"                 # Bucket whose audio cache is evicted daily (optional)
 RUNTIME="python3.13"                    # Lambda runtime
 HANDLER="handler.lambda_handler"        # Lambda handler
 MEMORY_SIZE=512                         # Memory size in MB
-TIMEOUT=3                               # Timeout in seconds
+TIMEOUT=300                             # Timeout in seconds (chunked synthesis waits for Polly)
 SRC_DIR="/home/joser27/Documents/code/talkify/pythonSAAF/src"
 DEPLOY_ZIP="lambda_function.zip"        # Deployment package name
 
@@ -37,6 +39,27 @@ aws lambda update-function-configuration \
     --memory-size "$MEMORY_SIZE" \
     --timeout "$TIMEOUT"
 
+if [ -n "$AUDIO_CACHE_BUCKET" ]; then
+    echo "🗓️ Scheduling daily audio cache eviction for $AUDIO_CACHE_BUCKET..."
+    RULE_NAME="$FUNCTION_NAME-audio-cache-evict"
+    RULE_ARN=$(aws events put-rule \
+        --name "$RULE_NAME" \
+        --schedule-expression "rate(1 day)" \
+        --query RuleArn --output text)
+    aws lambda add-permission \
+        --function-name "$FUNCTION_NAME" \
+        --statement-id "$RULE_NAME" \
+        --action lambda:InvokeFunction \
+        --principal events.amazonaws.com \
+        --source-arn "$RULE_ARN" > /dev/null 2>&1 || true
+    FUNCTION_ARN=$(aws lambda get-function --function-name "$FUNCTION_NAME" \
+        --query Configuration.FunctionArn --output text)
+    INPUT="{\\\"audio_cache_evict\\\": {\\\"bucket\\\": \\\"$AUDIO_CACHE_BUCKET\\\"}}"
+    aws events put-targets \
+        --rule "$RULE_NAME" \
+        --targets "[{\"Id\": \"evict\", \"Arn\": \"$FUNCTION_ARN\", \"Input\": \"$INPUT\"}]"
+fi
+
 # Cleanup
 echo "🧹 Cleaning up..."
 rm "$DEPLOY_ZIP"
@@ -1,11 +1,20 @@
+import base64
+import functools
 import json
 import logging
 import os
+import random
 import subprocess
 import re
+import resource
 import uuid
 import shlex
+import sys
+import threading
 import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
 
 #
 # Execute a bash command and get the output.
@@ -16,12 +25,334 @@ import time
 def runCommand(command):
     return os.popen(command).read()
 
+#
+# Read a small system file, returning an empty string if it does not exist.
+#
+# @param path The file to read.
+# @return The contents of the file.
+#
+def readFile(path):
+    try:
+        with open(path, 'r') as file:
+            return file.read()
+    except OSError:
+        return ""
+
 #
 # Global variables that will persist through multiple invocations.
 #
 invocations = 0
 initialization_time = int(round(time.time() * 1000))
-ticks_per_second = int(runCommand("getconf CLK_TCK"))
+ticks_per_second = os.sysconf('SC_CLK_TCK')
+
+#
+# Host facts that cannot change during a container's lifetime (the parsed
+# /proc/cpuinfo and the detected platform), keyed by container uuid and
+# collected by the first Inspector of the container.
+#
+containerUuid = None
+staticInspection = {}
+
+#
+# Sampled profiling. One in profileEvery invocations, chosen at random, has
+# the stacks of all its threads sampled every profileInterval seconds; 0
+# turns profiling off and costs nothing. The profileTop functions by
+# cumulative time are added to the output, and written to profileDir when set.
+#
+profileEvery = int(os.environ.get('INSPECTOR_PROFILE_EVERY', 0))
+profileInterval = float(os.environ.get('INSPECTOR_PROFILE_INTERVAL_MS', 10)) / 1000
+profileTop = int(os.environ.get('INSPECTOR_PROFILE_TOP', 20))
+profileDir = os.environ.get('INSPECTOR_PROFILE_DIR', '')
+
+#
+# The Inspector of the current invocation, used by the module-level span and
+# traced helpers so instrumented code does not need a reference to it.
+#
+activeInspector = None
+
+#
+# Trace a block of code as a span of the active Inspector. Does nothing when
+# no Inspector is active.
+#
+# @param name The name of the span.
+# @param parent A span from another thread to nest this span under.
+#
+@contextmanager
+def span(name, parent=None):
+    inspector = activeInspector
+    if inspector is None:
+        yield None
+    else:
+        with inspector.span(name, parent) as record:
+            yield record
+
+#
+# Decorator that traces every call of a function as a span of the active Inspector.
+#
+# @param name The name of the span, the function name by default.
+#
+def traced(name=None):
+    def decorator(function):
+        spanName = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if activeInspector is None:
+                return function(*args, **kwargs)
+            with activeInspector.span(spanName):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+#
+# The innermost open span of the active Inspector on this thread, for handing to
+# spans opened on worker threads.
+#
+def currentSpan():
+    inspector = activeInspector
+    return inspector.currentSpan() if inspector is not None else None
+
+#
+# Resource usage of this process plus its finished child processes, such as
+# page extraction workers: (user ms, kernel ms, minor faults, major faults).
+#
+def resourceUsage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ((own.ru_utime + children.ru_utime) * 1000,
+            (own.ru_stime + children.ru_stime) * 1000,
+            own.ru_minflt + children.ru_minflt,
+            own.ru_majflt + children.ru_majflt)
+
+#
+# Lambda allocates CPU in proportion to memory: one vCPU at 1769 MB.
+#
+MB_PER_VCPU = 1769
+
+CPU_VALUES = ["cpuUser", "cpuNice", "cpuKernel", "cpuIdle", "cpuIOWait", "cpuIrq", "cpuSoftIrq", "cpuSteal", "cpuGuest", "cpuGuestNice"]
+
+#
+# Column-oriented storage for /proc/stat polls.
+#
+# Every counter of every row (cpuTotal, cpu0..cpuN for each of CPU_VALUES, and
+# the first value of rows such as ctxt and btime) gets its own preallocated
+# int64 array of raw values, with one more array for the poll timestamps.
+# Arrays grow by doubling, so a poll appends a handful of integers instead of
+# building a nested dict. The layout is fixed by the first poll.
+#
+class CPUPollColumns:
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.capacity = capacity
+        self.titles = None
+        self.names = None
+        self.index = {}
+        self.times = array('q', bytes(8 * capacity))
+        self.columns = []
+
+    #
+    # Parse one read of /proc/stat and append it.
+    #
+    # @param timeStamp The time of the poll in milliseconds.
+    # @param stats The contents of /proc/stat.
+    #
+    def append(self, timeStamp, stats):
+        titles = []
+        values = []
+        width = len(CPU_VALUES)
+        for line in stats.split('\n'):
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            title = fields[0]
+            titles.append(title)
+            if "cpu" in title:
+                counters = fields[1:width + 1]
+                values.extend(map(int, counters))
+                if len(counters) < width:
+                    values.extend([0] * (width - len(counters)))
+            else:
+                values.append(int(fields[1]))
+
+        if self.names is None:
+            self.titles = titles
+            self.names = self.__columnNames(titles)
+            self.index = {name: i for i, name in enumerate(self.names)}
+            self.columns = [array('q', bytes(8 * self.capacity)) for _ in self.names]
+        elif titles != self.titles:
+            byName = dict(zip(self.__columnNames(titles), values))
+            values = [byName.get(name, 0) for name in self.names]
+
+        if self.count == self.capacity:
+            for column in [self.times] + self.columns:
+                column.extend(array('q', bytes(8 * self.capacity)))
+            self.capacity *= 2
+
+        self.times[self.count] = timeStamp
+        for column, value in zip(self.columns, values):
+            column[self.count] = value
+        self.count += 1
+
+    @staticmethod
+    def __columnNames(titles):
+        names = []
+        for title in titles:
+            if "cpu" in title:
+                title = "cpuTotal" if title == "cpu" else title
+                names.extend(title + "." + metric for metric in CPU_VALUES)
+            else:
+                names.append(title)
+        return names
+
+    #
+    # Get a raw value from a poll.
+    #
+    # @param poll The poll index; negative values count from the end.
+    # @param name A column name such as "cpuTotal.cpuUser" or "btime".
+    #
+    def value(self, poll, name):
+        if poll < 0:
+            poll += self.count
+        return self.columns[self.index[name]][poll]
+
+    #
+    # Difference between two polls for every column at once.
+    #
+    # @return A dictionary of column name to raw delta.
+    #
+    def deltas(self, first=0, last=-1):
+        if last < 0:
+            last += self.count
+        return {name: column[last] - column[first] for name, column in zip(self.names, self.columns)}
+
+    #
+    # Expand the polls into the dict-per-poll format used by earlier versions.
+    #
+    def toDicts(self, tickRate):
+        polls = []
+        for poll in range(self.count):
+            data = {"time": self.times[poll]}
+            for name, column in zip(self.names, self.columns):
+                if "." in name:
+                    title, metric = name.split(".")
+                    data.setdefault(title, {})[metric] = column[poll] * tickRate
+                else:
+                    data[name] = column[poll]
+            polls.append(data)
+        return polls
+
+    #
+    # Compact serialized form: each column as base64 of little-endian int64 values.
+    # CPU columns hold clock ticks; multiply by 1000 / ticksPerSecond for milliseconds.
+    #
+    def pack(self, ticksPerSecond):
+        def encode(column):
+            values = column[:self.count]
+            if sys.byteorder != 'little':
+                values.byteswap()
+            return base64.b64encode(values.tobytes()).decode('ascii')
+
+        return {
+            "count": self.count,
+            "ticksPerSecond": ticksPerSecond,
+            "encoding": "base64-int64-le",
+            "time": encode(self.times),
+            "columns": {name: encode(column) for name, column in zip(self.names or [], self.columns)}
+        }
+
+    #
+    # Rebuild a column of integers from its packed form.
+    #
+    @staticmethod
+    def unpack(encoded):
+        values = array('q')
+        values.frombytes(base64.b64decode(encoded))
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return values.tolist()
+
+#
+# Statistical profiler that samples the Python stack of every other thread.
+#
+# Each sample counts the innermost function of a stack as running (self time)
+# and every function on the stack as active (cumulative time). Threads parked
+# in a wait, such as idle pool workers, are skipped so they do not crowd out
+# the functions doing work, and the thread start-up frames every stack shares
+# are left out. Code in forked worker processes is not sampled.
+#
+class StackSampler:
+
+    IDLE_FUNCTIONS = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("thread.py", "_worker"),
+                      ("queue.py", "get"), ("selectors.py", "select"), ("socketserver.py", "serve_forever")}
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = 0
+        self.selfCounts = {}
+        self.totalCounts = {}
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="saaf-profiler", daemon=True)
+
+    def start(self):
+        self.__wallStart = time.perf_counter()
+        self.__thread.start()
+
+    def __run(self):
+        cpuStart = time.thread_time()
+        own = threading.get_ident()
+        while not self.__stop.wait(self.interval):
+            for threadId, frame in sys._current_frames().items():
+                if threadId != own:
+                    self.__count(frame)
+            self.samples += 1
+        self.cpuTime = time.thread_time() - cpuStart
+
+    def __count(self, frame):
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in self.IDLE_FUNCTIONS:
+            return
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        self.selfCounts[key] = self.selfCounts.get(key, 0) + 1
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if key not in seen and code.co_filename != threading.__file__:
+                seen.add(key)
+                self.totalCounts[key] = self.totalCounts.get(key, 0) + 1
+            frame = frame.f_back
+
+    #
+    # Stop sampling and summarize the hottest functions.
+    #
+    # Times are thread time in milliseconds, estimated from the number of
+    # samples a function was seen in, so threads running side by side add up.
+    #
+    # @param top Number of functions to report, by cumulative time.
+    # @return The profile summary.
+    #
+    def stop(self, top):
+        self.__stop.set()
+        self.__thread.join()
+        wallTime = time.perf_counter() - self.__wallStart
+        msPerSample = 1000 * wallTime / self.samples if self.samples else 0
+        functions = []
+        for key in sorted(self.totalCounts, key=self.totalCounts.get, reverse=True)[:top]:
+            fileName, line, name = key
+            functions.append({
+                "function": name,
+                "file": "/".join(fileName.split(os.sep)[-2:]),
+                "line": line,
+                "cumulative": round(self.totalCounts[key] * msPerSample, 1),
+                "self": round(self.selfCounts.get(key, 0) * msPerSample, 1)
+            })
+        return {
+            "samples": self.samples,
+            "interval": self.interval,
+            "overhead": round(100.0 * self.cpuTime / wallTime, 3) if wallTime > 0 else 0,
+            "functions": functions
+        }
 
 #
 # SAAF
@@ -41,7 +372,9 @@ class Inspector:
     def __init__(self):
         global invocations
         global initialization_time
+        global activeInspector
         invocations += 1
+        activeInspector = self
         
         self.__startTime = int(round(time.time() * 1000))
         self.__attributes = {
@@ -52,7 +385,7 @@ class Inspector:
             "initializationTime": initialization_time
         }
 
-        self.__cpuPolls = []
+        self.__cpuPolls = CPUPollColumns()
         self.__memoryPolls = []
         self.__networkPolls = []
 
@@ -66,6 +399,15 @@ class Inspector:
         self.__inspectedPlatformDelta = False
         self.__inspectedLinux = False
         self.__inspectedLinuxDelta = False
+
+        self.__sampler = None
+        self.__profiler = None
+
+        self.__spans = []
+        self.__spanStack = threading.local()
+
+        if profileEvery > 0 and random.random() * profileEvery < 1:
+            self.startProfiler()
         
     #
     # Collect information about the runtime container.
@@ -74,11 +416,15 @@ class Inspector:
     # newcontainer:    Whether a container is new (no assigned uuid) or if it has been used before.
     #
     def inspectContainer(self):
+        global containerUuid
         self.__inspectedContainer = True
 
         myUuid = ''
         newContainer = 1
-        if os.path.isfile('/tmp/container-id'):
+        if containerUuid is not None:
+            myUuid = containerUuid
+            newContainer = 0
+        elif os.path.isfile('/tmp/container-id'):
             stampFile = open('/tmp/container-id', 'r')
             stampID = stampFile.readline()
             myUuid = stampID
@@ -90,8 +436,20 @@ class Inspector:
             stampFile.write(myUuid)
             stampFile.close()
             
+        containerUuid = myUuid
         self.__attributes['uuid'] = myUuid
         self.__attributes['newcontainer'] = newContainer
+
+    #
+    # The cached host facts of this container. The container uuid is read
+    # without adding the container attributes if inspectContainer has not run;
+    # with no uuid at all nothing is cached.
+    #
+    def __staticInspection(self):
+        myUuid = containerUuid or readFile('/tmp/container-id').strip()
+        if not myUuid:
+            return None, {}
+        return myUuid, staticInspection.setdefault(myUuid, {})
         
         
     #
@@ -101,8 +459,22 @@ class Inspector:
     # cpuModel:    The model number of the CPU.
     # cpuCores:     The number of vCPUs allocated to the function.
     # cpuInfo:    Detailed information about all aspects of the CPU.
+    # cpuInfoRef:  Replaces cpuInfo after the first invocation of a container: the
+    #              container uuid whose first report carries the full cpuInfo.
     #
-    def inspectCPUInfo(self):
+    # /proc/cpuinfo is parsed once per container; pass full=True to report the
+    # complete cpuInfo on later invocations too.
+    #
+    def inspectCPUInfo(self, full=False):
+        myUuid, cached = self.__staticInspection()
+        if 'cpuInfo' in cached:
+            self.__attributes.update(cached['cpuInfo'])
+            if full:
+                self.__attributes['cpuInfo'] = cached['cpuInfoList']
+            else:
+                self.__attributes['cpuInfoRef'] = myUuid
+            return
+
         with open('/proc/cpuinfo', 'r') as file:
             cpuInfo = file.read()
         lines = cpuInfo.split('\n')
@@ -142,41 +514,19 @@ class Inspector:
             self.__attributes['architecture'] = "arm64"
         self.__attributes['cpuCores'] = int(cpu_count)
         self.__attributes['cpuInfo'] = core_list
+
+        cached['cpuInfo'] = {key: self.__attributes[key] for key in ('cpuType', 'cpuModel', 'architecture', 'cpuCores')
+                             if key in self.__attributes}
+        cached['cpuInfoList'] = core_list
         
     #
     # Collect timing CPU metrics
     #
     def pollCPUStats(self):
-        global ticks_per_second
-        
         timeStamp = int(round(time.time() * 1000))
-
-        cpuValues = ["cpuUser", "cpuNice", "cpuKernel", "cpuIdle", "cpuIOWait", "cpuIrq", "cpuSoftIrq", "cpuSteal", "cpuGuest", "cpuGuestNice"]
-        data = {"time": timeStamp}
-        
-        tick_rate = 1000 / ticks_per_second
-
         with open('/proc/stat', 'r') as file:
             stats = file.read()
-        lines = stats.split('\n')
-        lines[0] = lines[0].replace("cpu  ", "cpuTotal ")
-        
-        for line in lines:
-            values = line.split(" ")
-            title = values[0].strip()
-            
-            if ("cpu" in title):
-                index = 1
-                stats = {}
-                for value in cpuValues:
-                    stats[value] = int(values[index]) * (tick_rate)
-                    index += 1
-                data[title] = stats
-            else:
-                if len(values) >= 2:
-                    data[title] = int(values[1])
-                    
-        self.__cpuPolls.append(data)
+        self.__cpuPolls.append(timeStamp, stats)
         
         
     #
@@ -197,11 +547,11 @@ class Inspector:
 
         self.pollCPUStats()
 
-        CPUMetrics = ["cpuUser", "cpuNice", "cpuKernel", "cpuIdle", "cpuIOWait", "cpuIrq", "cpuSoftIrq", "cpuSteal", "cpuGuest", "cpuGuestNice"]
-        for metric in CPUMetrics:
-            self.__attributes[metric] = self.__cpuPolls[0]['cpuTotal'][metric]
+        tickRate = 1000 / ticks_per_second
+        for metric in CPU_VALUES:
+            self.__attributes[metric] = self.__cpuPolls.value(0, "cpuTotal." + metric) * tickRate
 
-        self.__attributes['bootTime'] = self.__cpuPolls[0]['btime']
+        self.__attributes['bootTime'] = self.__cpuPolls.value(0, 'btime')
     #
     # Compare information gained from inspectCPU to the current CPU metrics.
     #
@@ -223,22 +573,24 @@ class Inspector:
             self.__inspectedCPUDelta = True
             
             self.pollCPUStats()
-            totalPolls = len(self.__cpuPolls)
+            deltas = self.__cpuPolls.deltas()
             
-            CPUMetrics = ["cpuUser", "cpuNice", "cpuKernel", "cpuIdle", "cpuIOWait", "cpuIrq", "cpuSoftIrq", "cpuSteal", "cpuGuest", "cpuGuestNice"]
-            CPUTotal = 0
-            for metric in CPUMetrics:
-                value = self.__cpuPolls[totalPolls - 1]['cpuTotal'][metric]  - self.__cpuPolls[0]['cpuTotal'][metric]
-                self.__attributes[metric + "Delta"] = value
-                CPUTotal += value
+            tickRate = 1000 / ticks_per_second
+            for metric in CPU_VALUES:
+                self.__attributes[metric + "Delta"] = deltas["cpuTotal." + metric] * tickRate
         else:
             self.__attributes['SAAFCPUDeltaError'] = "CPU not inspected before collecting deltas!"
 
     #
     # Make CPU polls accessible to the function.
     #
-    def processCPUPolls(self):
-        self.__attributes['cpuPolls'] = self.__cpuPolls
+    # @param compact Emit the packed columnar form instead of one dictionary per poll.
+    #
+    def processCPUPolls(self, compact=False):
+        if compact:
+            self.__attributes['cpuPolls'] = self.__cpuPolls.pack(ticks_per_second)
+        else:
+            self.__attributes['cpuPolls'] = self.__cpuPolls.toDicts(1000 / ticks_per_second)
 
     #
     # Inspects /proc/meminfo and /proc/vmstat. Add memory specific attributes:
@@ -307,54 +659,65 @@ class Inspector:
     def inspectPlatform(self):
         self.__inspectedPlatform = True
 
+        myUuid, cached = self.__staticInspection()
+        if 'platform' in cached:
+            self.__attributes.update(cached['platform'])
+            return
+
+        platform = {}
         key = os.environ.get('AWS_LAMBDA_LOG_STREAM_NAME', None)
         if (key != None):
-            self.__attributes['platform'] = "AWS Lambda"
-            self.__attributes['containerID'] = key
-            self.__attributes['functionName'] = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', None)
-            self.__attributes['functionMemory'] = os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', None)
-            self.__attributes['functionRegion'] = os.environ.get('AWS_REGION', None)
-
-            vmID = runCommand('cat /proc/self/cgroup | grep 2:cpu').replace('\n', '')
-            self.__attributes['vmID'] = vmID[20: 26]
+            platform['platform'] = "AWS Lambda"
+            platform['containerID'] = key
+            platform['functionName'] = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', None)
+            platform['functionMemory'] = os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', None)
+            platform['functionRegion'] = os.environ.get('AWS_REGION', None)
+
+            vmID = next((line for line in readFile('/proc/self/cgroup').split('\n') if '2:cpu' in line), '')
+            platform['vmID'] = vmID[20: 26]
         else:
             key = os.environ.get('X_GOOGLE_FUNCTION_NAME', None)
             if (key != None):
-                self.__attributes['platform'] = "Google Cloud Functions"
-                self.__attributes['functionName'] = key
-                self.__attributes['functionMemory'] = os.environ.get('X_GOOGLE_FUNCTION_MEMORY_MB', None)
-                self.__attributes['functionRegion'] = os.environ.get('X_GOOGLE_FUNCTION_REGION', None)
+                platform['platform'] = "Google Cloud Functions"
+                platform['functionName'] = key
+                platform['functionMemory'] = os.environ.get('X_GOOGLE_FUNCTION_MEMORY_MB', None)
+                platform['functionRegion'] = os.environ.get('X_GOOGLE_FUNCTION_REGION', None)
             else:
                 key = os.environ.get('__OW_ACTION_NAME', None)
                 if (key != None):
-                    self.__attributes['platform'] = "IBM Cloud Functions"
-                    self.__attributes['functionName'] = key
-                    self.__attributes['functionRegion'] = os.environ.get('__OW_API_HOST', None)
-                    self.__attributes["vmID"] = runCommand("cat /sys/hypervisor/uuid").strip()
+                    platform['platform'] = "IBM Cloud Functions"
+                    platform['functionName'] = key
+                    platform['functionRegion'] = os.environ.get('__OW_API_HOST', None)
+                    platform["vmID"] = readFile("/sys/hypervisor/uuid").strip()
 
                 else:
                     key = os.environ.get('CONTAINER_NAME', None)
                     if (key != None):
-                        self.__attributes['platform'] = "Azure Functions"
-                        self.__attributes['containerID'] = key
-                        self.__attributes['functionName'] = os.environ.get('WEBSITE_SITE_NAME', None)
-                        self.__attributes['functionRegion'] = os.environ.get('Location', None)
+                        platform['platform'] = "Azure Functions"
+                        platform['containerID'] = key
+                        platform['functionName'] = os.environ.get('WEBSITE_SITE_NAME', None)
+                        platform['functionRegion'] = os.environ.get('Location', None)
                     else:
                         key = os.environ.get('KUBERNETES_SERVICE_PORT_HTTPS', None)
                         if (key != None):
-                            self.__attributes['platform'] = "OpenFaaS EKS"
-                            self.__attributes['http_host'] = os.environ.get('Http_Host', None)
-                            self.__attributes['http_foward'] = os.environ.get('Http_X_Forwarded_For', None)
-                            self.__attributes['http_start_time'] = os.environ.get('Http_X_Start_Time', None)
-                            self.__attributes['host_name'] = os.environ.get('HOSTNAME', None)
+                            platform['platform'] = "OpenFaaS EKS"
+                            platform['http_host'] = os.environ.get('Http_Host', None)
+                            platform['http_foward'] = os.environ.get('Http_X_Forwarded_For', None)
+                            platform['http_start_time'] = os.environ.get('Http_X_Start_Time', None)
+                            platform['host_name'] = os.environ.get('HOSTNAME', None)
                         else:
-                            self.__attributes['platform'] = "Unknown Platform"
+                            platform['platform'] = "Unknown Platform"
+
+        # OpenFaaS passes request headers through the environment, so only cache other platforms
+        if platform['platform'] != "OpenFaaS EKS":
+            cached['platform'] = platform
+        self.__attributes.update(platform)
     
     def __recommendConfiguration(self):
         try:
             if (self.__inspectedPlatform and self.__inspectedCPUDelta):
                 if self.__attributes['platform'] == "AWS Lambda":
-                    availableCPUs = int(self.__attributes['functionMemory']) / 1792
+                    availableCPUs = int(self.__attributes['functionMemory']) / MB_PER_VCPU
                     self.__attributes['availableCPUs'] = round(availableCPUs, 3)
                     utilizedCPUs = (self.__attributes['cpuUserDelta'] +
                                     self.__attributes['cpuKernelDelta']) / self.__attributes['userRuntime']
@@ -371,22 +734,27 @@ class Inspector:
     #
     # Collect information about the linux kernel.
     #
-    # linuxVersion:    The version of the linux kernel.
+    # linuxVersion:    The version of the linux kernel, formatted like uname -a.
     #
     def inspectLinux(self):
         self.__inspectedLinux = True
-        self.__attributes['linuxVersion'] = runCommand('uname -a').replace('\n', '')
+        name = os.uname()
+        self.__attributes['linuxVersion'] = " ".join([name.sysname, name.nodename, name.release, name.version, name.machine])
         
     #
     # Run all data collection methods and record framework runtime.
     #
+    # inspectAllRuntime: Time spent in inspectAll in milliseconds, with sub-millisecond precision.
+    #
     def inspectAll(self):
+        inspectStart = time.perf_counter()
         self.inspectContainer()
         self.inspectCPUInfo()
         self.inspectPlatform()
         self.inspectLinux()
         self.inspectMemory()
         self.inspectCPU()
+        self.__attributes['inspectAllRuntime'] = round((time.perf_counter() - inspectStart) * 1000, 3)
         self.addTimeStamp("frameworkRuntime")
 
     #
@@ -405,6 +773,213 @@ class Inspector:
         self.__recommendConfiguration()
         self.addTimeStamp("frameworkRuntimeDeltas", deltaTime)
         
+    #
+    # Start an opt-in background thread that samples /proc/stat and /proc/meminfo
+    # into a bounded ring buffer until stopSampler or finish is called.
+    #
+    # The sampler keeps its own CPU use under 1% of one core: the wait between
+    # samples is stretched whenever the previous round of sampling cost more
+    # than 0.5% of it, leaving headroom for thread wake-ups.
+    #
+    # @param interval Seconds between samples.
+    # @param capacity Maximum number of samples kept; the oldest are dropped first.
+    #
+    def startSampler(self, interval=0.1, capacity=6000):
+        if self.__sampler is not None:
+            return
+        self.__samplerInterval = interval
+        self.__samples = deque(maxlen=capacity)
+        self.__samplerStop = threading.Event()
+        self.__samplerCPUTime = 0.0
+        self.__samplerWallTime = 0.0
+        self.__sampler = threading.Thread(target=self.__runSampler, name="saaf-sampler", daemon=True)
+        self.__sampler.start()
+
+    def __runSampler(self):
+        cpuStart = time.thread_time()
+        wallStart = time.perf_counter()
+        roundStart = cpuStart
+        while True:
+            self.__samples.append(self.__readSample())
+            roundEnd = time.thread_time()
+            wait = max(self.__samplerInterval, (roundEnd - roundStart) / 0.005)
+            roundStart = roundEnd
+            if self.__samplerStop.wait(wait):
+                break
+        self.__samples.append(self.__readSample())
+        self.__samplerCPUTime = time.thread_time() - cpuStart
+        self.__samplerWallTime = time.perf_counter() - wallStart
+
+    #
+    # Read one sample: (time in ms, total CPU ticks, idle CPU ticks, used memory in kB).
+    #
+    def __readSample(self):
+        with open('/proc/stat', 'r') as file:
+            cpuTotal = file.readline().split()[1:]
+        ticks = [int(value) for value in cpuTotal]
+        memory = {}
+        with open('/proc/meminfo', 'r') as file:
+            for _ in range(3):
+                key, value = file.readline().split(':')
+                memory[key] = int(value.replace("kB", "").strip())
+        memoryUsed = memory['MemTotal'] - memory.get('MemAvailable', memory['MemFree'])
+        # idle and iowait are the 4th and 5th columns of the cpu line
+        return (time.time() * 1000, sum(ticks), ticks[3] + ticks[4], memoryUsed)
+
+    #
+    # Stop the background sampler and add its results to the output.
+    #
+    # samplerSamples:      Number of samples collected (after ring buffer eviction).
+    # samplerOverhead:     CPU time used by the sampler as a percentage of its wall time.
+    # cpuUtilizationPeak:  Highest utilization of all CPUs between two samples, in percent.
+    # cpuUtilizationAvg:   Average utilization of all CPUs while sampling, in percent.
+    # memoryUsedPeak:      Highest used memory in kB.
+    # memoryUsedAvg:       Average used memory in kB.
+    # samplerTimeSeries:   Samples averaged down to at most `points` entries.
+    #
+    # @param points Maximum length of the emitted time series.
+    #
+    def stopSampler(self, points=60):
+        if self.__sampler is None:
+            return
+        self.__samplerStop.set()
+        self.__sampler.join()
+        self.__sampler = None
+
+        samples = list(self.__samples)
+        times = []
+        utilization = []
+        memory = []
+        for previous, current in zip(samples, samples[1:]):
+            totalDelta = current[1] - previous[1]
+            busyDelta = totalDelta - (current[2] - previous[2])
+            times.append(int(current[0] - self.__startTime))
+            utilization.append(100.0 * busyDelta / totalDelta if totalDelta > 0 else 0.0)
+            memory.append(current[3])
+
+        self.__attributes['samplerSamples'] = len(samples)
+        self.__attributes['samplerInterval'] = self.__samplerInterval
+        if self.__samplerWallTime > 0:
+            self.__attributes['samplerOverhead'] = round(100.0 * self.__samplerCPUTime / self.__samplerWallTime, 3)
+        if utilization:
+            self.__attributes['cpuUtilizationPeak'] = round(max(utilization), 1)
+            self.__attributes['cpuUtilizationAvg'] = round(sum(utilization) / len(utilization), 1)
+            self.__attributes['memoryUsedPeak'] = max(memory)
+            self.__attributes['memoryUsedAvg'] = int(sum(memory) / len(memory))
+
+        bucketSize = max(1, -(-len(times) // points))
+        series = {"time": [], "cpuUtilization": [], "memoryUsed": []}
+        for start in range(0, len(times), bucketSize):
+            end = start + bucketSize
+            series["time"].append(times[min(end, len(times)) - 1])
+            series["cpuUtilization"].append(round(sum(utilization[start:end]) / len(utilization[start:end]), 1))
+            series["memoryUsed"].append(max(memory[start:end]))
+        self.__attributes['samplerTimeSeries'] = series
+
+    #
+    # Start the statistical profiler for this invocation; finish stops it. The
+    # profiler is started automatically for a sample of invocations when
+    # INSPECTOR_PROFILE_EVERY is set.
+    #
+    # @param interval Seconds between stack samples.
+    #
+    def startProfiler(self, interval=None):
+        if self.__profiler is not None:
+            return
+        self.__profiler = StackSampler(interval or profileInterval)
+        self.__profiler.start()
+
+    #
+    # Stop the profiler and add its results to the output.
+    #
+    # profile:      Sample count, sampling interval, the profiler's CPU overhead
+    #               in percent and the top functions by cumulative time.
+    # profileFile:  Where the profile was written, when INSPECTOR_PROFILE_DIR is set.
+    #
+    # @param top Number of functions to report.
+    #
+    def stopProfiler(self, top=None):
+        if self.__profiler is None:
+            return
+        profile = self.__profiler.stop(top or profileTop)
+        self.__profiler = None
+        self.__attributes['profile'] = profile
+        if profileDir:
+            path = os.path.join(profileDir, f"profile-{self.__startTime}-{invocations}.json")
+            try:
+                os.makedirs(profileDir, exist_ok=True)
+                with open(path, 'w') as file:
+                    json.dump(profile, file)
+                self.__attributes['profileFile'] = path
+            except OSError as e:
+                logging.getLogger().warning(f"Could not write profile to {path}: {e}")
+
+    #
+    # Trace a stage of the function as a span. Spans opened inside another span
+    # on the same thread are nested under it; the finished tree is added to the
+    # output as 'spans' by finish.
+    #
+    # Each span records:
+    # start:            Milliseconds from Inspector initialization to the start of the span.
+    # runtime:          Wall time of the span in milliseconds.
+    # cpuUserDelta:     CPU time in user mode in milliseconds.
+    # cpuKernelDelta:   CPU time in kernel mode in milliseconds.
+    # pageFaultsDelta:  Minor page faults.
+    # majorPageFaultsDelta: Major page faults.
+    #
+    # CPU time and page faults are process wide, so spans running at the same
+    # time on different threads each include the others' work.
+    #
+    # @param name The name of the span.
+    # @param parent A span from another thread to nest this span under.
+    #
+    @contextmanager
+    def span(self, name, parent=None):
+        stack = self.__spanStack.__dict__.setdefault('spans', [])
+        if parent is None and stack:
+            parent = stack[-1]
+        record = {"name": name, "start": int(round(time.time() * 1000)) - self.__startTime}
+        if parent is None:
+            self.__spans.append(record)
+        else:
+            parent.setdefault("children", []).append(record)
+
+        stack.append(record)
+        startUsage = resourceUsage()
+        startTime = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            endUsage = resourceUsage()
+            record["runtime"] = round((time.perf_counter() - startTime) * 1000, 3)
+            record["cpuUserDelta"] = round(endUsage[0] - startUsage[0], 3)
+            record["cpuKernelDelta"] = round(endUsage[1] - startUsage[1], 3)
+            record["pageFaultsDelta"] = endUsage[2] - startUsage[2]
+            record["majorPageFaultsDelta"] = endUsage[3] - startUsage[3]
+            stack.pop()
+
+    #
+    # Decorator version of span for this Inspector.
+    #
+    def traced(self, name=None):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name or function.__name__):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    #
+    # The innermost open span on the calling thread, or None.
+    #
+    def currentSpan(self):
+        stack = getattr(self.__spanStack, 'spans', None)
+        return stack[-1] if stack else None
+
     #
     # Add a custom attribute to the output.
     #
@@ -443,6 +1018,13 @@ class Inspector:
     # @return Attributes collected by the Inspector.
     #
     def finish(self):
+        global activeInspector
+        self.stopSampler()
+        self.stopProfiler()
+        if self.__spans:
+            self.__attributes['spans'] = self.__spans
+        if activeInspector is self:
+            activeInspector = None
         self.addTimeStamp('runtime')
         self.__attributes['endTime'] = int(round(time.time() * 1000))
         return self.__attributes
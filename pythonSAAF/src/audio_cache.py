@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+
+CACHE_PREFIX = 'audio-cache'
+CACHE_ENABLED = os.environ.get('AUDIO_CACHE_ENABLED', 'false').lower() == 'true'
+
+# Entries unused for longer than the TTL are evicted, then the least recently
+# used ones until at most AUDIO_CACHE_MAX_ENTRIES remain. Eviction is run by a
+# scheduled event, not by document requests. An entry only points at audio a
+# document owns, so evicting it never removes audio from a playlist.
+CACHE_TTL = int(os.environ.get('AUDIO_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('AUDIO_CACHE_MAX_ENTRIES', 10000))
+
+# Refreshing last_access costs a PUT, so a hit only rewrites it this often.
+# The rewrite also moves the entry's LastModified, which eviction reads from
+# the listing instead of fetching every entry.
+TOUCH_INTERVAL = 24 * 3600
+
+PAGE_MARKER = re.compile(r'--- PAGE \d+(?: \(No text detected\))? ---')
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text):
+    """Reduce chunk text to what is spoken: no page markers and single spaces."""
+    return WHITESPACE.sub(' ', PAGE_MARKER.sub(' ', text)).strip()
+
+def cache_key(normalized_text, voice):
+    """Hash normalized text together with every setting that changes the audio."""
+    digest = hashlib.sha256()
+    for part in (voice['Engine'], voice['VoiceId'], voice['LanguageCode'], voice['OutputFormat'], normalized_text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def entry_key(key_hash):
+    return f"{CACHE_PREFIX}/{key_hash}.json"
+
+def lookup(s3, bucket_name, key_hash, now=None):
+    """Return the cache entry for a hash, or None if it is missing or expired."""
+    now = now or time.time()
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=entry_key(key_hash))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    entry = json.loads(response['Body'].read())
+    if now - entry['last_access'] > CACHE_TTL:
+        return None
+    if now - entry['last_access'] > TOUCH_INTERVAL:
+        entry['last_access'] = int(now)
+        _put_entry(s3, bucket_name, key_hash, entry)
+    return entry
+
+def copy_audio(s3, bucket_name, entry, output_key):
+    """
+    Copy the audio of a cache entry to `output_key`, so the document owns its copy.
+
+    @return False if the audio was deleted since the entry was stored.
+    """
+    try:
+        s3.copy_object(
+            Bucket=bucket_name,
+            Key=output_key,
+            CopySource={'Bucket': bucket_name, 'Key': entry['key']}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return False
+        raise
+    return True
+
+def store(s3, bucket_name, key_hash, audio_key, characters):
+    """Record synthesized audio so later chunks with the same text can reuse it."""
+    now = int(time.time())
+    entry = {
+        'key': audio_key,
+        'characters': characters,
+        'created': now,
+        'last_access': now
+    }
+    _put_entry(s3, bucket_name, key_hash, entry)
+    return entry
+
+def _put_entry(s3, bucket_name, key_hash, entry):
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=entry_key(key_hash),
+        Body=json.dumps(entry).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+def evict(s3, bucket_name, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, now=None):
+    """
+    Delete expired entries, then the least recently used ones beyond `max_entries`.
+
+    Only the cache prefix is listed: an entry was last used when it was last
+    written. The audio an entry points at belongs to the document it was
+    synthesized for and is left in place.
+
+    @return The number of entries removed.
+    """
+    now = now or time.time()
+    entries = []
+    paginator_args = {'Bucket': bucket_name, 'Prefix': f"{CACHE_PREFIX}/"}
+    while True:
+        response = s3.list_objects_v2(**paginator_args)
+        for item in response.get('Contents', []):
+            if item['Key'].endswith('.json'):
+                entries.append((item['LastModified'].timestamp(), item['Key']))
+        if not response.get('IsTruncated'):
+            break
+        paginator_args['ContinuationToken'] = response['NextContinuationToken']
+
+    entries.sort()
+    expired = [entry for entry in entries if now - entry[0] > ttl]
+    remaining = entries[len(expired):]
+    overflow = remaining[:max(0, len(remaining) - max_entries)]
+    for _, key in expired + overflow:
+        s3.delete_object(Bucket=bucket_name, Key=key)
+
+    removed = len(expired) + len(overflow)
+    if removed:
+        logger.info(f"Evicted {removed} audio cache entries ({len(expired)} expired)")
+    return removed
@@ -0,0 +1,41 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# Shared connection pool size; synthesis and batch workers run requests in parallel.
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 32))
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    retries={'max_attempts': 5, 'mode': 'standard'}
+)
+
+#
+# Clients are created on first use and then reused by every later call and
+# every warm invocation of the container.
+#
+_clients = {}
+_lock = threading.Lock()
+
+def get_client(service_name):
+    """Return the shared client for an AWS service, creating it on first use."""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = boto3.client(service_name, config=CLIENT_CONFIG)
+                _clients[service_name] = client
+    return client
+
+def set_client(service_name, client):
+    """Replace the shared client for a service, e.g. with a local stand-in."""
+    with _lock:
+        _clients[service_name] = client
+
+def reset_clients():
+    """Forget every shared client so the next call creates new ones."""
+    with _lock:
+        _clients.clear()
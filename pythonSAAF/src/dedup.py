@@ -0,0 +1,67 @@
+import json
+import logging
+import time
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+
+# Manifests are keyed by the SHA-256 of the PDF content. Pointers keyed by the
+# S3 ETag from the event let retries of the same upload skip the download too.
+MANIFEST_PREFIX = 'manifests/sha256'
+ETAG_PREFIX = 'manifests/etag'
+
+def manifest_key(content_hash):
+    return f"{MANIFEST_PREFIX}/{content_hash}.json"
+
+def etag_key(etag):
+    # Event ETags are unquoted but HeadObject/GetObject return them quoted.
+    etag = etag.strip('"')
+    return f"{ETAG_PREFIX}/{etag}.json"
+
+def _get_json(s3, bucket_name, key):
+    """Read a JSON object from S3, returning None if it does not exist."""
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(response['Body'].read())
+
+def _put_json(s3, bucket_name, key, value):
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=json.dumps(value).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+def find_manifest(s3, bucket_name, content_hash):
+    """Return the manifest for a document hash, or None if it has not been processed."""
+    manifest = _get_json(s3, bucket_name, manifest_key(content_hash))
+    if manifest is not None:
+        logger.info(f"Found manifest for sha256 {content_hash}")
+    return manifest
+
+def find_manifest_by_etag(s3, bucket_name, etag):
+    """Follow an ETag pointer to its manifest, or return None on a miss."""
+    if not etag:
+        return None
+    pointer = _get_json(s3, bucket_name, etag_key(etag))
+    if pointer is None:
+        return None
+    return find_manifest(s3, bucket_name, pointer['sha256'])
+
+def save_manifest(s3, bucket_name, content_hash, manifest, etag=None):
+    """Record a processed document under its hash and, if known, its ETag."""
+    manifest = dict(manifest, sha256=content_hash, created=int(time.time()))
+    _put_json(s3, bucket_name, manifest_key(content_hash), manifest)
+    if etag:
+        link_etag(s3, bucket_name, etag, content_hash)
+    logger.info(f"Saved manifest s3://{bucket_name}/{manifest_key(content_hash)}")
+    return manifest
+
+def link_etag(s3, bucket_name, etag, content_hash):
+    """Point an upload's ETag at the manifest for its content."""
+    _put_json(s3, bucket_name, etag_key(etag), {'sha256': content_hash})
@@ -0,0 +1,117 @@
+import logging
+import multiprocessing
+import os
+import threading
+
+try:
+    from .storage import map_file
+except ImportError:
+    from storage import map_file
+
+# Set up logging
+logger = logging.getLogger()
+
+# Documents shorter than this many pages per worker are not worth forking for.
+MIN_PAGES_PER_WORKER = 4
+
+def detect_cpu_cores():
+    """Count vCPUs the same way Inspector reports cpuCores, falling back to os.cpu_count()."""
+    try:
+        with open('/proc/cpuinfo', 'r') as file:
+            cores = sum(1 for line in file if line.split(':')[0].strip() == 'processor')
+    except OSError:
+        cores = 0
+    return cores or os.cpu_count() or 1
+
+def get_worker_count(num_pages):
+    """Pick the number of extraction processes for a document."""
+    workers = int(os.environ.get('EXTRACT_WORKERS', 0)) or detect_cpu_cores()
+    return max(1, min(workers, num_pages // MIN_PAGES_PER_WORKER))
+
+def get_start_method():
+    """
+    Pick how extraction workers are started.
+
+    A forked child gets only the forking thread, so a lock another thread
+    held at the time, e.g. in logging or botocore, is never released in the
+    child. Off the main thread, as when batched records are processed side by
+    side, workers come from a single-threaded fork server instead.
+    """
+    if threading.current_thread() is threading.main_thread():
+        return 'fork'
+    return 'forkserver'
+
+def open_pdf_reader(pdf_file):
+    """Open a PdfReader over a binary file object or mapping, importing PyPDF2 on first use."""
+    import PyPDF2
+    return PyPDF2.PdfReader(pdf_file)
+
+def _extract_pages(pdf_path, first, step, num_pages, conn):
+    """Worker process: extract every `step`-th page starting at `first` and send it to the parent."""
+    try:
+        with map_file(pdf_path) as pdf_file:
+            pdf_reader = open_pdf_reader(pdf_file)
+            for index in range(first, num_pages, step):
+                conn.send((index, pdf_reader.pages[index].extract_text()))
+    except Exception as e:
+        conn.send((None, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+def iter_extracted_pages(pdf_reader, pdf_path, workers=None):
+    """
+    Yield (page_num, page_text) for every page of a PDF, in page order.
+
+    Pages are dealt round-robin to a pool of worker processes, each of which
+    opens its own PdfReader over the file at `pdf_path`. Every worker streams
+    its pages back through a pipe and the pages are read back in order, so a
+    worker can only run ahead of the consumer by what fits in its pipe.
+    multiprocessing.Pool is not used because AWS Lambda has no /dev/shm for
+    its queues and semaphores; plain processes and pipes work there.
+    Workers are forked, or started by a fork server off the main thread.
+    """
+    num_pages = len(pdf_reader.pages)
+    if workers is None:
+        workers = get_worker_count(num_pages)
+    workers = min(workers, num_pages)
+
+    if workers <= 1:
+        for page_num, page in enumerate(pdf_reader.pages, start=1):
+            yield page_num, page.extract_text()
+        return
+
+    context = multiprocessing.get_context(get_start_method())
+    if context.get_start_method() == 'forkserver':
+        # Forked from the server with PyPDF2 already imported
+        context.set_forkserver_preload([__name__, 'PyPDF2'])
+    processes = []
+    connections = []
+    try:
+        for first in range(workers):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_extract_pages,
+                args=(pdf_path, first, workers, num_pages, sender),
+                daemon=True
+            )
+            process.start()
+            sender.close()
+            processes.append(process)
+            connections.append(receiver)
+        logger.info(f"Extracting {num_pages} pages with {workers} worker processes")
+
+        for index in range(num_pages):
+            try:
+                page_index, page_text = connections[index % workers].recv()
+            except EOFError:
+                page_index, page_text = None, "worker exited without sending its pages"
+            if page_index is None:
+                raise RuntimeError(f"Page extraction worker failed: {page_text}")
+            yield page_index + 1, page_text
+    finally:
+        for connection in connections:
+            connection.close()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
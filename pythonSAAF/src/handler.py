@@ -1,65 +1,382 @@
+import itertools
 import json
-import boto3
-import PyPDF2
-import io
 import logging
+import os
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
 
+try:
+    from .Inspector import Inspector, currentSpan, span, traced
+    from .audio_cache import CACHE_ENABLED, evict
+    from .clients import get_client
+    from .dedup import find_manifest, find_manifest_by_etag, link_etag, save_manifest
+    from .extraction import detect_cpu_cores, iter_extracted_pages, open_pdf_reader
+    from .metrics import FULL_INSPECTION, emitter
+    from .normalization import NORMALIZE_TEXT, TextNormalizer
+    from .ocr import OCR_ENABLED, recognize_pages
+    from .pipeline import Stage, fan_out
+    from .profiler import profiler
+    from .storage import LOCAL_OUTPUT_DIR, LocalStorage, PagedTextWriter, S3Storage, index_key_for, text_key_for
+    from .synthesis import (NOTIFY_TOPIC_ARN, POLL_INTERVAL, PROGRESSIVE_AUDIO, STITCH_AUDIO, OpeningSynthesizer,
+                            cache_stats, iter_text_chunks, output_key_from_task, save_playlist, split_pages,
+                            start_synthesis_task, stitch_audio, synthesize_chunks)
+    from .tracking import finalize_from_notification, get_tracker, status_key_for, write_status
+except ImportError:
+    from Inspector import Inspector, currentSpan, span, traced
+    from audio_cache import CACHE_ENABLED, evict
+    from clients import get_client
+    from dedup import find_manifest, find_manifest_by_etag, link_etag, save_manifest
+    from extraction import detect_cpu_cores, iter_extracted_pages, open_pdf_reader
+    from metrics import FULL_INSPECTION, emitter
+    from normalization import NORMALIZE_TEXT, TextNormalizer
+    from ocr import OCR_ENABLED, recognize_pages
+    from pipeline import Stage, fan_out
+    from profiler import profiler
+    from storage import LOCAL_OUTPUT_DIR, LocalStorage, PagedTextWriter, S3Storage, index_key_for, text_key_for
+    from synthesis import (NOTIFY_TOPIC_ARN, POLL_INTERVAL, PROGRESSIVE_AUDIO, STITCH_AUDIO, OpeningSynthesizer,
+                           cache_stats, iter_text_chunks, output_key_from_task, save_playlist, split_pages,
+                           start_synthesis_task, stitch_audio, synthesize_chunks)
+    from tracking import finalize_from_notification, get_tracker, status_key_for, write_status
+
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def generate_audio_and_url(text, bucket_name, key_base):
-    """Generate audio using Polly and create a presigned URL."""
+# Records of a batched event are processed concurrently by at most this many threads.
+MAX_RECORD_WORKERS = int(os.environ.get('MAX_RECORD_WORKERS', 4))
+
+# Seconds of the invocation's remaining time kept back to write the response.
+RESPONSE_MARGIN_SECONDS = 5
+
+@traced()
+def generate_audio_and_url(pages, bucket_name, key_base, opening=None, deadline=None):
+    """Generate audio using Polly and create a presigned URL.
+
+    `pages` yields the document's text a page at a time, and chunks go to Polly
+    as soon as they fill up, while later pages are still arriving. Text longer
+    than one synthesis chunk is split on page and sentence boundaries and
+    synthesized concurrently. The audio is then a playlist of the chunks, or
+    a single stitched MP3 when SYNTHESIS_STITCH is enabled. With the audio cache
+    enabled chunks follow page boundaries and only cache misses go to Polly.
+    
+    Unless SYNTHESIS_NORMALIZE is off, page markers, running headers and
+    footers, page numbers and line-break hyphenation are removed from the text
+    first; the saved text keeps them.
+    
+    When an OpeningSynthesizer speaks the start of the text, only the remainder
+    is synthesized here and the opening is returned alongside it.
+    
+    The document's status index says whether the audio is pending, complete or
+    failed. A single task is not waited for here: Polly's notification to
+    SYNTHESIS_SNS_TOPIC_ARN completes its status, or without a topic the
+    container's TaskTracker does once it sees the task finish. Chunk tasks
+    still running at `deadline` (a time.monotonic() value) fail the document.
+    """
+    s3 = get_client('s3')
     try:
-        polly = boto3.client('polly')
-        s3 = boto3.client('s3')
-        
-        # Generate audio using Polly
-        response = polly.start_speech_synthesis_task(
-            Engine='neural',
-            LanguageCode='en-US',
-            OutputFormat='mp3',
-            OutputS3BucketName=bucket_name,
-            OutputS3KeyPrefix=f"audio/{key_base}",
-            Text=text,
-            VoiceId='Matthew'
-        )
-        
-        # Get the task ID
-        task_id = response['SynthesisTask']['TaskId']
-        output_key = f"audio/{key_base}/{task_id}.mp3"
+        polly = get_client('polly')
+        cache_s3 = s3 if CACHE_ENABLED else None
+        update_status(s3, bucket_name, key_base, 'pending')
+        
+        normalizer = None
+        if NORMALIZE_TEXT:
+            normalizer = TextNormalizer()
+            pages = normalizer.normalize(pages)
+        if opening is not None:
+            # Start speaking the first page as soon as it has been normalized
+            pages = opening.remainder(opening.watch(pages))
+        chunks = iter_text_chunks((piece for page in pages for piece in split_pages(page)),
+                                  page_aligned=CACHE_ENABLED)
+        
+        # A document of a single chunk is one Polly task that is not waited for
+        first = next(chunks, None)
+        second = next(chunks, None) if first is not None else None
+        segments = None
+        task_id = None
+        if second is not None:
+            # Synthesize the chunks concurrently as they are produced and wait for all of them
+            segments = synthesize_chunks(polly, itertools.chain([first, second], chunks), bucket_name, key_base,
+                                         cache_s3=cache_s3, deadline=deadline)
+        
+        with span('opening_audio'):
+            opening_info = opening.result() if opening is not None else None
+        if opening is not None and opening_info is None and opening.prefix.strip():
+            # The opening failed, so its text goes through the task path after all
+            prefix = synthesize_chunks(polly, iter_text_chunks(split_pages(opening.prefix), page_aligned=CACHE_ENABLED),
+                                       bucket_name, f"{key_base}/opening", cache_s3=cache_s3, deadline=deadline)
+            rest = segments or ([] if first is None else
+                                synthesize_chunks(polly, [first], bucket_name, key_base, cache_s3=cache_s3,
+                                                  deadline=deadline))
+            segments = [dict(segment, index=index) for index, segment in enumerate(prefix + rest)]
+        
+        stats = None
+        if segments is not None:
+            stats = cache_stats(segments)
+            if STITCH_AUDIO:
+                output_key = stitch_audio(s3, bucket_name, segments, f"audio/{key_base}/document.mp3")
+            else:
+                output_key = save_playlist(s3, bucket_name, key_base, segments)
+            segment_count = len(segments)
+        elif first is None and opening_info is not None:
+            # The opening covered the whole document
+            output_key = opening_info['key']
+            segment_count = 0
+        else:
+            # Generate audio using Polly
+            task = start_synthesis_task(polly, first or '', bucket_name, f"audio/{key_base}", NOTIFY_TOPIC_ARN)
+            
+            # Get the task ID
+            task_id = task['TaskId']
+            output_key = output_key_from_task(task, bucket_name, f"audio/{key_base}/{task_id}.mp3")
+            segment_count = 1
+            update_status(s3, bucket_name, key_base, 'pending', output_key, [task_id])
+            if not NOTIFY_TOPIC_ARN:
+                # Best effort: only runs while this container is processing events
+                get_tracker(polly, POLL_INTERVAL).track(task_id, task.get('CreationTime')).add_done_callback(
+                    lambda future: update_status(s3, bucket_name, key_base,
+                                                 'failed' if future.exception() else 'complete',
+                                                 output_key, [task_id], reason=future.exception())
+                )
+        if task_id is None:
+            update_status(s3, bucket_name, key_base, 'complete', output_key)
+        
+        normalization = None
+        if normalizer is not None:
+            normalization = normalizer.stats()
+            emitter.observe('charactersRemoved', normalization['removedCharacters'])
+            logger.info(f"Normalization removed {normalization['removedCharacters']} of "
+                        f"{normalization['inputCharacters']} characters before synthesis")
         
         # Generate presigned URL (valid for 1 hour)
-        presigned_url = s3.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': output_key
-            },
-            ExpiresIn=3600
-        )
+        presigned_url = generate_presigned_url(s3, bucket_name, output_key)
         
-        return {
+        audio_info = {
             'audio_key': output_key,
             'task_id': task_id,
-            'presigned_url': presigned_url
+            'segments': segment_count,
+            'cache': stats,
+            'normalization': normalization,
+            'presigned_url': presigned_url,
+            'status_key': status_key_for(key_base)
         }
+        if opening_info is not None:
+            audio_info['opening_key'] = opening_info['key']
+            audio_info['opening_url'] = generate_presigned_url(s3, bucket_name, opening_info['key'])
+        return audio_info
         
-    except ClientError as e:
-        logger.error(f"Error generating audio: {str(e)}")
+    except Exception as e:
+        if isinstance(e, ClientError):
+            logger.error(f"Error generating audio: {str(e)}")
+        update_status(s3, bucket_name, key_base, 'failed', reason=e)
         raise
 
+def update_status(s3, bucket_name, key_base, status, key=None, task_ids=None, reason=None):
+    """Write a document's status index; a failure to write it is logged, not raised."""
+    try:
+        write_status(s3, bucket_name, key_base, status, key, task_ids, reason and str(reason))
+    except ClientError as e:
+        logger.warning(f"Could not write the {status} status of {key_base}: {e}")
+
+def generate_presigned_url(s3, bucket_name, key, expires_in=3600):
+    """Create a presigned GET URL for an object."""
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': bucket_name,
+            'Key': key
+        },
+        ExpiresIn=expires_in
+    )
+
+def build_response(s3, bucket_name, manifest, deduplicated=False):
+    """Build the handler response for a processed document from its manifest."""
+    response = {
+        'Metadata': manifest['metadata'],
+        'Number of Pages': manifest['num_pages'],
+        'Text Saved To': f"s3://{bucket_name}/{manifest['text_key']}",
+        'Audio': {
+            'TaskId': manifest['task_id'],
+            'AudioKey': manifest['audio_key'],
+            'PreSignedUrl': generate_presigned_url(s3, bucket_name, manifest['audio_key'])
+        }
+    }
+    if manifest.get('text_index_key'):
+        response['Text Index'] = f"s3://{bucket_name}/{manifest['text_index_key']}"
+    if manifest.get('status_key'):
+        response['Audio']['StatusKey'] = manifest['status_key']
+        response['Audio']['StatusUrl'] = generate_presigned_url(s3, bucket_name, manifest['status_key'])
+    if manifest.get('opening_key'):
+        response['Audio']['OpeningAudioKey'] = manifest['opening_key']
+        response['Audio']['OpeningPreSignedUrl'] = generate_presigned_url(s3, bucket_name, manifest['opening_key'])
+    if deduplicated:
+        response['Deduplicated'] = True
+    return response
+
+def iter_records(event):
+    """
+    Yield (item_id, record) for every document in an event.
+
+    Records delivered through SQS carry the S3 event in their body; their item
+    id is the SQS messageId so failures can be reported as partial batch
+    failures. Direct S3 records are identified by their bucket and key.
+    Events with `local_file_path` or `local_file_paths` name PDFs on the local
+    filesystem instead, relative to `local_root` or else their common
+    directory. SNS records carry Polly task notifications. A record that
+    cannot be parsed is yielded as an `invalid_record`, which fails alone.
+    """
+    if 'local_file_path' in event or 'local_file_paths' in event:
+        paths = event.get('local_file_paths') or [event['local_file_path']]
+        root = event.get('local_root') or os.path.commonpath([os.path.dirname(os.path.abspath(path))
+                                                               for path in paths])
+        for path in paths:
+            yield path, {'local_file_path': path, 'local_root': root}
+        return
+    
+    for position, record in enumerate(event.get('Records', [])):
+        try:
+            parsed = list(parse_record(record))
+        except Exception as e:
+            item_id = record.get('messageId') or record.get('Sns', {}).get('MessageId') or f"record-{position}"
+            logger.error(f"Invalid record {item_id}: {e!r}")
+            parsed = [(item_id, {'invalid_record': f"Invalid record: {e!r}"})]
+        yield from parsed
+
+def parse_record(record):
+    """Yield (item_id, record) for the documents or notification in one event record."""
+    if record.get('EventSource') == 'aws:sns':
+        yield record['Sns']['MessageId'], {'polly_notification': json.loads(record['Sns']['Message'])}
+    elif record.get('eventSource') == 'aws:sqs':
+        body = json.loads(record['body'])
+        for inner in body.get('Records', []):
+            yield record['messageId'], inner['s3']
+    else:
+        s3_record = record['s3']
+        yield f"s3://{s3_record['bucket']['name']}/{s3_record['object']['key']}", s3_record
+
 def lambda_handler(event, context):
+    inspector = Inspector()
+    inspector.inspectAll()
+    
     logger.info("Lambda function started")
     logger.info(f"Received event: {json.dumps(event)}")
     
+    try:
+        with span('lambda_handler'):
+            if 'audio_cache_evict' in event:
+                result = evict_audio_cache(event['audio_cache_evict'])
+            else:
+                result = process_records(list(iter_records(event)), invocation_deadline(context))
+    except Exception as e:
+        logger.error(f"Error processing event: {str(e)}")
+        result = {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+    finally:
+        # The inspector is finished even when the event fails, so the next invocation starts clean
+        inspector.inspectAllDeltas()
+        attributes = inspector.finish()
+    
+    # Latency and CPU use are aggregated across invocations instead of logging every report
+    failed = bool(result.get('batchItemFailures')) or result['statusCode'] >= 500
+    summary = emitter.end_invocation(attributes, failed=failed)
+    result['inspector'] = attributes if FULL_INSPECTION else summary
+    if not FULL_INSPECTION and 'profile' in attributes:
+        # Invocations picked for profiling report their hot functions either way
+        summary.update({key: attributes[key] for key in ('profile', 'profileFile') if key in attributes})
+    
+    # Keep a throughput sample for memory recommendations, if a profile store is configured
+    profiler.end_invocation(attributes)
+    return result
+
+def invocation_deadline(context):
+    """The time.monotonic() by which synthesis must finish for the invocation to return, if known."""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return time.monotonic() + context.get_remaining_time_in_millis() / 1000 - RESPONSE_MARGIN_SECONDS
+
+def evict_audio_cache(request):
+    """
+    Evict expired and least recently used audio cache entries from a bucket.
+
+    Run by a scheduled event whose input is {"audio_cache_evict": {"bucket": ...}},
+    so document requests never pay for it.
+    """
+    try:
+        removed = evict(get_client('s3'), request['bucket'])
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': f"Evicted {removed} audio cache entries."})
+        }
+    except Exception as e:
+        logger.error(f"Error evicting the audio cache: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
+def process_records(records, deadline=None):
+    """Process the records of an event and return the handler response."""
+    if len(records) <= 1:
+        result = process_record(records[0][1], deadline=deadline) if records else {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'No records in event.'})
+        }
+        failures = [records[0][0]] if result['statusCode'] != 200 else []
+        result['batchItemFailures'] = [{'itemIdentifier': item_id} for item_id in failures]
+        return result
+    
+    # Process the records side by side; CPU-bound page extraction shares the cores between them
+    workers = min(MAX_RECORD_WORKERS, len(records))
+    extract_workers = max(1, detect_cpu_cores() // workers)
+    parent = currentSpan()
+    
+    def run(record):
+        with span('process_record', parent):
+            return process_record(record[1], extract_workers, deadline)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, records))
+    
+    failures = []
+    body = []
+    for (item_id, _), result in zip(records, results):
+        body.append({'itemIdentifier': item_id, 'statusCode': result['statusCode'], 'body': json.loads(result['body'])})
+        if result['statusCode'] != 200 and item_id not in failures:
+            failures.append(item_id)
+    logger.info(f"Processed {len(records)} records, {len(failures)} failed")
+    
+    if not failures:
+        status_code = 200
+    elif len(failures) == len({item_id for item_id, _ in records}):
+        status_code = 500
+    else:
+        status_code = 207
+    return {
+        'statusCode': status_code,
+        'body': json.dumps({'results': body}),
+        'batchItemFailures': [{'itemIdentifier': item_id} for item_id in failures]
+    }
+
+def process_record(record, extract_workers=None, deadline=None):
+    """Process the S3 section of one event record and return its response."""
+    if 'local_file_path' in record:
+        return process_local_file(record['local_file_path'], extract_workers, record.get('local_root'))
+    if 'polly_notification' in record:
+        return process_notification(record['polly_notification'])
+    if 'invalid_record' in record:
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': record['invalid_record']})
+        }
+    
     try:
         # Extract bucket name and object key from the S3 event
-        record = event['Records'][0]['s3']
         bucket = record['bucket']['name']
         key = record['object']['key']
+        etag = record['object'].get('eTag')
         logger.info(f"Processing file: s3://{bucket}/{key}")
         
         # URL-decode the object key to handle spaces and special characters
@@ -74,59 +391,139 @@ def lambda_handler(event, context):
                 'body': json.dumps({'message': 'File is not a PDF. Skipping.'})
             }
         
-        # Initialize S3 client
-        s3 = boto3.client('s3')
+        # Get the shared S3 client
+        s3 = get_client('s3')
+        storage = S3Storage(s3, bucket)
         
-        # Retrieve the PDF file from S3
-        file_obj = s3.get_object(Bucket=bucket, Key=decoded_key)
-        file_content = file_obj['Body'].read()
+        # Retries of an upload we have already processed short-circuit before downloading
+        with span('dedup_lookup'):
+            manifest = find_manifest_by_etag(s3, bucket, etag)
+        if manifest is not None:
+            return dedup_response(s3, bucket, decoded_key, manifest)
         
-        # Open the PDF file
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+        # Stream the PDF file from S3 to /tmp instead of holding it in memory
+        started = time.perf_counter()
+        with span('download'):
+            pdf_path, content_hash = storage.fetch_pdf(decoded_key)
         
-        # Extract and sanitize metadata
-        metadata = {}
-        for key, value in pdf_reader.metadata.items():
-            if hasattr(value, 'get_object'):
-                metadata[key] = str(value.get_object())  # Convert IndirectObject to string
-            else:
-                metadata[key] = str(value) if value else None
-        
-        num_pages = len(pdf_reader.pages)
+        try:
+            # The same content uploaded under another name reuses the earlier text and audio
+            with span('dedup_lookup'):
+                manifest = find_manifest(s3, bucket, content_hash)
+            if manifest is not None:
+                if etag:
+                    link_etag(s3, bucket, etag, content_hash)
+                return dedup_response(s3, bucket, decoded_key, manifest)
+            
+            key_base = decoded_key.replace('.pdf', '')
+            opening = None
+            if PROGRESSIVE_AUDIO:
+                opening = OpeningSynthesizer(get_client('polly'), s3, bucket, key_base)
+            
+            # Extract text page by page across worker processes. Each page is uploaded to the
+            # extracted-text/ folder in S3 and fed to speech synthesis while later pages are
+            # still being extracted
+            def synthesize(pages):
+                return generate_audio_and_url(pages, bucket, key_base, opening, deadline)
+            metadata, num_pages, characters, audio_info = extract_document(
+                storage, pdf_path, text_key_for(decoded_key), extract_workers, synthesize
+            )
+        finally:
+            storage.release_pdf(pdf_path)
+
+        # Record the document so re-uploads of the same content can be skipped
+        with span('save_manifest'):
+            manifest = save_manifest(s3, bucket, content_hash, {
+                'source_key': decoded_key,
+                'metadata': metadata,
+                'num_pages': num_pages,
+                'text_key': text_key_for(decoded_key),
+                'text_index_key': index_key_for(text_key_for(decoded_key)),
+                'audio_key': audio_info['audio_key'],
+                'opening_key': audio_info.get('opening_key'),
+                'status_key': audio_info['status_key'],
+                'task_id': audio_info['task_id']
+            }, etag=etag)
+
+        elapsed = time.perf_counter() - started
+        emitter.observe('pagesPerSecond', num_pages / elapsed)
+        emitter.observe('charactersPerSecond', characters / elapsed)
+        profiler.observe_document(num_pages, characters, elapsed)
         
-        # Extract text from each page
-        text_content = []
-        for page_num, page in enumerate(pdf_reader.pages, start=1):
-            page_text = page.extract_text()
-            if page_text:
-                text_content.append(f"\n--- PAGE {page_num} ---\n{page_text}")
-            else:
-                text_content.append(f"\n--- PAGE {page_num} (No text detected) ---")
-                logger.warning(f"No text extracted from page {page_num}")
+        # Prepare response with metadata, page count, and audio URL
+        response = build_response(s3, bucket, manifest)
+        if audio_info['cache'] is not None:
+            response['Audio Cache'] = audio_info['cache']
+        if audio_info['normalization'] is not None:
+            response['Text Normalization'] = audio_info['normalization']
         
-        # Join the extracted text into a single string
-        full_text = "\n".join(text_content).strip()
+        logger.info(f"Extracted Metadata, Text Saved, and Audio Generated: {response}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(response)
+        }
         
-        # Save extracted text to the extracted-text/ folder in S3
-        save_text_to_s3(bucket, decoded_key, full_text)
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
 
-        # Generate audio and get presigned URL
-        key_base = decoded_key.replace('.pdf', '')
-        audio_info = generate_audio_and_url(full_text, bucket, key_base)
+def process_notification(message):
+    """Finalize the status index of a document from a Polly task notification."""
+    try:
+        index = finalize_from_notification(get_client('s3'), message)
+        logger.info(f"Polly task {message.get('taskId')} ended {message.get('taskStatus')}: "
+                    f"{'status ' + index['status'] if index else 'no pending status'}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'Status': index})
+        }
+    except Exception as e:
+        logger.error(f"Error finalizing task status: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
 
-        # Prepare response with metadata, page count, and audio URL
+def process_local_file(pdf_path, extract_workers=None, root=None):
+    """
+    Extract the text of a PDF on the local filesystem and return its response.
+
+    The PDF is memory-mapped in place and its text is written next to the PDF,
+    or under LOCAL_OUTPUT_DIR at the PDF's path relative to `root`, so PDFs
+    with the same name in different directories do not overwrite each other's
+    text. No S3 or Polly calls are made.
+    """
+    try:
+        if not pdf_path.lower().endswith('.pdf'):
+            logger.info(f"Skipping non-PDF file: {pdf_path}")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'File is not a PDF. Skipping.'})
+            }
+        
+        storage = LocalStorage(LOCAL_OUTPUT_DIR or os.path.dirname(os.path.abspath(pdf_path)))
+        started = time.perf_counter()
+        with span('hash'):
+            pdf_path, content_hash = storage.fetch_pdf(pdf_path)
+        text_key = text_key_for(local_text_name(pdf_path, root))
+        metadata, num_pages, characters, _ = extract_document(storage, pdf_path, text_key, extract_workers)
+        elapsed = time.perf_counter() - started
+        emitter.observe('pagesPerSecond', num_pages / elapsed)
+        emitter.observe('charactersPerSecond', characters / elapsed)
+        profiler.observe_document(num_pages, characters, elapsed)
+        
         response = {
             'Metadata': metadata,
             'Number of Pages': num_pages,
-            'Text Saved To': f"s3://{bucket}/extracted-text/{decoded_key.replace('.pdf', '.txt')}",
-            'Audio': {
-                'TaskId': audio_info['task_id'],
-                'AudioKey': audio_info['audio_key'],
-                'PreSignedUrl': audio_info['presigned_url']
-            }
+            'Text Saved To': storage.location(text_key),
+            'SHA256': content_hash
         }
-        
-        logger.info(f"Extracted Metadata, Text Saved, and Audio Generated: {response}")
+        if index_key_for(text_key):
+            response['Text Index'] = storage.location(index_key_for(text_key))
+        logger.info(f"Extracted Metadata and Text Saved: {response}")
         return {
             'statusCode': 200,
             'body': json.dumps(response)
@@ -139,18 +536,113 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': str(e)})
         }
 
-def save_text_to_s3(bucket_name, key, text):
-    """Save extracted text to S3 as a .txt file."""
-    s3 = boto3.client('s3')
-    
-    # Create the new key for the extracted text
-    text_key = f"extracted-text/{key.replace('.pdf', '.txt')}"
-    
-    # Upload the extracted text to S3
-    s3.put_object(
-        Bucket=bucket_name,
-        Key=text_key,
-        Body=text.encode('utf-8'),
-        ContentType='text/plain'
-    )
-    logger.info(f"Extracted text saved to s3://{bucket_name}/{text_key}")
+def local_text_name(pdf_path, root=None):
+    """Name of a local PDF's text under LOCAL_OUTPUT_DIR: its path relative to `root`."""
+    if not LOCAL_OUTPUT_DIR or root is None:
+        return os.path.basename(pdf_path)
+    name = os.path.relpath(os.path.abspath(pdf_path), os.path.abspath(root))
+    if name.startswith(os.pardir + os.sep):
+        raise ValueError(f"{pdf_path} is not under {root}")
+    return name.replace(os.sep, '/')
+
+def extract_document(storage, pdf_path, text_key, extract_workers=None, synthesize=None):
+    """
+    Read a PDF's metadata and stream its page text to `text_key` in storage.
+
+    Pages are extracted on this thread and handed through bounded queues to a
+    stage that saves the text and, when given, a stage that runs
+    `synthesize(pages)`, so saving, synthesis and extraction overlap.
+
+    @return A tuple of the metadata, the number of pages, the number of
+            characters and the result of `synthesize`.
+    """
+    with storage.open_pdf(pdf_path) as pdf_file:
+        with span('parse_pdf'):
+            # Open the PDF file; passing the mapped file lets PyPDF2 read pages on demand
+            pdf_reader = open_pdf_reader(pdf_file)
+            
+            # Extract and sanitize metadata
+            metadata = {}
+            for key, value in (pdf_reader.metadata or {}).items():
+                if hasattr(value, 'get_object'):
+                    metadata[key] = str(value.get_object())  # Convert IndirectObject to string
+                else:
+                    metadata[key] = str(value) if value else None
+            
+            num_pages = len(pdf_reader.pages)
+        
+        text_chunks = join_page_text(iter_page_text(pdf_reader, pdf_path, extract_workers))
+        
+        stages = [Stage('upload_text', lambda pages: save_text(storage, text_key, pages))]
+        if synthesize is not None:
+            stages.append(Stage('synthesize', synthesize))
+        with span('extract_pages'):
+            results = fan_out(text_chunks, stages)
+    return metadata, num_pages, results[0], results[1] if synthesize is not None else None
+
+def dedup_response(s3, bucket_name, key, manifest):
+    """Return the earlier results for a document whose content was already processed."""
+    logger.info(f"Skipping s3://{bucket_name}/{key}: same content as {manifest['source_key']}")
+    return {
+        'statusCode': 200,
+        'body': json.dumps(build_response(s3, bucket_name, manifest, deduplicated=True))
+    }
+
+def iter_page_text(pdf_reader, pdf_path, workers=None):
+    """
+    Yield the framed text of each page, one page at a time and in page order.
+
+    With OCR_ENABLED, pages without a text layer are transcribed from their
+    scanned image in batches.
+    """
+    pages = iter_extracted_pages(pdf_reader, pdf_path, workers)
+    if OCR_ENABLED:
+        pages = recognize_pages(pages, pdf_reader)
+    for page_num, page_text in pages:
+        if page_text:
+            yield f"\n--- PAGE {page_num} ---\n{page_text}"
+        else:
+            yield f"\n--- PAGE {page_num} (No text detected) ---"
+            logger.warning(f"No text extracted from page {page_num}")
+
+def join_page_text(pages):
+    """Yield the pieces of "\n".join(pages).strip() without building the joined string."""
+    previous = None
+    for page_text in pages:
+        if previous is None:
+            previous = page_text.lstrip()
+            continue
+        yield previous
+        previous = "\n" + page_text
+    if previous is not None:
+        yield previous.rstrip()
+
+@traced()
+def save_text(storage, text_key, text):
+    """Save extracted text in storage.
+
+    `text` may be a string or an iterable of string chunks, one per page;
+    chunks are written as they are produced, with a multipart upload on S3.
+    A .txt.gz key gets the paged format: each page compressed on its own and
+    a JSON index of the pages' byte ranges next to it.
+
+    @return The number of characters saved.
+    """
+    chunks = [text] if isinstance(text, str) else text
+    characters = 0
+    index_key = index_key_for(text_key)
+    if index_key is None:
+        with storage.text_writer(text_key) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+                characters += len(chunk)
+    else:
+        with storage.text_writer(text_key, content_type='application/gzip') as writer:
+            pages = PagedTextWriter(writer)
+            for chunk in chunks:
+                pages.write_page(chunk)
+                characters += len(chunk)
+        with storage.text_writer(index_key, content_type='application/json') as writer:
+            writer.write(json.dumps(pages.index()))
+    logger.info(f"Extracted text saved to {storage.location(text_key)}")
+    return characters
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+# Aggregated records are flushed after this many invocations or seconds,
+# whichever comes first. A container that is recycled before its next flush
+# loses the invocations it has not reported yet.
+FLUSH_INVOCATIONS = int(os.environ.get('METRICS_FLUSH_INVOCATIONS', 50))
+FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 300))
+
+# 'emf' prints CloudWatch Embedded Metric Format records, 'json' plain summaries.
+METRICS_FORMAT = os.environ.get('METRICS_FORMAT', 'emf').lower()
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'Talkify')
+
+# Return the full Inspector output from every invocation instead of a summary.
+FULL_INSPECTION = os.environ.get('INSPECTOR_FULL_OUTPUT', 'false').lower() == 'true'
+
+# Histogram buckets grow by this factor, so reported values are within ~10%.
+BUCKET_GROWTH = 1.2
+
+# CloudWatch accepts at most 100 distinct values per metric in one EMF record.
+EMF_MAX_VALUES = 100
+
+# Inspector attributes kept in the per-invocation summary.
+SUMMARY_ATTRIBUTES = ['uuid', 'newcontainer', 'invocations', 'runtime']
+
+UNITS = {
+    'latency': 'Milliseconds',
+    'pagesPerSecond': 'Count/Second',
+    'charactersPerSecond': 'Count/Second',
+    'charactersRemoved': 'Count',
+    'ocrPagesPerSecond': 'Count/Second',
+    'cpuUtilization': 'Percent'
+}
+
+class Histogram:
+    """Streaming histogram over logarithmic buckets; memory grows with the value range, not the count."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        index = math.ceil(math.log(value, BUCKET_GROWTH)) if value > 0 else None
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def values(self, max_values=EMF_MAX_VALUES):
+        """Return (values, counts) of the buckets, folding the lowest together if there are too many."""
+        indexes = sorted(self.buckets, key=lambda index: -math.inf if index is None else index)
+        # Each bucket is reported at its geometric midpoint, kept within the observed range
+        values = [0.0 if index is None else round(min(max(BUCKET_GROWTH ** (index - 0.5), self.min), self.max), 3)
+                  for index in indexes]
+        counts = [self.buckets[index] for index in indexes]
+        if len(values) > max_values:
+            overflow = len(values) - max_values + 1
+            values = values[overflow - 1:]
+            counts = [sum(counts[:overflow])] + counts[overflow:]
+        return values, counts
+
+    def percentile(self, percent):
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        values, counts = self.values(max_values=len(self.buckets))
+        for value, count in zip(values, counts):
+            seen += count
+            if seen >= rank:
+                return value
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'min': round(self.min, 3),
+            'max': round(self.max, 3),
+            'p50': round(self.percentile(50), 3),
+            'p90': round(self.percentile(90), 3),
+            'p99': round(self.percentile(99), 3)
+        }
+
+class MetricsEmitter:
+    """
+    Aggregate metrics across the warm invocations of a container.
+
+    Observations go into one histogram per metric; every `flush_invocations`
+    invocations or `flush_seconds` seconds a single aggregated record is
+    written to stdout, where CloudWatch Logs picks it up, and the histograms
+    start over.
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE, flush_invocations=FLUSH_INVOCATIONS,
+                 flush_seconds=FLUSH_SECONDS, output_format=METRICS_FORMAT, stream=None):
+        self.namespace = namespace
+        self.flush_invocations = flush_invocations
+        self.flush_seconds = flush_seconds
+        self.output_format = output_format
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._reset(time.time())
+
+    def _reset(self, now):
+        self.histograms = {}
+        self.invocations = 0
+        self.errors = 0
+        self.period_start = now
+
+    def observe(self, name, value):
+        """Add one observation of a metric; safe to call from worker threads."""
+        if value is None:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(value)
+
+    def end_invocation(self, attributes, failed=False, now=None):
+        """
+        Record an invocation from its Inspector attributes, flush if due, and
+        return the compact summary to report in place of the attributes.
+        """
+        now = now or time.time()
+        summary = {key: attributes[key] for key in SUMMARY_ATTRIBUTES if key in attributes}
+        utilization = cpu_utilization(attributes)
+        if utilization is not None:
+            summary['cpuUtilization'] = utilization
+
+        self.observe('latency', attributes.get('runtime'))
+        self.observe('cpuUtilization', utilization)
+        with self._lock:
+            self.invocations += 1
+            self.errors += 1 if failed else 0
+            due = (self.invocations >= self.flush_invocations or
+                   now - self.period_start >= self.flush_seconds)
+        if due:
+            self.flush(attributes, now)
+            summary['metricsFlushed'] = True
+        return summary
+
+    def flush(self, attributes=None, now=None):
+        """Write the aggregated record for the current period and start a new one."""
+        now = now or time.time()
+        with self._lock:
+            if not self.invocations and not self.histograms:
+                return None
+            histograms, invocations, errors, start = self.histograms, self.invocations, self.errors, self.period_start
+            self._reset(now)
+
+        attributes = attributes or {}
+        if self.output_format == 'json':
+            record = self._json_record(histograms, invocations, errors, start, now, attributes)
+        else:
+            record = self._emf_record(histograms, invocations, errors, now, attributes)
+        print(json.dumps(record), file=self.stream or sys.stdout, flush=True)
+        return record
+
+    def _emf_record(self, histograms, invocations, errors, now, attributes):
+        function_name = attributes.get('functionName') or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+        metrics = [{'Name': 'invocations', 'Unit': 'Count'}, {'Name': 'errors', 'Unit': 'Count'}]
+        record = {'FunctionName': function_name, 'invocations': invocations, 'errors': errors}
+        for name, histogram in histograms.items():
+            values, counts = histogram.values()
+            metrics.append({'Name': name, 'Unit': UNITS.get(name, 'None')})
+            record[name] = {
+                'Values': values,
+                'Counts': counts,
+                'Min': round(histogram.min, 3),
+                'Max': round(histogram.max, 3),
+                'Sum': round(histogram.sum, 3),
+                'Count': histogram.count
+            }
+        record['_aws'] = {
+            'Timestamp': int(now * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': self.namespace,
+                'Dimensions': [['FunctionName']],
+                'Metrics': metrics
+            }]
+        }
+        record['uuid'] = attributes.get('uuid')
+        return record
+
+    def _json_record(self, histograms, invocations, errors, start, now, attributes):
+        return {
+            'namespace': self.namespace,
+            'uuid': attributes.get('uuid'),
+            'periodStart': int(start * 1000),
+            'periodEnd': int(now * 1000),
+            'invocations': invocations,
+            'errors': errors,
+            'metrics': {name: histogram.summary() for name, histogram in histograms.items()}
+        }
+
+def cpu_utilization(attributes):
+    """Percent of the function's vCPUs used during the invocation, from Inspector deltas."""
+    try:
+        busy = attributes['cpuUserDelta'] + attributes['cpuKernelDelta']
+        elapsed = attributes['userRuntime'] * attributes['cpuCores']
+    except KeyError:
+        return None
+    if elapsed <= 0:
+        return None
+    return round(min(100.0, busy / elapsed * 100), 2)
+
+# One emitter per container, so its histograms live across warm invocations.
+emitter = MetricsEmitter()
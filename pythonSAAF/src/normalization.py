@@ -0,0 +1,124 @@
+import os
+import re
+from collections import deque
+
+# Speech normalization can be turned off to synthesize the extracted text as is.
+NORMALIZE_TEXT = os.environ.get('SYNTHESIS_NORMALIZE', 'true').lower() == 'true'
+
+# A line at the top or bottom of a page is a running header or footer once it
+# is in the same place on this many pages, and on HEADER_FRACTION of the pages
+# so far. The outermost lines, where page numbers are, match with any numbers.
+MIN_REPEATS = int(os.environ.get('NORMALIZE_MIN_REPEATS', 3))
+HEADER_FRACTION = float(os.environ.get('NORMALIZE_HEADER_FRACTION', 0.5))
+
+# Pages held back so a header on the first page can be matched against later ones.
+LOOKAHEAD_PAGES = MIN_REPEATS - 1
+
+# How many lines at each end of a page can be headers or footers.
+EDGE_LINES = 2
+
+# Longer lines are body text, not headers.
+MAX_HEADER_CHARS = 120
+
+PAGE_MARKER_LINE = re.compile(r'^[ \t]*--- PAGE \d+(?: \(No text detected\))? ---[ \t]*$', re.MULTILINE)
+HYPHENATED_BREAK = re.compile(r'(?<=[^\W\d_])-[ \t]*\n[ \t]*(?=[a-z])')
+PAGE_NUMBER = re.compile(r'^(?:page\s*)?#(?:\s*(?:of|/)\s*#)?$|^[-–—\s]*#[-–—\s]*$|^page\s*[ivxlc]+$')
+ROMAN_NUMERAL = re.compile(r'^(?=.)c{0,3}(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})$')
+DIGITS = re.compile(r'\d+')
+BLANK_LINES = re.compile(r'\n\s*\n+')
+
+# Key shared by lines that are only a roman numeral. A line such as "I" looks
+# the same, so these lines are dropped only when they repeat like a header.
+ROMAN_KEY = '<roman numeral>'
+
+def line_key(line, fold_numbers=True):
+    """Key that matches a running header or footer on every page, whatever its page number."""
+    key = ' '.join(line.lower().split())
+    if not fold_numbers:
+        return key
+    key = DIGITS.sub('#', key)
+    return ROMAN_KEY if ROMAN_NUMERAL.match(key) else key
+
+class TextNormalizer:
+    """
+    Remove what should not be read aloud from page texts as they stream past.
+
+    Page markers, running headers and footers, and page numbers are dropped,
+    and words hyphenated across line breaks are rejoined. Headers are found
+    in one pass with an index of how many pages each edge line appeared on,
+    in the same place; every page is held back for LOOKAHEAD_PAGES more pages
+    so the first pages' headers are recognized too. A page is never silenced
+    by this: if all of its lines look like headers, only page numbers go.
+    """
+
+    def __init__(self, min_repeats=MIN_REPEATS, lookahead=LOOKAHEAD_PAGES, header_fraction=HEADER_FRACTION):
+        self.min_repeats = min_repeats
+        self.lookahead = lookahead
+        self.header_fraction = header_fraction
+        self.input_characters = 0
+        self.output_characters = 0
+        self.removed_lines = 0
+        self._pages_with_line = {}
+        self._pages_seen = 0
+
+    def normalize(self, pages):
+        """Yield the spoken text of each non-empty page, in order and starting with a line break."""
+        window = deque()
+        for page in pages:
+            self.input_characters += len(page)
+            lines = PAGE_MARKER_LINE.sub('', page).strip('\n').split('\n')
+            edges = self._edge_keys(lines)
+            if any(line.strip() for line in lines):
+                self._pages_seen += 1
+            for key in {key for keys in edges.values() for key in keys}:
+                self._pages_with_line[key] = self._pages_with_line.get(key, 0) + 1
+            window.append((lines, edges))
+            if len(window) > self.lookahead:
+                yield from self._release(*window.popleft())
+        while window:
+            yield from self._release(*window.popleft())
+
+    def stats(self):
+        return {
+            'inputCharacters': self.input_characters,
+            'outputCharacters': self.output_characters,
+            'removedCharacters': self.input_characters - self.output_characters,
+            'removedLines': self.removed_lines
+        }
+
+    def _edge_keys(self, lines):
+        """
+        Keys of the candidate header and footer lines of a page, by line number.
+
+        Each key carries the line's place, counted from the top (0, 1) or the
+        bottom (-1, -2) of the page's non-blank lines, so a line only matches
+        lines in the same place on other pages.
+        """
+        content = [number for number, line in enumerate(lines) if line.strip()]
+        places = list(zip(content[:EDGE_LINES], range(EDGE_LINES)))
+        places += list(zip(reversed(content[-EDGE_LINES:]), range(-1, -EDGE_LINES - 1, -1)))
+        edges = {}
+        for number, place in places:
+            if len(lines[number].strip()) <= MAX_HEADER_CHARS:
+                key = line_key(lines[number], fold_numbers=place in (0, -1))
+                edges.setdefault(number, []).append((place, key))
+        return edges
+
+    def _is_header(self, key):
+        pages = self._pages_with_line[key]
+        return pages >= self.min_repeats and pages >= self.header_fraction * self._pages_seen
+
+    def _release(self, lines, edges):
+        dropped = {
+            number for number, keys in edges.items()
+            if PAGE_NUMBER.match(line_key(lines[number])) or any(self._is_header(key) for key in keys)
+        }
+        if all(number in dropped for number, line in enumerate(lines) if line.strip()):
+            # The page would be silent, so keep everything but its page numbers
+            dropped = {number for number in dropped if PAGE_NUMBER.match(line_key(lines[number]))}
+        kept = [line for number, line in enumerate(lines) if number not in dropped]
+        self.removed_lines += len(dropped)
+        text = BLANK_LINES.sub('\n', HYPHENATED_BREAK.sub('', '\n'.join(kept))).strip()
+        if text:
+            self.output_characters += len(text) + 1
+            yield f"\n{text}"
@@ -0,0 +1,253 @@
+import importlib.util
+import io
+import logging
+import os
+import threading
+import time
+
+try:
+    from .Inspector import traced
+    from .metrics import emitter
+except ImportError:
+    from Inspector import traced
+    from metrics import emitter
+
+# Set up logging
+logger = logging.getLogger()
+
+# Pages without a text layer are transcribed with SmolVLM when enabled.
+# Needs the packages in requirements-ocr.txt; without them pages stay silent as before.
+OCR_ENABLED = os.environ.get('OCR_ENABLED', 'false').lower() == 'true'
+OCR_MODEL = os.environ.get('OCR_MODEL', 'HuggingFaceTB/SmolVLM-256M-Instruct')
+
+# Text-less pages sent to the model together; bigger batches trade latency for pages/sec.
+OCR_BATCH_PAGES = int(os.environ.get('OCR_BATCH_PAGES', 4))
+
+# CPU weights: 'float32', or 'int8' for dynamic quantization of the linear layers.
+# float16 is only used on a GPU, it is slower than float32 on most CPUs.
+OCR_DTYPE = os.environ.get('OCR_DTYPE', 'float32')
+OCR_MAX_NEW_TOKENS = int(os.environ.get('OCR_MAX_NEW_TOKENS', 500))
+
+# Unix socket of a running ocr_worker; pages then go to the worker's already
+# loaded model instead of one loaded in this process.
+OCR_WORKER_SOCKET = os.environ.get('OCR_WORKER_SOCKET', '')
+
+# A local copy of the model (see prepare()); it is loaded without network access.
+OCR_MODEL_DIR = os.environ.get('OCR_MODEL_DIR', '')
+
+# CPU models converted to OCR_DTYPE are saved here on first load and memory-mapped
+# on later starts, skipping the weight conversion and quantization.
+OCR_CHECKPOINT_DIR = os.environ.get('OCR_CHECKPOINT_DIR', '')
+
+PROMPT = "Please read and transcribe any text visible in this image, maintaining the original formatting."
+
+def page_image(page):
+    """
+    Get a scanned page as an RGB image: the largest image drawn on it.
+
+    Scanned PDFs store every page as one full-page image, so this stands in for
+    rasterizing the page without a PDF renderer.
+
+    @return A PIL image, or None if the page has no images.
+    """
+    from PIL import Image
+    images = page.images
+    if not images:
+        return None
+    largest = max(images, key=lambda image: len(image.data))
+    return Image.open(io.BytesIO(largest.data)).convert('RGB')
+
+class SmolVLMTranscriber:
+    """
+    Transcribe page images with SmolVLM, a batch of pages per generate() call.
+
+    torch and transformers are imported and the model is loaded on first use,
+    from `model_dir` without network access when given, and from a converted
+    checkpoint in `checkpoint_dir` when one was saved. Decoding is greedy so
+    the same page always gives the same text.
+    """
+
+    def __init__(self, model_name=OCR_MODEL, dtype=OCR_DTYPE, max_new_tokens=OCR_MAX_NEW_TOKENS,
+                 model_dir=OCR_MODEL_DIR, checkpoint_dir=OCR_CHECKPOINT_DIR):
+        self.model_name = model_name
+        self.dtype = dtype
+        self.max_new_tokens = max_new_tokens
+        self.model_dir = model_dir
+        self.checkpoint_dir = checkpoint_dir
+        self.generated_tokens = 0
+        self._lock = threading.Lock()
+        self._model = None
+
+    def load(self):
+        with self._lock:
+            if self._model is not None:
+                return
+            start = time.time()
+            import torch
+            from transformers import AutoModelForVision2Seq, AutoProcessor
+            self._torch = torch
+            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            source = self.model_dir or self.model_name
+            offline = bool(self.model_dir)
+            self.processor = AutoProcessor.from_pretrained(source, local_files_only=offline)
+            # Batched prompts are padded on the left so every row generates from its last token
+            self.processor.tokenizer.padding_side = 'left'
+            checkpoint = self.checkpoint_path() if self.device == 'cpu' else None
+            if checkpoint and os.path.exists(checkpoint):
+                # The tensors stay in the page cache instead of being read and copied
+                model = torch.load(checkpoint, mmap=True, weights_only=False)
+            else:
+                # safetensors weights are memory-mapped rather than deserialized
+                model = AutoModelForVision2Seq.from_pretrained(
+                    source,
+                    torch_dtype=torch.float16 if self.device == 'cuda' else torch.float32,
+                    local_files_only=offline,
+                    low_cpu_mem_usage=True
+                ).to(self.device)
+                if self.device == 'cpu' and self.dtype == 'int8':
+                    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                if checkpoint:
+                    self._save_checkpoint(model, checkpoint)
+            model.eval()
+            self._prompt = self.processor.apply_chat_template(
+                [{'role': 'user', 'content': [{'type': 'image'}, {'type': 'text', 'text': PROMPT}]}],
+                add_generation_prompt=True
+            )
+            self._model = model
+            logger.info(f"Loaded {self.model_name} ({self.dtype} on {self.device}) in {time.time() - start:.2f}s")
+
+    def checkpoint_path(self):
+        if not self.checkpoint_dir:
+            return None
+        return os.path.join(self.checkpoint_dir, f"{self.model_name.replace('/', '--')}-{self.dtype}.pt")
+
+    def _save_checkpoint(self, model, path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._torch.save(model, f"{path}.partial")
+            os.replace(f"{path}.partial", path)
+            logger.info(f"Saved the converted model to {path}")
+        except OSError as e:
+            logger.warning(f"Could not save the converted model to {path}: {e}")
+
+    def transcribe(self, images):
+        """Return the text of each image, in order."""
+        self.load()
+        inputs = self.processor(text=[self._prompt] * len(images), images=[[image] for image in images],
+                                return_tensors='pt', padding=True).to(self.device)
+        with self._torch.inference_mode():
+            generated_ids = self._model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=False,
+                repetition_penalty=1.2
+            )
+        # Keep only the new tokens, not the echoed prompt
+        generated_ids = generated_ids[:, inputs['input_ids'].shape[1]:]
+        pad_token_id = self.processor.tokenizer.pad_token_id
+        if pad_token_id is None:
+            self.generated_tokens += generated_ids.numel()
+        else:
+            self.generated_tokens += int(generated_ids.ne(pad_token_id).sum())
+        texts = self.processor.batch_decode(generated_ids, skip_special_tokens=True)
+        return [text.strip() for text in texts]
+
+def prepare(model_dir, checkpoint_dir=None, model_name=OCR_MODEL, dtype=OCR_DTYPE):
+    """Download the model to `model_dir` and, with `checkpoint_dir`, save its converted CPU checkpoint."""
+    from huggingface_hub import snapshot_download
+    snapshot_download(model_name, local_dir=model_dir)
+    if checkpoint_dir:
+        prepared = SmolVLMTranscriber(model_name, dtype, model_dir=model_dir, checkpoint_dir=checkpoint_dir)
+        prepared.load()
+        return prepared.checkpoint_path()
+
+transcriber = None
+
+def get_transcriber():
+    """
+    Return the container's transcriber, or None if the OCR packages are not installed.
+
+    The packages are only looked up here, not imported; the model imports them
+    when it first transcribes. With OCR_WORKER_SOCKET set this is a client of
+    the worker, which only needs Pillow here.
+    """
+    global transcriber
+    if transcriber is None:
+        required = ['PIL'] if OCR_WORKER_SOCKET else ['PIL', 'torch', 'transformers']
+        missing = [name for name in required if importlib.util.find_spec(name) is None]
+        if missing:
+            logger.warning(f"OCR is enabled but unavailable, text-less pages stay silent: "
+                           f"{', '.join(missing)} not installed")
+            transcriber = False
+        elif OCR_WORKER_SOCKET:
+            try:
+                from .ocr_worker import OcrWorkerClient
+            except ImportError:
+                from ocr_worker import OcrWorkerClient
+            transcriber = OcrWorkerClient(OCR_WORKER_SOCKET)
+        else:
+            transcriber = SmolVLMTranscriber()
+    return transcriber or None
+
+@traced('ocr_batch')
+def transcribe_pages(pdf_reader, page_nums, transcriber):
+    """Return {page_num: text} for the given pages; pages without an image get ''."""
+    start = time.perf_counter()
+    images = {}
+    for page_num in page_nums:
+        try:
+            image = page_image(pdf_reader.pages[page_num - 1])
+        except Exception as e:
+            logger.warning(f"Could not read the image of page {page_num}: {e}")
+            continue
+        if image is not None:
+            images[page_num] = image
+    texts = dict.fromkeys(page_nums, '')
+    if images:
+        try:
+            texts.update(zip(images, transcriber.transcribe(list(images.values()))))
+        except Exception as e:
+            logger.warning(f"OCR of pages {list(images)} failed: {e}")
+            return texts
+        elapsed = time.perf_counter() - start
+        emitter.observe('ocrPagesPerSecond', len(images) / elapsed)
+        logger.info(f"Transcribed pages {list(images)} in {elapsed:.2f}s")
+    return texts
+
+def recognize_pages(pages, pdf_reader, transcriber=None, batch_size=OCR_BATCH_PAGES):
+    """
+    Fill in the text of text-less pages in a stream of (page_num, page_text).
+
+    Text-less pages are held back until `batch_size` of them are waiting or a
+    page with text arrives, then transcribed together, so pages stay in order.
+    Without a `transcriber` the container's is only looked up once a text-less
+    page arrives, so documents with a text layer never touch the OCR packages.
+    """
+    pending = []
+    for page_num, page_text in pages:
+        if page_text:
+            if pending:
+                yield from transcribe_pages(pdf_reader, pending, transcriber).items()
+                pending = []
+            yield page_num, page_text
+            continue
+        transcriber = transcriber or get_transcriber()
+        if transcriber is None:
+            yield page_num, page_text
+            continue
+        pending.append(page_num)
+        if len(pending) >= batch_size:
+            yield from transcribe_pages(pdf_reader, pending, transcriber).items()
+            pending = []
+    if pending:
+        yield from transcribe_pages(pdf_reader, pending, transcriber).items()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Prepare a local copy of the OCR model for offline, fast starts.")
+    parser.add_argument('--model-dir', default=OCR_MODEL_DIR, required=not OCR_MODEL_DIR)
+    parser.add_argument('--checkpoint-dir', default=OCR_CHECKPOINT_DIR)
+    parser.add_argument('--dtype', default=OCR_DTYPE, choices=['float32', 'int8'])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    prepare(args.model_dir, args.checkpoint_dir, dtype=args.dtype)
@@ -0,0 +1,198 @@
+"""
+Long-lived SmolVLM inference worker.
+
+The model is loaded once and transcription requests arrive over a Unix
+socket, one JSON line per request. Requests that arrive within
+OCR_MAX_WAIT_MS of each other are transcribed together in batches of up to
+OCR_BATCH_PAGES images. Handlers use the worker by setting OCR_WORKER_SOCKET.
+
+Usage:
+    python -m pythonSAAF.src.ocr_worker [--socket /tmp/talkify-ocr.sock] [--max-batch 8] [--max-wait-ms 50]
+"""
+import argparse
+import base64
+import io
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from .metrics import Histogram
+    from .ocr import OCR_BATCH_PAGES, OCR_WORKER_SOCKET, SmolVLMTranscriber
+except ImportError:
+    from metrics import Histogram
+    from ocr import OCR_BATCH_PAGES, OCR_WORKER_SOCKET, SmolVLMTranscriber
+
+# Set up logging
+logger = logging.getLogger()
+
+# How long the first request of a batch waits for more to join it.
+OCR_MAX_WAIT_MS = float(os.environ.get('OCR_MAX_WAIT_MS', 50))
+
+# The worker logs its stats every this many batches.
+STATS_EVERY_BATCHES = 20
+
+def encode_image(image):
+    """PNG bytes of a PIL image, base64 encoded for a JSON request."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def decode_image(data):
+    from PIL import Image
+    return Image.open(io.BytesIO(base64.b64decode(data))).convert('RGB')
+
+class BatchingWorker:
+    """
+    Coalesce concurrent transcription requests into batches on one thread.
+
+    A batch is started by the oldest waiting image and takes every image that
+    arrives within `max_wait` seconds, up to `max_batch` images. transcribe()
+    can be called from any number of threads and has the transcriber's interface.
+    """
+
+    def __init__(self, transcriber, max_batch=OCR_BATCH_PAGES, max_wait=OCR_MAX_WAIT_MS / 1000):
+        self.transcriber = transcriber
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch_sizes = Histogram()
+        self.queue_depths = Histogram()
+        self.busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='ocr-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """Queue one image; the returned future gets its text."""
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def transcribe(self, images):
+        return [future.result() for future in [self.submit(image) for image in images]]
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        batches = 0
+        while True:
+            batch = self._next_batch()
+            with self._stats_lock:
+                self.queue_depths.add(self._queue.qsize())
+                self.batch_sizes.add(len(batch))
+            start = time.perf_counter()
+            try:
+                texts = self.transcriber.transcribe([image for image, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), text in zip(batch, texts):
+                    future.set_result(text)
+            self.busy_seconds += time.perf_counter() - start
+            batches += 1
+            if batches % STATS_EVERY_BATCHES == 0:
+                logger.info(f"OCR worker stats: {json.dumps(self.stats())}")
+
+    def stats(self):
+        with self._stats_lock:
+            return self._stats()
+
+    def _stats(self):
+        return {
+            'queueDepth': self._queue.qsize(),
+            'batches': self.batch_sizes.count,
+            'images': round(self.batch_sizes.sum),
+            'batchSize': self.batch_sizes.summary() if self.batch_sizes.count else None,
+            'queueDepthAtBatch': self.queue_depths.summary() if self.queue_depths.count else None,
+            'tokensPerSecond': round(self.transcriber.generated_tokens / self.busy_seconds, 1) if self.busy_seconds else 0
+        }
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            try:
+                if 'images' in request:
+                    images = [decode_image(data) for data in request['images']]
+                    response = {'texts': self.server.worker.transcribe(images)}
+                else:
+                    response = {'stats': self.server.worker.stats()}
+            except Exception as e:
+                response = {'error': f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+class OcrServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve a BatchingWorker on a Unix socket, one thread per connection."""
+
+    daemon_threads = True
+
+    def __init__(self, path, worker):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.worker = worker
+        super().__init__(path, _RequestHandler)
+
+class OcrWorkerClient:
+    """Send transcription requests to an OcrServer; has the transcriber's interface."""
+
+    def __init__(self, path=OCR_WORKER_SOCKET, timeout=300):
+        self.path = path
+        self.timeout = timeout
+        self.generated_tokens = 0
+        self._local = threading.local()
+
+    def _request(self, request):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            connection = self._local.connection = sock.makefile('rwb')
+        try:
+            connection.write(json.dumps(request).encode('utf-8') + b'\n')
+            connection.flush()
+            response = json.loads(connection.readline())
+        except (OSError, ValueError):
+            # Reconnect on the next request
+            self._local.connection = None
+            raise
+        if 'error' in response:
+            raise RuntimeError(f"OCR worker failed: {response['error']}")
+        return response
+
+    def transcribe(self, images):
+        return self._request({'images': [encode_image(image) for image in images]})['texts']
+
+    def stats(self):
+        return self._request({'stats': True})['stats']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--socket', default=OCR_WORKER_SOCKET or '/tmp/talkify-ocr.sock')
+    parser.add_argument('--max-batch', type=int, default=OCR_BATCH_PAGES)
+    parser.add_argument('--max-wait-ms', type=float, default=OCR_MAX_WAIT_MS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    transcriber = SmolVLMTranscriber()
+    transcriber.load()
+    server = OcrServer(args.socket, BatchingWorker(transcriber, args.max_batch, args.max_wait_ms / 1000))
+    logger.info(f"OCR worker listening on {args.socket}")
+    server.serve_forever()
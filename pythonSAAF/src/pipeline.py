@@ -0,0 +1,112 @@
+import logging
+import os
+import queue
+import threading
+
+try:
+    from .Inspector import currentSpan, span
+except ImportError:
+    from Inspector import currentSpan, span
+
+# Set up logging
+logger = logging.getLogger()
+
+# Pages buffered between extraction and each later stage. A stage that falls
+# behind makes extraction wait instead of letting the backlog grow.
+PIPELINE_QUEUE_PAGES = int(os.environ.get('PIPELINE_QUEUE_PAGES', 32))
+
+_DONE = object()
+_CANCEL = object()
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when the producer feeding it failed."""
+
+class Stage:
+    """
+    Run one consumer of a stream of items on its own thread.
+
+    `consume` receives an iterator over the items put into the stage and runs
+    while they are still being produced. The queue between the producer and
+    the stage holds at most `maxsize` items.
+    """
+
+    def __init__(self, name, consume, maxsize=PIPELINE_QUEUE_PAGES):
+        self.name = name
+        self.result = None
+        self.error = None
+        self._queue = queue.Queue(maxsize)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, args=(consume, currentSpan()), name=name, daemon=True)
+        self._thread.start()
+
+    def _items(self):
+        while True:
+            item = self._queue.get()
+            if item is _DONE or item is _CANCEL:
+                self._closed = True
+                if item is _CANCEL:
+                    raise PipelineCancelled(f"{self.name} cancelled")
+                return
+            yield item
+
+    def _run(self, consume, parent):
+        try:
+            with span(self.name, parent):
+                self.result = consume(self._items())
+        except BaseException as e:
+            self.error = e
+        finally:
+            # Keep taking items so a producer that has not noticed the failure never blocks
+            while not self._closed:
+                if self._queue.get() in (_DONE, _CANCEL):
+                    self._closed = True
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(item)
+
+    def finish(self, cancel=False):
+        """Close the stage's input, wait for it to end, and return its result."""
+        self._queue.put(_CANCEL if cancel else _DONE)
+        self._thread.join()
+        if self.error is not None and not (cancel and isinstance(self.error, PipelineCancelled)):
+            raise self.error
+        return self.result
+
+def fan_out(items, stages):
+    """
+    Feed every item to every stage as it is produced, on the calling thread.
+
+    If producing the items fails, the stages are cancelled and the error is
+    raised; if a stage fails, production stops and the stage's error is raised.
+    A stage that fails once its input is closed cancels the stages after it,
+    and every stage has ended before the error is raised.
+
+    @return The result of each stage, in order.
+    """
+    try:
+        for item in items:
+            for stage in stages:
+                stage.put(item)
+    except BaseException as failure:
+        for stage in stages:
+            try:
+                stage.finish(cancel=True)
+            except Exception as e:
+                if e is not failure:
+                    logger.warning(f"Pipeline stage {stage.name} failed while cancelling: {e}")
+        raise
+    results = []
+    failure = None
+    for stage in stages:
+        try:
+            results.append(stage.finish(cancel=failure is not None))
+        except BaseException as e:
+            if failure is None:
+                failure = e
+            else:
+                logger.warning(f"Pipeline stage {stage.name} failed while cancelling: {e}")
+    if failure is not None:
+        raise failure
+    return results
@@ -0,0 +1,316 @@
+"""
+Throughput profiles for choosing the function's memory setting.
+
+Every invocation can leave a sample (pages, characters, runtime, stage times,
+utilized CPUs and memory size) in a profile store: a JSON-lines file or
+objects under an S3 prefix. Replaying the history fits
+
+    runtime = fixed + cpuWork * pages / vCPUs(memory) + ioWork * pages
+
+by least squares over all samples and recommends the cheapest memory setting
+whose predicted throughput or latency meets the target.
+
+Usage:
+    python -m pythonSAAF.src.profiler --store s3://bucket/profiles [--pages N]
+                                      [--target-pages-per-second X | --latency-slo-ms Y]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+import uuid
+
+try:
+    from .Inspector import MB_PER_VCPU
+    from .clients import get_client
+except ImportError:
+    from Inspector import MB_PER_VCPU
+    from clients import get_client
+
+# Set up logging
+logger = logging.getLogger()
+
+# Where samples go: s3://bucket/prefix, a local .jsonl path, or '' to not record them.
+PROFILE_STORE = os.environ.get('PROFILE_STORE', '')
+
+# S3 stores write the buffered samples as one object this often.
+PROFILE_FLUSH_SAMPLES = int(os.environ.get('PROFILE_FLUSH_SAMPLES', 20))
+
+# Lambda allocates CPU in proportion to memory, MB_PER_VCPU per vCPU, up to six.
+MAX_VCPUS = 6
+
+# Memory settings considered for a recommendation.
+MEMORY_SIZES = [128, 256, 512, 768, 1024, 1536, 1769, 2048, 3008, 3538, 4096, 5307, 6144, 7076, 8192, 10240]
+
+# On-demand x86 prices.
+PRICE_PER_GB_SECOND = 0.0000166667
+PRICE_PER_REQUEST = 0.0000002
+
+def vcpus(memory):
+    return min(MAX_VCPUS, memory / MB_PER_VCPU)
+
+def stage_timings(spans, totals=None, prefix=''):
+    """Sum span runtimes by their path in the span tree, e.g. 'lambda_handler/download'."""
+    totals = {} if totals is None else totals
+    for record in spans:
+        name = prefix + record['name']
+        totals[name] = totals.get(name, 0) + record.get('runtime', 0)
+        stage_timings(record.get('children', []), totals, name + '/')
+    return totals
+
+class LocalProfileStore:
+    """Append samples to a JSON-lines file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def save(self, samples):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            for sample in samples:
+                file.write(json.dumps(sample) + "\n")
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+class S3ProfileStore:
+    """Write each batch of samples as one JSON-lines object under a prefix."""
+
+    def __init__(self, bucket_name, prefix, s3=None):
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self._s3 = s3
+
+    @property
+    def s3(self):
+        # The shared client is only created once samples are actually written or read
+        return self._s3 or get_client('s3')
+
+    def save(self, samples):
+        key = f"{self.prefix}/{time.strftime('%Y-%m-%d')}/{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.jsonl"
+        self.s3.put_object(
+            Bucket=self.bucket_name,
+            Key=key,
+            Body="".join(json.dumps(sample) + "\n" for sample in samples).encode('utf-8'),
+            ContentType='application/x-ndjson'
+        )
+
+    def load(self):
+        samples = []
+        list_args = {'Bucket': self.bucket_name, 'Prefix': f"{self.prefix}/"}
+        while True:
+            response = self.s3.list_objects_v2(**list_args)
+            for item in response.get('Contents', []):
+                body = self.s3.get_object(Bucket=self.bucket_name, Key=item['Key'])['Body'].read()
+                samples.extend(json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip())
+            if not response.get('IsTruncated'):
+                break
+            list_args['ContinuationToken'] = response['NextContinuationToken']
+        return samples
+
+def open_store(location, s3=None):
+    """Open the profile store at s3://bucket/prefix or a local path; None if location is empty."""
+    if not location:
+        return None
+    if location.startswith('s3://'):
+        bucket_name, _, prefix = location[len('s3://'):].partition('/')
+        return S3ProfileStore(bucket_name, prefix or 'profiles', s3)
+    return LocalProfileStore(location)
+
+class Profiler:
+    """
+    Collect one sample per invocation and hand them to a profile store.
+
+    Documents are reported with observe_document, from any thread, while the
+    invocation runs; end_invocation adds the Inspector's runtime, CPU and
+    stage timings and queues the sample.
+    """
+
+    def __init__(self, store=None, flush_samples=PROFILE_FLUSH_SAMPLES):
+        self.store = store
+        self.flush_samples = flush_samples
+        self._lock = threading.Lock()
+        self._documents = []
+        self._pending = []
+
+    def observe_document(self, pages, characters, seconds):
+        if self.store is None:
+            return
+        with self._lock:
+            self._documents.append((pages, characters, seconds))
+
+    def end_invocation(self, attributes):
+        if self.store is None:
+            return None
+        with self._lock:
+            documents, self._documents = self._documents, []
+        if not documents:
+            return None
+
+        memory = attributes.get('functionMemory') or os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE')
+        busy = attributes.get('cpuUserDelta', 0) + attributes.get('cpuKernelDelta', 0)
+        sample = {
+            'timestamp': int(time.time()),
+            'uuid': attributes.get('uuid'),
+            'memory': int(memory) if memory else None,
+            'documents': len(documents),
+            'pages': sum(document[0] for document in documents),
+            'characters': sum(document[1] for document in documents),
+            'documentSeconds': round(sum(document[2] for document in documents), 3),
+            'runtime': attributes.get('runtime'),
+            'utilizedCPUs': round(busy / attributes['userRuntime'], 3) if attributes.get('userRuntime') else None,
+            'stages': {name: round(value, 3) for name, value in stage_timings(attributes.get('spans', [])).items()}
+        }
+        with self._lock:
+            self._pending.append(sample)
+            due = isinstance(self.store, LocalProfileStore) or len(self._pending) >= self.flush_samples
+        if due:
+            self.flush()
+        return sample
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            try:
+                self.store.save(pending)
+            except Exception as e:
+                logger.warning(f"Could not save {len(pending)} profile samples: {e}")
+
+def _solve(matrix, vector):
+    """Solve a small linear system by Gaussian elimination; None if it is singular."""
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        if abs(rows[pivot][column]) < 1e-12:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for row in range(size):
+            if row != column:
+                factor = rows[row][column] / rows[column][column]
+                rows[row] = [a - factor * b for a, b in zip(rows[row], rows[column])]
+    return [rows[row][size] / rows[row][row] for row in range(size)]
+
+def fit_runtime_model(samples):
+    """
+    Least-squares fit of runtime (ms) = fixed + cpuWork * pages / vCPUs + ioWork * pages.
+
+    With a single memory size in the history, CPU and I/O work per page cannot
+    be told apart and every per-page millisecond is treated as CPU work.
+
+    @return The coefficients as a dict, or None with fewer than three usable samples.
+    """
+    usable = [sample for sample in samples if sample.get('memory') and sample.get('pages') and sample.get('runtime')]
+    if len(usable) < 3:
+        return None
+    cpu_bound = len({sample['memory'] for sample in usable}) < 2
+    features = []
+    for sample in usable:
+        row = [1.0, sample['pages'] / vcpus(sample['memory'])]
+        if not cpu_bound:
+            row.append(float(sample['pages']))
+        features.append(row)
+    targets = [float(sample['runtime']) for sample in usable]
+
+    size = len(features[0])
+    normal = [[sum(row[i] * row[j] for row in features) for j in range(size)] for i in range(size)]
+    moments = [sum(row[i] * target for row, target in zip(features, targets)) for i in range(size)]
+    solution = _solve(normal, moments)
+    if solution is None:
+        return None
+    model = {
+        'fixed': max(0.0, solution[0]),
+        'cpuWork': max(0.0, solution[1]),
+        'ioWork': max(0.0, solution[2]) if not cpu_bound else 0.0,
+        'cpuBound': cpu_bound,
+        'samples': len(usable)
+    }
+    return model
+
+def predict_runtime(model, memory, pages):
+    return model['fixed'] + model['cpuWork'] * pages / vcpus(memory) + model['ioWork'] * pages
+
+def observed_by_memory(samples):
+    """Median observed throughput and latency for each memory size in the history."""
+    by_memory = {}
+    for sample in samples:
+        if sample.get('memory') and sample.get('pages') and sample.get('runtime'):
+            by_memory.setdefault(sample['memory'], []).append(sample)
+    return {
+        memory: {
+            'samples': len(group),
+            'pagesPerSecond': round(statistics.median(s['pages'] / (s['runtime'] / 1000) for s in group), 2),
+            'latency': round(statistics.median(s['runtime'] for s in group), 1),
+            'utilizedCPUs': round(statistics.median(s['utilizedCPUs'] or 0 for s in group), 3)
+        }
+        for memory, group in sorted(by_memory.items())
+    }
+
+def recommend(samples, pages=None, target_pages_per_second=None, latency_slo_ms=None, memory_sizes=MEMORY_SIZES):
+    """
+    Recommend the cheapest memory setting that meets a throughput or latency target.
+
+    @param pages Document size to plan for; the median of the history by default.
+    @return A dict with the recommendation, the fitted model and a row per memory size.
+    """
+    model = fit_runtime_model(samples)
+    result = {'model': model, 'observed': observed_by_memory(samples)}
+    if model is None:
+        result['error'] = "At least three samples with pages, runtime and memory are needed"
+        return result
+
+    if pages is None:
+        pages = statistics.median(sample['pages'] for sample in samples if sample.get('pages'))
+    candidates = []
+    for memory in memory_sizes:
+        runtime = predict_runtime(model, memory, pages)
+        candidates.append({
+            'memory': memory,
+            'latency': round(runtime, 1),
+            'pagesPerSecond': round(pages / (runtime / 1000), 2) if runtime > 0 else None,
+            'cost': round(runtime / 1000 * memory / 1024 * PRICE_PER_GB_SECOND + PRICE_PER_REQUEST, 10)
+        })
+
+    def meets(candidate):
+        if target_pages_per_second is not None and (candidate['pagesPerSecond'] or 0) < target_pages_per_second:
+            return False
+        if latency_slo_ms is not None and candidate['latency'] > latency_slo_ms:
+            return False
+        return True
+
+    passing = [candidate for candidate in candidates if meets(candidate)]
+    if passing:
+        best = min(passing, key=lambda candidate: (candidate['cost'], candidate['memory']))
+    else:
+        # Nothing meets the target; the fastest setting comes closest
+        best = min(candidates, key=lambda candidate: (candidate['latency'], candidate['memory']))
+    result.update({
+        'pages': pages,
+        'recommendedMemory': best['memory'],
+        'meetsTarget': bool(passing),
+        'predicted': best,
+        'candidates': candidates
+    })
+    return result
+
+# One profiler per container, recording to PROFILE_STORE.
+profiler = Profiler(open_store(PROFILE_STORE))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=PROFILE_STORE, required=not PROFILE_STORE,
+                        help="s3://bucket/prefix or a .jsonl path holding the recorded samples")
+    parser.add_argument('--pages', type=float, help="document size to plan for (median of the history by default)")
+    parser.add_argument('--target-pages-per-second', type=float)
+    parser.add_argument('--latency-slo-ms', type=float)
+    args = parser.parse_args()
+
+    history = open_store(args.store).load()
+    print(json.dumps(recommend(history, args.pages, args.target_pages_per_second, args.latency_slo_ms), indent=2))
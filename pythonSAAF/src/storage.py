@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+from contextlib import contextmanager
+
+try:
+    from .streaming import S3MultipartWriter, remove_quietly, spool_s3_object
+except ImportError:
+    from streaming import S3MultipartWriter, remove_quietly, spool_s3_object
+
+# Set up logging
+logger = logging.getLogger()
+
+# Extracted text of local files goes under this directory, next to each PDF by default.
+LOCAL_OUTPUT_DIR = os.environ.get('LOCAL_OUTPUT_DIR')
+
+# 'plain' writes one .txt file. 'paged' instead writes the text as one gzip member
+# per page to .txt.gz, plus a JSON index of their byte ranges, so a reader can
+# fetch a single page; readers of the .txt key must be updated before opting in.
+TEXT_FORMAT = os.environ.get('TEXT_OUTPUT_FORMAT', 'plain').lower()
+TEXT_COMPRESS_LEVEL = int(os.environ.get('TEXT_COMPRESS_LEVEL', 6))
+
+@contextmanager
+def map_file(path):
+    """Memory-map a file read-only so readers page it in from the page cache instead of copying it."""
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def text_key_for(key, text_format=TEXT_FORMAT):
+    """Key of the extracted text for a PDF key."""
+    text_key = f"extracted-text/{key.replace('.pdf', '.txt')}"
+    return f"{text_key}.gz" if text_format == 'paged' else text_key
+
+def index_key_for(text_key):
+    """Key of the page index of paged text, or None for plain text."""
+    if not text_key.endswith('.txt.gz'):
+        return None
+    return f"{text_key[:-len('.txt.gz')]}.index.json"
+
+class PagedTextWriter:
+    """
+    Compress text page by page into a writer and record where each page landed.
+
+    Every page becomes its own gzip member. Concatenated members are still a
+    valid .gz file that decompresses to the whole text, while the byte range
+    of any one member decompresses to just that page. The index is built from
+    the sizes of the members as they are written, without another pass.
+    """
+
+    def __init__(self, writer, compress_level=TEXT_COMPRESS_LEVEL):
+        self.writer = writer
+        self.compress_level = compress_level
+        self.pages = []
+        self._offset = 0
+        self._characters = 0
+
+    def write_page(self, text):
+        data = text.encode('utf-8')
+        member = gzip.compress(data, compresslevel=self.compress_level, mtime=0)
+        self.writer.write(member)
+        self.pages.append({
+            'page': len(self.pages) + 1,
+            'offset': self._offset,
+            'length': len(member),
+            'characterOffset': self._characters,
+            'characters': len(text)
+        })
+        self._offset += len(member)
+        self._characters += len(text)
+
+    def index(self):
+        return {
+            'format': 'gzip-member-per-page',
+            'encoding': 'utf-8',
+            'pageCount': len(self.pages),
+            'characters': self._characters,
+            'compressedBytes': self._offset,
+            'pages': self.pages
+        }
+
+def read_page(s3, bucket_name, text_key, entry):
+    """Fetch and decompress one page of paged text with a ranged GET, given its index entry."""
+    byte_range = f"bytes={entry['offset']}-{entry['offset'] + entry['length'] - 1}"
+    body = s3.get_object(Bucket=bucket_name, Key=text_key, Range=byte_range)['Body']
+    try:
+        return gzip.decompress(body.read()).decode('utf-8')
+    finally:
+        body.close()
+
+class S3Storage:
+    """
+    Read PDFs from and write extracted text to an S3 bucket.
+
+    PDFs are spooled to /tmp first, since PyPDF2 and the extraction workers
+    need a seekable local file.
+    """
+
+    def __init__(self, s3, bucket_name):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+
+    def fetch_pdf(self, key):
+        """Make a PDF available locally and return its path and SHA-256."""
+        return spool_s3_object(self.s3, self.bucket_name, key)
+
+    def release_pdf(self, path):
+        remove_quietly(path)
+
+    def open_pdf(self, path):
+        return map_file(path)
+
+    def text_writer(self, key, content_type='text/plain'):
+        return S3MultipartWriter(self.s3, self.bucket_name, key, content_type=content_type)
+
+    def location(self, key):
+        return f"s3://{self.bucket_name}/{key}"
+
+class LocalStorage:
+    """
+    Read PDFs from and write extracted text to the local filesystem.
+
+    PDFs are used in place and memory-mapped, so neither hashing nor parsing
+    copies the file; text keys are paths relative to `output_dir`.
+    """
+
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir
+
+    def fetch_pdf(self, path):
+        """Return the PDF's own path and its SHA-256, hashed straight from the mapping."""
+        with map_file(path) as mapped:
+            return path, hashlib.sha256(mapped).hexdigest()
+
+    def release_pdf(self, path):
+        # The PDF is the caller's file, not a spooled copy
+        pass
+
+    def open_pdf(self, path):
+        return map_file(path)
+
+    def text_writer(self, key, content_type='text/plain'):
+        return LocalTextWriter(self.location(key))
+
+    def location(self, key):
+        return os.path.join(self.output_dir or '.', key)
+
+class LocalTextWriter:
+    """File counterpart of S3MultipartWriter: the file only appears under its name once closed."""
+
+    def __init__(self, path):
+        self.path = path
+        self.bytes_written = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._partial = f"{path}.partial"
+        self._file = open(self._partial, 'wb')
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._partial, self.path)
+
+    def abort(self):
+        self._file.close()
+        remove_quietly(self._partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+try:
+    from .Inspector import traced
+except ImportError:
+    from Inspector import traced
+
+# Set up logging
+logger = logging.getLogger()
+
+# Size of each read from the S3 response body while spooling to /tmp.
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# S3 requires every part of a multipart upload except the last to be at least 5 MiB.
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+SPOOL_DIR = os.environ.get('SPOOL_DIR', tempfile.gettempdir())
+
+def spool_s3_object(s3, bucket_name, key, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Download an S3 object to a temporary file in fixed-size chunks.
+
+    The SHA-256 of the content is computed as the chunks arrive, so hashing
+    costs no extra pass over the file.
+
+    @return A tuple of the spooled file path and the hex SHA-256 digest.
+    """
+    body = s3.get_object(Bucket=bucket_name, Key=key)['Body']
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1], dir=SPOOL_DIR)
+    sha256 = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as spool:
+            for chunk in body.iter_chunks(chunk_size):
+                sha256.update(chunk)
+                spool.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        body.close()
+
+    logger.info(f"Spooled s3://{bucket_name}/{key} to {path}")
+    return path, sha256.hexdigest()
+
+def remove_quietly(path):
+    """Delete a spooled file, ignoring files that are already gone."""
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+class S3MultipartWriter:
+    """
+    Write text to an S3 object as it is produced.
+
+    Written text is buffered until a full part is available and then sent with
+    upload_part, so memory use is bounded by the part size rather than the size
+    of the object. Objects smaller than one part are sent with a single
+    put_object and never start a multipart upload.
+    """
+
+    def __init__(self, s3, bucket_name, key, content_type='text/plain', part_size=MULTIPART_PART_SIZE):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.bytes_written = 0
+
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+
+    @traced('upload_complete')
+    def close(self):
+        """Upload any buffered data and finalize the object."""
+        if self._upload_id is None:
+            self.s3.put_object(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                ContentType=self.content_type
+            )
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        self._buffer = bytearray()
+
+    def abort(self):
+        """Abandon the upload so S3 does not keep the orphaned parts."""
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                UploadId=self._upload_id
+            )
+            self._upload_id = None
+        self._buffer = bytearray()
+
+    @traced('upload_part')
+    def _upload_part(self, part):
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.key,
+                ContentType=self.content_type
+            )
+            self._upload_id = response['UploadId']
+
+        part_number = len(self._parts) + 1
+        response = self.s3.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=part
+        )
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
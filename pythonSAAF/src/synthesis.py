@@ -0,0 +1,322 @@
+import json
+import logging
+import os
+import re
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import audio_cache
+    from .Inspector import traced
+    from .streaming import S3MultipartWriter
+    from .tracking import get_tracker
+except ImportError:
+    import audio_cache
+    from Inspector import traced
+    from streaming import S3MultipartWriter
+    from tracking import get_tracker
+
+# Set up logging
+logger = logging.getLogger()
+
+# Voice settings shared by every synthesis request.
+VOICE = {
+    'Engine': 'neural',
+    'LanguageCode': 'en-US',
+    'VoiceId': 'Matthew',
+    'OutputFormat': 'mp3'
+}
+
+# Polly accepts up to 100,000 billed characters per asynchronous task; much
+# smaller chunks finish sooner and let more of them run side by side.
+MAX_CHUNK_CHARS = int(os.environ.get('SYNTHESIS_CHUNK_CHARS', 20000))
+MAX_IN_FLIGHT = int(os.environ.get('SYNTHESIS_MAX_IN_FLIGHT', 8))
+POLL_INTERVAL = float(os.environ.get('SYNTHESIS_POLL_INTERVAL', 2.0))
+STITCH_AUDIO = os.environ.get('SYNTHESIS_STITCH', 'false').lower() == 'true'
+
+# SNS topic Polly notifies when a task the handler does not wait for ends; the
+# function subscribes to it to finalize the document's status index.
+NOTIFY_TOPIC_ARN = os.environ.get('SYNTHESIS_SNS_TOPIC_ARN', '')
+
+# The opening of a document is spoken with the synchronous API, which accepts
+# at most 3,000 characters, so playback can start before the rest is ready.
+# The document's main audio then starts after the opening, so clients must
+# play OpeningAudioKey first; the mode is off unless they do.
+PROGRESSIVE_AUDIO = os.environ.get('PROGRESSIVE_AUDIO', 'false').lower() == 'true'
+OPENING_CHARS = int(os.environ.get('PROGRESSIVE_OPENING_CHARS', 1500))
+OPENING_MIN_CHARS = 200
+
+PAGE_MARKER = re.compile(r'(?=--- PAGE \d+(?: \(No text detected\))? ---)')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+WHITESPACE = re.compile(r'\s+')
+
+def split_pages(text):
+    """Split handler output back into per-page pieces at the --- PAGE N --- markers."""
+    return [page for page in PAGE_MARKER.split(text) if page.strip()]
+
+def _split_long(text, max_chars):
+    """Split one oversized piece at sentence ends, then whitespace, then hard cuts."""
+    for pattern in (SENTENCE_END, WHITESPACE):
+        pieces = [piece for piece in pattern.split(text) if piece]
+        if all(len(piece) <= max_chars for piece in pieces):
+            return pieces
+        if len(pieces) > 1:
+            return [part for piece in pieces for part in _split_long(piece, max_chars)]
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+def iter_text_chunks(pages, max_chars=MAX_CHUNK_CHARS, page_aligned=False):
+    """
+    Pack page texts into chunks of at most `max_chars` characters.
+
+    Chunks break between pages where possible. A page that does not fit in one
+    chunk is broken between sentences, and only a single sentence longer than
+    `max_chars` is broken mid-sentence. With `page_aligned` every page starts a
+    new chunk, so the same page always produces the same chunks.
+    """
+    chunk = ''
+    for page in pages:
+        pieces = [page] if len(page) <= max_chars else _split_long(page, max_chars)
+        for position, piece in enumerate(pieces):
+            separator = ('\n' if position == 0 else ' ') if chunk else ''
+            new_page = page_aligned and position == 0
+            if new_page or len(chunk) + len(separator) + len(piece) > max_chars:
+                if chunk.strip():
+                    yield chunk
+                chunk, separator = '', ''
+            chunk += separator + piece
+    if chunk.strip():
+        yield chunk
+
+def output_key_from_task(task, bucket_name, fallback_key):
+    """Get the S3 key Polly writes a task's audio to from the task's OutputUri."""
+    uri = task.get('OutputUri')
+    if not uri:
+        return fallback_key
+    path = urllib.parse.unquote(urllib.parse.urlparse(uri).path).lstrip('/')
+    # Path-style URIs include the bucket name before the key.
+    if path.startswith(f"{bucket_name}/"):
+        path = path[len(bucket_name) + 1:]
+    return path
+
+def start_synthesis_task(polly, text, bucket_name, key_prefix, sns_topic_arn=None):
+    """Start an asynchronous Polly task and return its task description."""
+    options = {'SnsTopicArn': sns_topic_arn} if sns_topic_arn else {}
+    response = polly.start_speech_synthesis_task(
+        OutputS3BucketName=bucket_name,
+        OutputS3KeyPrefix=key_prefix,
+        Text=text,
+        **VOICE,
+        **options
+    )
+    return response['SynthesisTask']
+
+def wait_for_task(polly, task_id, poll_interval=POLL_INTERVAL, deadline=None, created=None):
+    """
+    Wait for a Polly task to complete, raising if it fails.
+
+    The task is checked by the container's TaskTracker, together with every
+    other task in flight, starting `poll_interval` seconds from now. With a
+    `deadline` (a time.monotonic() value), TimeoutError is raised once it passes.
+    """
+    timeout = None if deadline is None else max(0, deadline - time.monotonic())
+    return get_tracker(polly, poll_interval).wait(task_id, timeout, created)
+
+def _synthesize_chunk(polly, index, text, bucket_name, key_base, poll_interval, cache_s3, deadline):
+    key_prefix = f"audio/{key_base}/chunks/{index:05d}"
+    if cache_s3 is not None:
+        # Cached audio is keyed by the spoken text, so page markers are not synthesized
+        text = audio_cache.normalize_text(text)
+        key_hash = audio_cache.cache_key(text, VOICE)
+        entry = audio_cache.lookup(cache_s3, bucket_name, key_hash)
+        # A hit is copied next to this document's other chunks, which keeps it playable after eviction
+        output_key = f"{key_prefix}.mp3"
+        if entry is not None and audio_cache.copy_audio(cache_s3, bucket_name, entry, output_key):
+            return {'index': index, 'task_id': None, 'key': output_key, 'characters': len(text), 'cached': True}
+
+    task = start_synthesis_task(polly, text, bucket_name, key_prefix)
+    task = wait_for_task(polly, task['TaskId'], poll_interval, deadline, task.get('CreationTime'))
+    output_key = output_key_from_task(task, bucket_name, f"{key_prefix}.{task['TaskId']}.mp3")
+    if cache_s3 is not None:
+        audio_cache.store(cache_s3, bucket_name, key_hash, output_key, len(text))
+    return {'index': index, 'task_id': task['TaskId'], 'key': output_key, 'characters': len(text), 'cached': False}
+
+@traced()
+def synthesize_chunks(polly, chunks, bucket_name, key_base,
+                      max_in_flight=MAX_IN_FLIGHT, poll_interval=POLL_INTERVAL, cache_s3=None, deadline=None):
+    """
+    Synthesize text chunks with at most `max_in_flight` Polly tasks running at once.
+
+    Passing `cache_s3` enables the audio cache: chunks whose audio is already
+    cached are copied instead of sent to Polly, and new audio is added to the
+    cache. Either way every segment is stored under the document's own key. A task
+    still running at `deadline` (a time.monotonic() value) fails the whole call.
+
+    @return One segment description per chunk, in chunk order.
+    """
+    start = time.time()
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        # `chunks` may be a generator; each chunk is submitted as soon as it is produced
+        futures = [
+            executor.submit(_synthesize_chunk, polly, index, chunk, bucket_name, key_base, poll_interval,
+                            cache_s3, deadline)
+            for index, chunk in enumerate(chunks)
+        ]
+        segments = [future.result() for future in futures]
+    finally:
+        # On failure, don't wait for queued chunks that are no longer needed
+        executor.shutdown(wait=False, cancel_futures=True)
+    hits = sum(1 for segment in segments if segment['cached'])
+    logger.info(f"Synthesized {len(segments) - hits} chunks ({hits} cached) in {time.time() - start:.1f}s "
+                f"with up to {max_in_flight} tasks in flight")
+    return segments
+
+def cache_stats(segments):
+    """Summarize audio cache hits and misses for a set of segments."""
+    hits = [segment for segment in segments if segment['cached']]
+    misses = [segment for segment in segments if not segment['cached']]
+    return {
+        'hits': len(hits),
+        'misses': len(misses),
+        'cachedCharacters': sum(segment['characters'] for segment in hits),
+        'synthesizedCharacters': sum(segment['characters'] for segment in misses)
+    }
+
+@traced()
+def save_playlist(s3, bucket_name, key_base, segments):
+    """Write the ordered list of audio segments for a document and return its key."""
+    playlist_key = f"audio/{key_base}/playlist.json"
+    playlist = {
+        'format': VOICE['OutputFormat'],
+        'voice': VOICE['VoiceId'],
+        'segments': segments
+    }
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=playlist_key,
+        Body=json.dumps(playlist).encode('utf-8'),
+        ContentType='application/json'
+    )
+    logger.info(f"Playlist saved to s3://{bucket_name}/{playlist_key}")
+    return playlist_key
+
+@traced()
+def stitch_audio(s3, bucket_name, segments, output_key):
+    """Concatenate MP3 segments into one object, streaming them through a multipart upload."""
+    with S3MultipartWriter(s3, bucket_name, output_key, content_type='audio/mpeg') as writer:
+        for segment in segments:
+            body = s3.get_object(Bucket=bucket_name, Key=segment['key'])['Body']
+            try:
+                for chunk in body.iter_chunks(1024 * 1024):
+                    writer.write(chunk)
+            finally:
+                body.close()
+    logger.info(f"Stitched {len(segments)} segments into s3://{bucket_name}/{output_key}")
+    return output_key
+
+def opening_length(text, max_chars=OPENING_CHARS):
+    """Length of the prefix of `text` to speak first, ending at a sentence where possible."""
+    if len(text) <= max_chars:
+        return len(text)
+    for pattern in (SENTENCE_END, WHITESPACE):
+        ends = [match.start() for match in pattern.finditer(text, 0, max_chars + 1)]
+        if ends and ends[-1] > 0:
+            return ends[-1]
+    return max_chars
+
+class OpeningSynthesizer:
+    """
+    Speak the start of a document while the rest is still being extracted.
+
+    watch() passes the document's text chunks through unchanged. As soon as
+    the first page, or OPENING_CHARS characters, has gone past, that prefix is
+    sent to the synchronous synthesize_speech API on a background thread and
+    the MP3 is written straight to S3. result() waits for it and reports how
+    many characters of the text it covered, so only the remainder needs to go
+    through the asynchronous task path; remainder() yields that text as it
+    arrives.
+    """
+
+    def __init__(self, polly, s3, bucket_name, key_base, max_chars=OPENING_CHARS):
+        self.polly = polly
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.key = f"audio/{key_base}/opening.mp3"
+        self.max_chars = max_chars
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        self.characters = None
+        self.prefix = ''
+
+    def watch(self, chunks):
+        seen = ''
+        for chunk in chunks:
+            if self._future is None:
+                seen += chunk
+                if len(seen) >= OPENING_MIN_CHARS:
+                    self._start(seen)
+            yield chunk
+        if self._future is None and seen.strip():
+            self._start(seen)
+
+    def remainder(self, chunks):
+        """
+        Yield the text of `chunks` after the opening, which may run on another thread than watch().
+
+        Text is held back until watch() has decided how long the opening is;
+        the skipped text is kept in `prefix` in case the opening fails.
+        """
+        pending = ''
+        for chunk in chunks:
+            if pending is None:
+                yield chunk
+                continue
+            pending += chunk
+            if self.characters is not None:
+                self.prefix, rest = pending[:self.characters], pending[self.characters:]
+                pending = None
+                if rest:
+                    yield rest
+        if pending:
+            # watch() starts the opening before the last chunk is consumed, if at all
+            length = self.characters or 0
+            self.prefix = pending[:length]
+            if pending[length:]:
+                yield pending[length:]
+
+    def _start(self, text):
+        length = opening_length(text, self.max_chars)
+        self.characters = length
+        self._future = self._executor.submit(self._synthesize, text[:length])
+
+    def _synthesize(self, text):
+        start = time.time()
+        spoken = audio_cache.normalize_text(text)
+        response = self.polly.synthesize_speech(Text=spoken, **VOICE)
+        body = response['AudioStream']
+        try:
+            audio = body.read()
+        finally:
+            body.close()
+        self.s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=audio, ContentType='audio/mpeg')
+        logger.info(f"Opening audio ({len(spoken)} characters) saved to s3://{self.bucket_name}/{self.key} "
+                    f"in {time.time() - start:.2f}s")
+        return {'key': self.key, 'characters': len(text)}
+
+    def result(self):
+        """
+        Wait for the opening audio.
+
+        @return The opening's key and the number of text characters it covers,
+                or None if nothing was synthesized.
+        """
+        try:
+            if self._future is None:
+                return None
+            return self._future.result()
+        except Exception as e:
+            logger.warning(f"Opening audio failed, synthesizing the whole document asynchronously: {e}")
+            return None
+        finally:
+            self._executor.shutdown(wait=False)
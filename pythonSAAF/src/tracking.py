@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from datetime import datetime
+from botocore.exceptions import ClientError
+
+# Set up logging
+logger = logging.getLogger()
+
+# A task is checked again after its delay doubles from the poll interval up to
+# this many seconds; each delay is jittered so concurrent documents spread out.
+TRACK_MAX_DELAY = float(os.environ.get('TRACK_MAX_DELAY', 10))
+
+# With this many tasks tracked, a sweep lists the account's in-progress tasks,
+# which answers for every tracked task still running; only tasks missing from
+# the listing, most of them just finished, need a GetSpeechSynthesisTask.
+LIST_MIN_TASKS = 3
+LIST_MAX_PAGES = 3
+
+STATUS_PREFIX = 'status'
+
+def status_key_for(key_base):
+    return f"{STATUS_PREFIX}/{key_base}.json"
+
+def write_status(s3, bucket_name, key_base, status, key=None, task_ids=None, reason=None):
+    """
+    Write a document's audio status index: pending, complete or failed, and the audio key.
+
+    Clients read this one small object instead of probing for the audio.
+    """
+    index = {'status': status, 'key': key, 'updated': round(time.time(), 3)}
+    if task_ids:
+        index['tasks'] = list(task_ids)
+    if reason:
+        index['reason'] = reason
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=status_key_for(key_base),
+        Body=json.dumps(index, separators=(',', ':')).encode('utf-8'),
+        ContentType='application/json',
+        CacheControl='no-cache'
+    )
+    return index
+
+def read_status(s3, bucket_name, key_base):
+    """Return a document's status index, or None if it has none."""
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=status_key_for(key_base))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(response['Body'].read())
+
+def finalize_from_notification(s3, message):
+    """
+    Complete or fail a document's pending status index from a Polly task notification.
+
+    A task the handler does not wait for is started with the SNS topic, and
+    Polly publishes {taskId, taskStatus, outputUri, ...} to it when the task
+    ends, so the index is finalized after the invocation that started it has
+    returned. The document is found from the audio key, audio/<key_base>.<taskId>.mp3.
+
+    @return The written index, or None if the notification is not for a pending task.
+    """
+    task_id = message.get('taskId')
+    status = {'COMPLETED': 'complete', 'FAILED': 'failed'}.get(str(message.get('taskStatus')).upper())
+    path = urllib.parse.unquote(urllib.parse.urlparse(message.get('outputUri', '')).path).lstrip('/')
+    bucket_name, _, key = path.partition('/')
+    suffix = f".{task_id}.mp3"
+    if not task_id or status is None or not key.startswith('audio/') or not key.endswith(suffix):
+        logger.info(f"Ignoring notification for task {task_id} ({message.get('taskStatus')})")
+        return None
+
+    key_base = key[len('audio/'):-len(suffix)]
+    index = read_status(s3, bucket_name, key_base)
+    if index is None or index['status'] != 'pending' or task_id not in index.get('tasks', []):
+        return None
+    return write_status(s3, bucket_name, key_base, status, key, [task_id], message.get('taskStatusReason'))
+
+def _timestamp(value):
+    """Seconds since the epoch of a CreationTime, which boto3 returns as a datetime."""
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+class TaskFailed(RuntimeError):
+    """A Polly synthesis task ended in the failed state."""
+
+class TaskTracker:
+    """
+    Wait for many Polly synthesis tasks with one background thread.
+
+    Every tracked task has its own next-check time, backing off exponentially
+    with jitter. A sweep runs whenever a task is due. With enough tasks
+    tracked it lists in-progress tasks with ListSpeechSynthesisTasks, newest
+    first and only back to the oldest tracked task; every tracked task in the
+    listing is still running and backs off. Due tasks that are not in it are
+    checked one by one.
+    """
+
+    def __init__(self, polly, poll_interval, max_delay=TRACK_MAX_DELAY):
+        self.polly = polly
+        self.poll_interval = poll_interval
+        self.max_delay = max_delay
+        self.sweeps = 0
+        self._tasks = {}
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='task-tracker', daemon=True)
+        self._thread.start()
+
+    def track(self, task_id, created=None):
+        """
+        Return a future that gets the task description once it completes.
+
+        `created` is the task's CreationTime, which lets listings stop early.
+        """
+        with self._condition:
+            if task_id not in self._tasks:
+                self._tasks[task_id] = {'future': Future(), 'attempt': 0, 'due': time.monotonic() + self._delay(0),
+                                        'created': None if created is None else _timestamp(created)}
+                self._condition.notify()
+            return self._tasks[task_id]['future']
+
+    def wait(self, task_id, timeout=None, created=None):
+        """Wait for a task and return its description, raising TimeoutError after `timeout` seconds."""
+        try:
+            return self.track(task_id, created).result(timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Synthesis task {task_id} did not finish within {timeout:.1f}s") from None
+
+    def pending(self):
+        with self._condition:
+            return len(self._tasks)
+
+    def _delay(self, attempt):
+        delay = min(self.max_delay, self.poll_interval * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    due = {task_id for task_id, entry in self._tasks.items() if entry['due'] <= now}
+                    if due:
+                        break
+                    next_due = min((entry['due'] for entry in self._tasks.values()), default=None)
+                    self._condition.wait(None if next_due is None else next_due - now)
+                tracked = set(self._tasks)
+                created = [entry['created'] for entry in self._tasks.values()]
+                oldest = None if None in created else min(created)
+            self._sweep(due, tracked, oldest)
+
+    def _sweep(self, due, tracked, oldest=None):
+        self.sweeps += 1
+        try:
+            tasks = self._fetch(due, tracked, oldest)
+        except Exception as e:
+            logger.warning(f"Checking {len(due)} synthesis tasks failed, retrying: {e}")
+            tasks = {}
+        with self._condition:
+            for task_id in tracked:
+                entry = self._tasks[task_id]
+                task = tasks.get(task_id)
+                status = task['TaskStatus'] if isinstance(task, dict) else None
+                if status == 'completed':
+                    entry['future'].set_result(task)
+                elif status == 'failed' or isinstance(task, Exception):
+                    reason = task.get('TaskStatusReason') if isinstance(task, dict) else task
+                    entry['future'].set_exception(TaskFailed(f"Synthesis task {task_id} failed: {reason}"))
+                else:
+                    # A task seen in the listing was checked too, so it backs off with the due ones
+                    if task_id in due or task is not None:
+                        if isinstance(task, dict) and entry['created'] is None and 'CreationTime' in task:
+                            entry['created'] = _timestamp(task['CreationTime'])
+                        entry['attempt'] += 1
+                        entry['due'] = time.monotonic() + self._delay(entry['attempt'])
+                    continue
+                del self._tasks[task_id]
+            self._condition.notify_all()
+
+    def _fetch(self, due, tracked, oldest=None):
+        """Return {task_id: task description or the error that makes it unknown} for what could be checked."""
+        tasks = {}
+        wanted = set(due)
+        if len(tracked) >= LIST_MIN_TASKS:
+            # Listed newest first; other containers' tasks can push ours back, so
+            # paging stops at the oldest tracked task or after LIST_MAX_PAGES
+            unseen = set(tracked)
+            request = {'MaxResults': 100, 'Status': 'inProgress'}
+            for _ in range(LIST_MAX_PAGES):
+                response = self.polly.list_speech_synthesis_tasks(**request)
+                listed = response.get('SynthesisTasks', [])
+                for task in listed:
+                    if task['TaskId'] in unseen:
+                        tasks[task['TaskId']] = task
+                        unseen.discard(task['TaskId'])
+                past_oldest = (oldest is not None and listed and 'CreationTime' in listed[-1]
+                               and _timestamp(listed[-1]['CreationTime']) < oldest)
+                if not unseen or past_oldest or not response.get('NextToken'):
+                    break
+                request['NextToken'] = response['NextToken']
+            wanted &= unseen
+        for task_id in wanted:
+            try:
+                tasks[task_id] = self.polly.get_speech_synthesis_task(TaskId=task_id)['SynthesisTask']
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'SynthesisTaskNotFoundException':
+                    raise
+                tasks[task_id] = e
+        return tasks
+
+trackers = {}
+_trackers_lock = threading.Lock()
+
+def get_tracker(polly, poll_interval):
+    """Return the container's tracker for a Polly client, started on first use."""
+    with _trackers_lock:
+        tracker = trackers.get((id(polly), poll_interval))
+        if tracker is None or tracker.polly is not polly:
+            tracker = trackers[(id(polly), poll_interval)] = TaskTracker(polly, poll_interval)
+        return tracker
@@ -0,0 +1,100 @@
+"""
+Compare Inspector's columnar CPU poll storage with the earlier dict-per-poll format.
+
+Both store the same /proc/stat snapshots; the script reports memory held by
+the polls (tracemalloc), poll/append time, and the size and time of
+serializing them to JSON.
+
+Usage:
+    python -m pythonSAAF.tests.cpu_polls_benchmark [--polls N] [--cpus N]
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from pythonSAAF.src.Inspector import CPU_VALUES, CPUPollColumns
+
+
+def synthetic_stat(cpus, step):
+    """A /proc/stat snapshot for a host with `cpus` cores, advanced by `step`."""
+    lines = ["cpu  " + " ".join(str(1000 * cpus * step + i) for i in range(10))]
+    for cpu in range(cpus):
+        lines.append(f"cpu{cpu} " + " ".join(str(1000 * step + random.randint(0, 9) + i) for i in range(10)))
+    lines += [
+        "intr 123456 0 0 0",
+        f"ctxt {98765 + step}",
+        "btime 1700000000",
+        f"processes {4321 + step}",
+        "procs_running 2",
+        "procs_blocked 0",
+        "softirq 55555 0 0 0"
+    ]
+    return "\n".join(lines) + "\n"
+
+def legacy_poll(stats, tickRate):
+    """The dict-of-dicts parsing Inspector.pollCPUStats used before columnar storage."""
+    data = {"time": int(round(time.time() * 1000))}
+    lines = stats.split('\n')
+    lines[0] = lines[0].replace("cpu  ", "cpuTotal ")
+    for line in lines:
+        values = line.split(" ")
+        title = values[0].strip()
+        if "cpu" in title:
+            data[title] = {metric: int(values[index + 1]) * tickRate for index, metric in enumerate(CPU_VALUES)}
+        elif len(values) >= 2:
+            data[title] = int(values[1])
+    return data
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    polls = build()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return polls, elapsed, memory
+
+def run(polls, cpus):
+    snapshots = [synthetic_stat(cpus, step) for step in range(polls)]
+    tickRate = 1000 / 100
+
+    legacy, legacyTime, legacyMemory = measure(lambda: [legacy_poll(stats, tickRate) for stats in snapshots])
+
+    def build_columns():
+        columns = CPUPollColumns()
+        for stats in snapshots:
+            columns.append(int(round(time.time() * 1000)), stats)
+        return columns
+    columns, columnsTime, columnsMemory = measure(build_columns)
+
+    start = time.perf_counter()
+    legacyJson = json.dumps(legacy)
+    legacySerialize = time.perf_counter() - start
+    start = time.perf_counter()
+    columnsJson = json.dumps(columns.pack(100))
+    columnsSerialize = time.perf_counter() - start
+
+    return {
+        "polls": polls,
+        "cpus": cpus,
+        "dictOfDicts": {
+            "memoryBytes": legacyMemory,
+            "pollMs": round(legacyTime * 1000, 2),
+            "jsonBytes": len(legacyJson),
+            "serializeMs": round(legacySerialize * 1000, 2)
+        },
+        "columnar": {
+            "memoryBytes": columnsMemory,
+            "pollMs": round(columnsTime * 1000, 2),
+            "jsonBytes": len(columnsJson),
+            "serializeMs": round(columnsSerialize * 1000, 2)
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=1000)
+    parser.add_argument('--cpus', type=int, default=6)
+    args = parser.parse_args()
+    print(json.dumps(run(args.polls, args.cpus), indent=2))
@@ -0,0 +1,294 @@
+"""
+In-process stand-ins for the S3 and Polly clients used by the handler.
+
+They implement only the calls the handler makes, keep everything in memory and
+simulate Polly task latency, so the pipeline can be exercised and timed
+locally without AWS credentials.
+"""
+import io
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from botocore.exceptions import ClientError
+
+
+def _client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class FakeStreamingBody:
+    """Minimal botocore StreamingBody: read, iter_chunks and close."""
+
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amount=None):
+        return self._stream.read(-1 if amount is None else amount)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class FakeS3:
+    """Dictionary-backed S3 client."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self.calls = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        self._record('PutObject')
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        with self._lock:
+            self.objects[(Bucket, Key)] = {
+                'Body': bytes(Body),
+                'ContentType': kwargs.get('ContentType'),
+                'Metadata': kwargs.get('Metadata', {}),
+                'LastModified': time.time()
+            }
+        return {'ETag': f'"{uuid.uuid4().hex}"'}
+
+    def _get(self, Bucket, Key, operation):
+        with self._lock:
+            stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise _client_error('NoSuchKey' if operation == 'GetObject' else '404', 'Not Found', operation)
+        return stored
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._record('GetObject')
+        stored = self._get(Bucket, Key, 'GetObject')
+        data = stored['Body']
+        if Range:
+            start, end = Range.replace('bytes=', '').split('-')
+            data = data[int(start):int(end) + 1 if end else None]
+        return {
+            'Body': FakeStreamingBody(data),
+            'ContentLength': len(data),
+            'ContentType': stored['ContentType'],
+            'Metadata': stored['Metadata']
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._record('HeadObject')
+        stored = self._get(Bucket, Key, 'HeadObject')
+        return {
+            'ContentLength': len(stored['Body']),
+            'ContentType': stored['ContentType'],
+            'Metadata': stored['Metadata']
+        }
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self._record('CopyObject')
+        stored = self._get(CopySource['Bucket'], CopySource['Key'], 'GetObject')
+        with self._lock:
+            self.objects[(Bucket, Key)] = dict(stored, LastModified=time.time())
+        return {'CopyObjectResult': {'ETag': f'"{uuid.uuid4().hex}"'}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._record('DeleteObject')
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self._record('ListObjectsV2')
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {
+            'Contents': [
+                {
+                    'Key': key,
+                    'Size': len(self.objects[(Bucket, key)]['Body']),
+                    'LastModified': datetime.fromtimestamp(self.objects[(Bucket, key)]['LastModified'], timezone.utc)
+                } for key in page
+            ],
+            'KeyCount': len(page),
+            'IsTruncated': start + MaxKeys < len(keys)
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._record('CreateMultipartUpload')
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {'parts': {}, 'ContentType': kwargs.get('ContentType')}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._record('UploadPart')
+        with self._lock:
+            self._uploads[UploadId]['parts'][PartNumber] = bytes(Body)
+        return {'ETag': f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._record('CompleteMultipartUpload')
+        with self._lock:
+            upload = self._uploads.pop(UploadId)
+            body = b''.join(upload['parts'][part['PartNumber']] for part in MultipartUpload['Parts'])
+            self.objects[(Bucket, Key)] = {
+                'Body': body,
+                'ContentType': upload['ContentType'],
+                'Metadata': {},
+                'LastModified': time.time()
+            }
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._record('AbortMultipartUpload')
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?expires={ExpiresIn}"
+
+
+class FakePolly:
+    """
+    Polly client whose tasks complete after a simulated delay.
+
+    A task takes `task_latency` seconds plus `seconds_per_char` for each
+    character, and its MP3 is written to the FakeS3 bucket when it completes.
+    Tasks whose text contains `fail_text` end in the failed state instead.
+    `peak_in_flight` is the most tasks that were running at the same time.
+    """
+
+    MAX_ASYNC_CHARS = 100000
+    MAX_SYNC_CHARS = 3000
+
+    def __init__(self, s3, task_latency=0.05, seconds_per_char=0.0, sync_latency=0.01, fail_text=None):
+        self.s3 = s3
+        self.task_latency = task_latency
+        self.seconds_per_char = seconds_per_char
+        self.sync_latency = sync_latency
+        self.fail_text = fail_text
+        self.tasks = {}
+        self.characters = 0
+        self.peak_in_flight = 0
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation, characters=0):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            self.characters += characters
+
+    @staticmethod
+    def audio_for(text):
+        return b'ID3' + text.encode('utf-8')[:64]
+
+    def start_speech_synthesis_task(self, Text, OutputS3BucketName, OutputS3KeyPrefix='', **kwargs):
+        if len(Text) > self.MAX_ASYNC_CHARS:
+            raise _client_error('TextLengthExceededException', 'Text too long', 'StartSpeechSynthesisTask')
+        self._record('StartSpeechSynthesisTask', len(Text))
+        task_id = str(uuid.uuid4())
+        key = f"{OutputS3KeyPrefix}.{task_id}.mp3"
+        task = {
+            'TaskId': task_id,
+            'TaskStatus': 'scheduled',
+            'OutputUri': f"https://s3.local.amazonaws.com/{OutputS3BucketName}/{key}",
+            'RequestCharacters': len(Text),
+            'CreationTime': time.time(),
+            '_bucket': OutputS3BucketName,
+            '_key': key,
+            '_text': Text,
+            '_done_at': time.time() + self.task_latency + self.seconds_per_char * len(Text)
+        }
+        with self._lock:
+            self.tasks[task_id] = task
+            now = time.time()
+            running = sum(1 for other in self.tasks.values() if other['_done_at'] > now)
+            self.peak_in_flight = max(self.peak_in_flight, running)
+        return {'SynthesisTask': self._public(task)}
+
+    def get_speech_synthesis_task(self, TaskId):
+        self._record('GetSpeechSynthesisTask')
+        with self._lock:
+            task = self.tasks.get(TaskId)
+        if task is None:
+            raise _client_error('SynthesisTaskNotFoundException', 'Task not found', 'GetSpeechSynthesisTask')
+        return {'SynthesisTask': self._public(self._advance(task))}
+
+    def list_speech_synthesis_tasks(self, MaxResults=100, NextToken=None, Status=None):
+        self._record('ListSpeechSynthesisTasks')
+        with self._lock:
+            tasks = sorted(self.tasks.values(), key=lambda task: task['CreationTime'], reverse=True)
+        tasks = [self._advance(task) for task in tasks]
+        if Status:
+            tasks = [task for task in tasks if task['TaskStatus'] == Status]
+        start = int(NextToken or 0)
+        response = {'SynthesisTasks': [self._public(task) for task in tasks[start:start + MaxResults]]}
+        if start + MaxResults < len(tasks):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def _advance(self, task):
+        """Move a task on to its current status, writing its MP3 once it is done."""
+        if task['TaskStatus'] in ('completed', 'failed'):
+            return task
+        if time.time() >= task['_done_at']:
+            if self.fail_text and self.fail_text in task['_text']:
+                task['TaskStatus'] = 'failed'
+                task['TaskStatusReason'] = 'Simulated failure'
+            else:
+                self.s3.put_object(Bucket=task['_bucket'], Key=task['_key'],
+                                   Body=self.audio_for(task['_text']), ContentType='audio/mpeg')
+                task['TaskStatus'] = 'completed'
+        elif task['TaskStatus'] == 'scheduled':
+            task['TaskStatus'] = 'inProgress'
+        return task
+
+    def notification(self, task_id):
+        """The message Polly publishes to a task's SnsTopicArn, once the task has ended."""
+        with self._lock:
+            task = self.tasks[task_id]
+        task = self._advance(task)
+        message = {
+            'taskId': task_id,
+            'taskStatus': task['TaskStatus'].upper(),
+            'outputUri': task['OutputUri'],
+            'requestCharacters': task['RequestCharacters']
+        }
+        if 'TaskStatusReason' in task:
+            message['taskStatusReason'] = task['TaskStatusReason']
+        return message
+
+    def synthesize_speech(self, Text, **kwargs):
+        if len(Text) > self.MAX_SYNC_CHARS:
+            raise _client_error('TextLengthExceededException', 'Text too long', 'SynthesizeSpeech')
+        self._record('SynthesizeSpeech', len(Text))
+        time.sleep(self.sync_latency + self.seconds_per_char * len(Text))
+        return {
+            'AudioStream': FakeStreamingBody(self.audio_for(Text)),
+            'ContentType': 'audio/mpeg',
+            'RequestCharacters': len(Text)
+        }
+
+    @staticmethod
+    def _public(task):
+        return {key: value for key, value in task.items() if not key.startswith('_')}
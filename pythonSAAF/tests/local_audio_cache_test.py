@@ -0,0 +1,79 @@
+import json
+import time
+from pythonSAAF.src import clients, handler
+from pythonSAAF.src.audio_cache import CACHE_TTL, TOUCH_INTERVAL, cache_key, entry_key, evict, lookup, normalize_text, store
+from pythonSAAF.src.synthesis import VOICE, save_playlist, synthesize_chunks
+from pythonSAAF.tests.fakes import FakePolly, FakeS3
+
+
+def cache_audio(s3, text, age=0):
+    """Store an entry and its document's audio as Polly would, last used `age` seconds ago."""
+    key_hash = cache_key(normalize_text(text), VOICE)
+    audio_key = f"audio/doc-{key_hash[:8]}/chunks/00000.task.mp3"
+    s3.put_object(Bucket='bucket', Key=audio_key, Body=b'ID3')
+    store(s3, 'bucket', key_hash, audio_key, len(text))
+    for key in (audio_key, entry_key(key_hash)):
+        s3.objects[('bucket', key)]['LastModified'] -= age
+    return key_hash, audio_key
+
+def test_lookup_hits_refreshes_and_expires():
+    s3 = FakeS3()
+    key_hash, audio_key = cache_audio(s3, "--- PAGE 1 ---\nSome   spoken text.")
+    assert cache_key(normalize_text("Some spoken text."), VOICE) == key_hash
+    assert lookup(s3, 'bucket', key_hash)['key'] == audio_key
+    assert lookup(s3, 'bucket', cache_key("Other text.", VOICE)) is None
+
+    # A hit after the touch interval rewrites last_access, later ones within it do not
+    puts = s3.calls['PutObject']
+    later = time.time() + TOUCH_INTERVAL + 60
+    assert lookup(s3, 'bucket', key_hash, now=later)['last_access'] == int(later)
+    assert lookup(s3, 'bucket', key_hash, now=later + 60) is not None
+    assert s3.calls['PutObject'] == puts + 1
+
+    assert lookup(s3, 'bucket', key_hash, now=later + CACHE_TTL + 60) is None
+
+def test_evict_lists_without_reading_entries():
+    s3 = FakeS3()
+    expired = cache_audio(s3, "Old text.", age=CACHE_TTL + 60)
+    oldest = cache_audio(s3, "Older text.", age=300)
+    newest = [cache_audio(s3, f"Recent text {index}.", age=index) for index in range(3)]
+    gets = s3.calls.get('GetObject', 0)
+
+    assert evict(s3, 'bucket', max_entries=3) == 2
+    assert s3.calls.get('GetObject', 0) == gets
+    for key_hash, audio_key in (expired, oldest):
+        assert ('bucket', entry_key(key_hash)) not in s3.objects
+        # The audio belongs to its document, not to the cache
+        assert ('bucket', audio_key) in s3.objects
+    for key_hash, audio_key in newest:
+        assert ('bucket', entry_key(key_hash)) in s3.objects and ('bucket', audio_key) in s3.objects
+
+def test_playlists_survive_eviction():
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=0.01)
+    chunks = ["First chunk.", "Second chunk."]
+    first = synthesize_chunks(polly, chunks, 'bucket', 'first', poll_interval=0.01, cache_s3=s3)
+    second = synthesize_chunks(polly, chunks, 'bucket', 'second', poll_interval=0.01, cache_s3=s3)
+    assert [segment['cached'] for segment in second] == [True, True]
+    assert polly.calls['StartSpeechSynthesisTask'] == 2
+
+    playlists = [save_playlist(s3, 'bucket', key_base, segments)
+                 for key_base, segments in (('first', first), ('second', second))]
+    assert evict(s3, 'bucket', max_entries=0) == 2
+    for playlist_key in playlists:
+        playlist = json.loads(s3.objects[('bucket', playlist_key)]['Body'])
+        for segment, text in zip(playlist['segments'], chunks):
+            assert segment['key'].startswith(playlist_key.rsplit('/', 1)[0] + '/chunks/')
+            assert s3.objects[('bucket', segment['key'])]['Body'] == FakePolly.audio_for(text)
+
+def test_eviction_runs_from_its_scheduled_event():
+    s3 = FakeS3()
+    _, audio_key = cache_audio(s3, "Old text.", age=CACHE_TTL + 60)
+    clients.set_client('s3', s3)
+    try:
+        result = handler.lambda_handler({'audio_cache_evict': {'bucket': 'bucket'}}, None)
+    finally:
+        clients.reset_clients()
+    assert result['statusCode'] == 200
+    assert json.loads(result['body'])['message'] == "Evicted 1 audio cache entries."
+    assert list(s3.objects) == [('bucket', audio_key)]
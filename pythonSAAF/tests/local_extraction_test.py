@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+import pytest
+from pythonSAAF.src.extraction import iter_extracted_pages, open_pdf_reader
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), 'test_data', 'sample2.pdf')
+
+
+def test_pages_come_back_in_order_across_workers():
+    with open(SAMPLE_PDF, 'rb') as pdf_file:
+        pdf_reader = open_pdf_reader(pdf_file)
+        expected = [(page_num, page.extract_text()) for page_num, page in enumerate(pdf_reader.pages[:12], start=1)]
+        pages = list(iter_extracted_pages(pdf_reader, SAMPLE_PDF, workers=3))
+    assert [page_num for page_num, _ in pages] == list(range(1, len(pdf_reader.pages) + 1))
+    assert pages[:12] == expected
+    assert multiprocessing.active_children() == []
+
+def test_worker_failure_propagates_and_workers_are_reaped(tmp_path):
+    with open(SAMPLE_PDF, 'rb') as pdf_file:
+        pdf_reader = open_pdf_reader(pdf_file)
+        # The workers cannot open their copy of the document
+        with pytest.raises(RuntimeError, match='worker failed'):
+            list(iter_extracted_pages(pdf_reader, str(tmp_path / 'missing.pdf'), workers=3))
+    assert multiprocessing.active_children() == []
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import pytest
+from pythonSAAF.src import Inspector, clients, handler
+from pythonSAAF.src.profiler import LocalProfileStore, Profiler
+from pythonSAAF.tests.fakes import FakePolly, FakeS3
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+def upload(s3, key, name='sample.pdf'):
+    with open(os.path.join(TEST_DATA, name), 'rb') as pdf_file:
+        etag = s3.put_object(Bucket='bucket', Key=key, Body=pdf_file.read())['ETag']
+    return {'bucket': {'name': 'bucket'}, 'object': {'key': key, 'eTag': etag.strip('"')}}
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setattr(handler, 'POLL_INTERVAL', 0.01)
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=0.01)
+    clients.set_client('s3', s3)
+    clients.set_client('polly', polly)
+    yield s3, polly
+    clients.reset_clients()
+
+def test_main_audio_covers_the_whole_document_by_default(aws):
+    s3, polly = aws
+    result = handler.process_record(upload(s3, 'docs/report.pdf'), extract_workers=1)
+    audio = json.loads(result['body'])['Audio']
+    assert 'OpeningAudioKey' not in audio and 'SynthesizeSpeech' not in polly.calls
+
+    with open(os.path.join(TEST_DATA, 'sample.pdf'), 'rb') as pdf_file:
+        first_line = handler.open_pdf_reader(pdf_file).pages[0].extract_text().strip().splitlines()[0]
+    [task] = polly.tasks.values()
+    assert task['_text'].lstrip().startswith(first_line.strip())
+
+def test_same_content_is_not_synthesized_again(aws):
+    s3, polly = aws
+    first = handler.process_record(upload(s3, 'docs/report.pdf'), extract_workers=1)
+    assert first['statusCode'] == 200 and 'Deduplicated' not in json.loads(first['body'])
+    synthesis_calls = ('StartSpeechSynthesisTask', 'SynthesizeSpeech')
+    started = {operation: polly.calls.get(operation, 0) for operation in synthesis_calls}
+
+    # The same bytes under another name are found by their sha256 after the download
+    copy = handler.process_record(upload(s3, 'docs/copy.pdf'), extract_workers=1)
+    assert json.loads(copy['body'])['Deduplicated'] is True
+    assert json.loads(copy['body'])['Audio']['AudioKey'] == json.loads(first['body'])['Audio']['AudioKey']
+
+    # A retry of the same upload is found by its ETag before downloading
+    record = upload(s3, 'docs/retry.pdf')
+    handler.process_record(record, extract_workers=1)
+    downloads = s3.calls['GetObject']
+    retry = handler.process_record(record, extract_workers=1)
+    assert json.loads(retry['body'])['Deduplicated'] is True
+    assert s3.calls['GetObject'] - downloads == 2  # the ETag pointer and the manifest, not the PDF
+    # The tracker may still be polling the first task, but nothing new was synthesized
+    assert {operation: polly.calls.get(operation, 0) for operation in synthesis_calls} == started
+
+def test_failed_record_is_reported_alone(aws, monkeypatch):
+    s3, _ = aws
+    # Two records side by side, each extracting with two workers started off the main thread
+    monkeypatch.setattr(handler, 'detect_cpu_cores', lambda: 4)
+    good = upload(s3, 'docs/long.pdf', name='sample2.pdf')
+    missing = {'bucket': {'name': 'bucket'}, 'object': {'key': 'docs/missing.pdf'}}
+    records = [('message-1', good), ('message-2', missing)]
+
+    result = handler.process_records(records)
+    assert result['statusCode'] == 207
+    assert result['batchItemFailures'] == [{'itemIdentifier': 'message-2'}]
+    results = json.loads(result['body'])['results']
+    assert [item['statusCode'] for item in results] == [200, 500]
+    assert results[0]['body']['Number of Pages'] == 35
+
+def test_malformed_records_fail_alone(aws):
+    s3, _ = aws
+    good = upload(s3, 'docs/report.pdf')
+    event = {'Records': [
+        {'eventSource': 'aws:sqs', 'messageId': 'message-1', 'body': json.dumps({'Records': [{'s3': good}]})},
+        {'eventSource': 'aws:sqs', 'messageId': 'message-2', 'body': '{not json'},
+        {'eventSource': 'aws:sqs', 'messageId': 'message-3', 'body': json.dumps({'Records': [{}]})}
+    ]}
+
+    result = handler.lambda_handler(event, None)
+    assert result['statusCode'] == 207
+    assert result['batchItemFailures'] == [{'itemIdentifier': 'message-2'}, {'itemIdentifier': 'message-3'}]
+    results = json.loads(result['body'])['results']
+    assert [item['statusCode'] for item in results] == [200, 500, 500]
+    assert results[1]['body']['error'].startswith('Invalid record: JSONDecodeError')
+    assert Inspector.activeInspector is None
+
+    # A direct S3 record without its s3 section fails the same way
+    result = handler.lambda_handler({'Records': [{'eventSource': 'aws:s3'}]}, None)
+    assert result['statusCode'] == 500
+    assert result['batchItemFailures'] == [{'itemIdentifier': 'record-0'}]
+    assert Inspector.activeInspector is None
+
+def test_local_file_event_writes_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(handler, 'LOCAL_OUTPUT_DIR', str(tmp_path))
+    pdf_path = os.path.join(TEST_DATA, 'sample.pdf')
+
+    result = handler.lambda_handler({'local_file_path': pdf_path}, None)
+    assert result['statusCode'] == 200 and result['batchItemFailures'] == []
+    body = json.loads(result['body'])
+    assert body['Number of Pages'] == 4
+    assert body['Text Saved To'] == str(tmp_path / 'extracted-text' / 'sample.txt')
+
+    with open(body['Text Saved To'], encoding='utf-8') as file:
+        text = file.read()
+    assert text.startswith('--- PAGE 1 ---\n') and '\n--- PAGE 4 ---\n' in text
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_reader = handler.open_pdf_reader(pdf_file)
+        assert pdf_reader.pages[3].extract_text().strip() in text
+
+def test_local_files_with_the_same_name_keep_their_own_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(handler, 'LOCAL_OUTPUT_DIR', str(tmp_path / 'out'))
+    paths = []
+    for folder, name in (('a', 'sample.pdf'), ('b', 'sample2.pdf')):
+        os.makedirs(tmp_path / 'archive' / folder)
+        paths.append(str(tmp_path / 'archive' / folder / 'report.pdf'))
+        shutil.copy(os.path.join(TEST_DATA, name), paths[-1])
+
+    result = handler.lambda_handler({'local_file_paths': paths}, None)
+    assert result['statusCode'] == 200
+    saved = [item['body']['Text Saved To'] for item in json.loads(result['body'])['results']]
+    assert saved == [str(tmp_path / 'out' / 'extracted-text' / folder / 'report.txt') for folder in ('a', 'b')]
+    assert [item['body']['Number of Pages'] for item in json.loads(result['body'])['results']] == [4, 35]
+
+    # A file outside an explicit root is refused rather than written outside LOCAL_OUTPUT_DIR
+    result = handler.lambda_handler({'local_file_path': paths[0], 'local_root': str(tmp_path / 'archive' / 'b')},
+                                    None)
+    assert result['statusCode'] == 500
+
+def test_profile_sample_excludes_the_wait_for_unwaited_tasks(aws, tmp_path, monkeypatch):
+    s3, polly = aws
+    polly.task_latency = 1.0
+    store = LocalProfileStore(str(tmp_path / 'profiles.jsonl'))
+    monkeypatch.setattr(handler, 'profiler', Profiler(store))
+
+    # sample.pdf is a single Polly task, which the invocation leaves running
+    result = handler.lambda_handler({'Records': [{'s3': upload(s3, 'docs/report.pdf')}]}, None)
+    assert result['statusCode'] == 200
+
+    with open(store.path, encoding='utf-8') as file:
+        sample = json.loads(file.readline())
+    assert sample['pages'] == 4
+    assert sample['runtime'] < 1000
@@ -0,0 +1,100 @@
+import threading
+import time
+from pythonSAAF.src.Inspector import CPU_VALUES, CPUPollColumns, Inspector, currentSpan, span, traced
+from pythonSAAF.tests.cpu_polls_benchmark import legacy_poll, synthetic_stat
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+@traced()
+def parse_page(seconds):
+    time.sleep(seconds)
+
+def test_spans_nest_across_threads_with_the_sampler_running():
+    inspector = Inspector()
+    inspector.startSampler(interval=0.01)
+
+    with span('handler'):
+        parent = currentSpan()
+
+        def worker():
+            with span('record', parent):
+                parse_page(0.02)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        with span('download'):
+            parse_page(0.02)
+        thread.join()
+    attributes = inspector.finish()
+
+    assert attributes['samplerSamples'] > 0
+    assert [record['name'] for record in attributes['spans']] == ['handler']
+    handler = attributes['spans'][0]
+    children = {record['name']: record for record in handler['children']}
+    assert set(children) == {'record', 'download'}
+    for name in ('record', 'download'):
+        assert [record['name'] for record in children[name]['children']] == ['parse_page']
+        assert children[name]['children'][0]['runtime'] >= 20
+    assert handler['runtime'] >= max(record['runtime'] for record in children.values())
+
+def test_profiler_reports_hot_functions_and_skips_idle_threads():
+    idle = threading.Event()
+    waiter = threading.Thread(target=idle.wait, daemon=True)
+    waiter.start()
+    inspector = Inspector()
+    inspector.startProfiler(interval=0.002)
+
+    worker = threading.Thread(target=busy_loop, args=(0.3,))
+    worker.start()
+    worker.join()
+    attributes = inspector.finish()
+    idle.set()
+
+    profile = attributes['profile']
+    assert profile['samples'] > 10
+    functions = {entry['function']: entry for entry in profile['functions']}
+    assert functions['busy_loop']['cumulative'] > 100
+    assert functions['busy_loop']['file'] == 'tests/local_inspector_test.py'
+    assert 'wait' not in functions
+
+def test_profiling_is_off_by_default():
+    assert 'profile' not in Inspector().finish()
+
+def test_cpu_poll_columns_match_the_dict_format():
+    tickRate = 1000 / 100
+    columns = CPUPollColumns(capacity=2)
+    legacy = []
+    for step in range(5):
+        stats = synthetic_stat(4, step)
+        columns.append(1700000000000 + step, stats)
+        legacy.append(dict(legacy_poll(stats, tickRate), time=1700000000000 + step))
+
+    assert columns.toDicts(tickRate) == legacy
+
+    # The packed columns decode to the same polls
+    packed = columns.pack(100)
+    assert packed['count'] == 5
+    unpacked = {name: CPUPollColumns.unpack(encoded) for name, encoded in packed['columns'].items()}
+    times = CPUPollColumns.unpack(packed['time'])
+    for poll, expected in enumerate(legacy):
+        assert times[poll] == expected['time']
+        for title, value in expected.items():
+            if isinstance(value, dict):
+                assert {metric: unpacked[f"{title}.{metric}"][poll] * tickRate for metric in CPU_VALUES} == value
+            elif title != 'time':
+                assert unpacked[title][poll] == value
+
+def test_cpu_polls_default_to_the_dict_format():
+    inspector = Inspector()
+    inspector.inspectCPU()
+    inspector.inspectCPUDelta()
+    inspector.processCPUPolls()
+    polls = inspector.finish()['cpuPolls']
+    assert isinstance(polls, list) and len(polls) == 2
+    assert set(polls[0]['cpuTotal']) == set(CPU_VALUES)
@@ -0,0 +1,51 @@
+import io
+import json
+from pythonSAAF.src.metrics import Histogram, MetricsEmitter, cpu_utilization
+
+
+def test_histogram_percentiles_are_close():
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.add(value)
+
+    assert histogram.count == 1000
+    assert histogram.min == 1 and histogram.max == 1000
+    for percent in (50, 90, 99):
+        assert abs(histogram.percentile(percent) - percent * 10) <= percent * 10 * 0.1
+
+def test_histogram_values_fit_emf_limit():
+    histogram = Histogram()
+    for exponent in range(-200, 200):
+        histogram.add(1.1 ** exponent)
+    histogram.add(0)
+
+    values, counts = histogram.values(max_values=100)
+    assert len(values) == len(counts) == 100
+    assert sum(counts) == histogram.count
+    assert values == sorted(values)
+
+def test_emitter_flushes_one_emf_record_per_period():
+    stream = io.StringIO()
+    emitter = MetricsEmitter(flush_invocations=3, flush_seconds=3600, stream=stream)
+    attributes = {'uuid': 'container', 'invocations': 1, 'runtime': 120, 'userRuntime': 100,
+                  'cpuUserDelta': 40, 'cpuKernelDelta': 10, 'cpuCores': 2, 'cpuInfo': ['large']}
+
+    summaries = []
+    for _ in range(3):
+        emitter.observe('pagesPerSecond', 12.5)
+        summaries.append(emitter.end_invocation(attributes))
+
+    assert 'cpuInfo' not in summaries[0]
+    assert summaries[0]['cpuUtilization'] == cpu_utilization(attributes) == 25.0
+    assert 'metricsFlushed' not in summaries[1] and summaries[2]['metricsFlushed']
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(records) == 1
+    record = records[0]
+    assert record['invocations'] == 3
+    assert record['latency']['Count'] == 3 and record['pagesPerSecond']['Sum'] == 37.5
+    names = [metric['Name'] for metric in record['_aws']['CloudWatchMetrics'][0]['Metrics']]
+    assert {'latency', 'pagesPerSecond', 'cpuUtilization', 'invocations'} <= set(names)
+
+    # Nothing is left to report until the next invocation
+    assert emitter.flush() is None
@@ -0,0 +1,62 @@
+from pythonSAAF.src.normalization import TextNormalizer
+
+BODIES = ["Foxes are small.", "They live in dens.", "Most hunt alone.", "Kits stay near home.", "The end."]
+
+
+def test_running_headers_footers_and_page_numbers_are_dropped():
+    pages = [
+        f"\n--- PAGE {page} ---\nA Study of Foxes\n{body}\nJournal of Canids, Vol. 3\n{page}"
+        for page, body in enumerate(BODIES, start=1)
+    ] + ["\n--- PAGE 6 (No text detected) ---"]
+    normalizer = TextNormalizer()
+
+    spoken = list(normalizer.normalize(iter(pages)))
+
+    assert len(spoken) == 5
+    assert spoken == [f"\n{body}" for body in BODIES]
+    stats = normalizer.stats()
+    assert stats['removedCharacters'] == sum(map(len, pages)) - sum(map(len, spoken))
+    assert stats['removedLines'] == 15
+
+def test_hyphenated_words_are_rejoined_and_short_documents_kept():
+    pages = ["\n--- PAGE 1 ---\nA well-known exam-\nple of hyphen-\nation.", "\n--- PAGE 2 ---\nThe End"]
+
+    spoken = "".join(TextNormalizer().normalize(iter(pages)))
+
+    assert spoken == "\nA well-known example of hyphenation.\nThe End"
+
+def test_roman_numerals_are_dropped_only_as_page_numbers():
+    # One-word lines that read as roman numerals are kept unless they repeat
+    pages = ["\n--- PAGE 1 ---\nWho saw the fox first?\nI", "\n--- PAGE 2 ---\ncivil\nThe fox was polite.",
+             "\n--- PAGE 3 ---\nChapter\nxi"]
+    assert "".join(TextNormalizer().normalize(iter(pages))) == "".join(
+        "\n" + page.split("---\n", 1)[1] for page in pages)
+
+    # Front matter numbered i, ii, iii, and a numeral after "Page", are page numbers
+    pages = [f"\n--- PAGE {page} ---\n{body}\n{numeral}"
+             for page, (body, numeral) in enumerate(zip(BODIES, ["i", "ii", "iii"]), start=1)]
+    pages.append("\n--- PAGE 4 ---\nPage iv\nThe civil fox.")
+    assert list(TextNormalizer().normalize(iter(pages))) == [f"\n{body}" for body in BODIES[:3]] + ["\nThe civil fox."]
+
+def test_chapter_headings_and_numbered_body_lines_are_kept():
+    # Chapters start on a few pages only, so their headings are not running headers
+    pages = []
+    for page in range(1, 9):
+        heading = f"Chapter {page // 3 + 1}\n" if page in (1, 4, 7) else ""
+        pages.append(f"\n--- PAGE {page} ---\n{heading}{BODIES[page % 5]}\nWe counted {page} foxes.\n"
+                     f"Then {page * 2} more.\nA Study of Foxes\n{page}")
+    spoken = list(TextNormalizer().normalize(iter(pages)))
+    assert spoken[0] == f"\nChapter 1\n{BODIES[1]}\nWe counted 1 foxes.\nThen 2 more."
+    assert [text.startswith("\nChapter") for text in spoken] == [page in (1, 4, 7) for page in range(1, 9)]
+    assert all("A Study of Foxes" not in text and not text.endswith(("\n7", "\n8")) for text in spoken)
+
+    # Short pages whose body lines differ only by numbers keep those lines
+    pages = [f"\n--- PAGE {page} ---\nA Study of Foxes\nWe counted {page} foxes.\nThen {page * 2} more.\n{page}"
+             for page in range(1, 5)]
+    assert list(TextNormalizer().normalize(iter(pages))) == [
+        f"\nWe counted {page} foxes.\nThen {page * 2} more." for page in range(1, 5)]
+
+def test_a_page_is_never_silenced():
+    pages = [f"\n--- PAGE {page} ---\nChapter {page}\nThis is paragraph number {page}." for page in range(1, 5)]
+    assert list(TextNormalizer().normalize(iter(pages))) == [
+        f"\nChapter {page}\nThis is paragraph number {page}." for page in range(1, 5)]
@@ -0,0 +1,78 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pythonSAAF.src import ocr, ocr_worker
+
+
+class FakeTranscriber:
+    def __init__(self):
+        self.batches = []
+
+    def transcribe(self, images):
+        self.batches.append(list(images))
+        return [f"text of {image}" for image in images]
+
+def test_textless_pages_are_transcribed_in_batches_and_in_order(monkeypatch):
+    # Page 5 has no image; the fake "image" of a page is its number
+    monkeypatch.setattr(ocr, 'page_image', lambda page: page)
+    reader = type('Reader', (), {'pages': [1, 2, 3, 4, None, 6, 7]})()
+    pages = [(1, ''), (2, ''), (3, ''), (4, 'typed'), (5, ''), (6, ''), (7, '')]
+    transcriber = FakeTranscriber()
+
+    recognized = list(ocr.recognize_pages(iter(pages), reader, transcriber, batch_size=2))
+
+    assert recognized == [(1, 'text of 1'), (2, 'text of 2'), (3, 'text of 3'), (4, 'typed'),
+                          (5, ''), (6, 'text of 6'), (7, 'text of 7')]
+    assert transcriber.batches == [[1, 2], [3], [6], [7]]
+
+def test_transcriber_is_only_looked_up_for_a_textless_page(monkeypatch):
+    monkeypatch.setattr(ocr, 'page_image', lambda page: page)
+    lookups = []
+    transcriber = FakeTranscriber()
+    monkeypatch.setattr(ocr, 'get_transcriber', lambda: lookups.append(True) or transcriber)
+    reader = type('Reader', (), {'pages': [1, 2, 3]})()
+
+    assert list(ocr.recognize_pages(iter([(1, 'typed'), (2, 'typed')]), reader)) == [(1, 'typed'), (2, 'typed')]
+    assert lookups == []
+    recognized = list(ocr.recognize_pages(iter([(1, 'typed'), (2, ''), (3, '')]), reader, batch_size=2))
+    assert recognized == [(1, 'typed'), (2, 'text of 2'), (3, 'text of 3')]
+    assert lookups == [True]
+
+def test_availability_check_does_not_import_the_model_packages(monkeypatch):
+    monkeypatch.setattr(ocr, 'transcriber', None)
+    monkeypatch.setattr(ocr, 'OCR_WORKER_SOCKET', '')
+    found = []
+    monkeypatch.setattr(ocr.importlib.util, 'find_spec', lambda name: found.append(name) or object())
+
+    assert isinstance(ocr.get_transcriber(), ocr.SmolVLMTranscriber)
+    assert found == ['PIL', 'torch', 'transformers']
+    assert 'torch' not in sys.modules and 'transformers' not in sys.modules
+
+    # Without the packages, text-less pages pass through silent
+    monkeypatch.setattr(ocr, 'transcriber', None)
+    monkeypatch.setattr(ocr.importlib.util, 'find_spec', lambda name: None)
+    reader = type('Reader', (), {'pages': [1]})()
+    assert list(ocr.recognize_pages(iter([(1, '')]), reader)) == [(1, '')]
+
+def test_worker_coalesces_concurrent_requests_over_its_socket(monkeypatch, tmp_path):
+    # Images travel as their own names
+    monkeypatch.setattr(ocr_worker, 'encode_image', lambda image: image)
+    monkeypatch.setattr(ocr_worker, 'decode_image', lambda data: data)
+    transcriber = FakeTranscriber()
+    transcriber.generated_tokens = 0
+    worker = ocr_worker.BatchingWorker(transcriber, max_batch=4, max_wait=0.5)
+    path = str(tmp_path / 'ocr.sock')
+    server = ocr_worker.OcrServer(path, worker)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = ocr_worker.OcrWorkerClient(path, timeout=5)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(client.transcribe, [['a', 'b'], ['c'], ['d', 'e']]))
+        stats = client.stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert results == [['text of a', 'text of b'], ['text of c'], ['text of d', 'text of e']]
+    assert sorted(map(len, transcriber.batches)) == [1, 4]
+    assert stats['images'] == 5 and stats['batches'] == 2 and stats['queueDepth'] == 0
@@ -0,0 +1,105 @@
+import threading
+import time
+import pytest
+from pythonSAAF.src.pipeline import PipelineCancelled, Stage, fan_out
+from pythonSAAF.src.synthesis import OpeningSynthesizer
+from pythonSAAF.tests.fakes import FakePolly, FakeS3
+
+
+def test_stages_consume_while_items_are_produced():
+    seen = []
+    first_consumed = threading.Event()
+
+    def consume(items):
+        for item in items:
+            seen.append(item)
+            first_consumed.set()
+        return len(seen)
+
+    def produce():
+        yield 'page 1'
+        # The stage has the first page before the second is produced
+        assert first_consumed.wait(1)
+        yield 'page 2'
+
+    stages = [Stage('count', consume, maxsize=1), Stage('join', lambda items: "".join(items))]
+    assert fan_out(produce(), stages) == [2, 'page 1page 2']
+
+def test_failed_producer_cancels_stages():
+    cancelled = []
+
+    def consume(items):
+        try:
+            for _ in items:
+                pass
+        except PipelineCancelled:
+            cancelled.append(True)
+            raise
+
+    def produce():
+        yield 'page 1'
+        raise ValueError('broken page')
+
+    with pytest.raises(ValueError):
+        fan_out(produce(), [Stage('stage', consume)])
+    assert cancelled == [True]
+
+def test_failed_stage_stops_production():
+    def consume(items):
+        next(items)
+        raise RuntimeError('upload failed')
+
+    produced = []
+
+    def produce():
+        for page in range(1000):
+            produced.append(page)
+            time.sleep(0.001)
+            yield str(page)
+
+    with pytest.raises(RuntimeError):
+        fan_out(produce(), [Stage('upload', consume, maxsize=1)])
+    assert len(produced) < 1000
+
+def test_stage_failing_on_close_cancels_later_stages():
+    def upload(items):
+        for _ in items:
+            pass
+        raise RuntimeError('complete_multipart_upload failed')
+
+    cancelled = []
+
+    def synthesize(items):
+        try:
+            return list(items)
+        except PipelineCancelled:
+            cancelled.append(True)
+            raise
+
+    stages = [Stage('upload_text', upload), Stage('synthesize', synthesize)]
+    errors = []
+
+    def run():
+        try:
+            fan_out(iter(['page 1', 'page 2']), stages)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert [str(e) for e in errors] == ['complete_multipart_upload failed']
+    assert cancelled == [True]
+    assert not any(stage._thread.is_alive() for stage in stages)
+
+def test_opening_remainder_skips_the_spoken_prefix():
+    s3 = FakeS3()
+    opening = OpeningSynthesizer(FakePolly(s3), s3, 'bucket', 'doc', max_chars=300)
+    pages = ["--- PAGE 1 ---\nShort.", "\n--- PAGE 2 ---\n" + "A sentence of the second page. " * 40]
+
+    remainder = "".join(opening.remainder(opening.watch(iter(pages))))
+    info = opening.result()
+
+    assert info['characters'] == opening.characters == len(opening.prefix)
+    assert opening.prefix + remainder == "".join(pages)
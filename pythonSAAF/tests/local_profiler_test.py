@@ -0,0 +1,54 @@
+from pythonSAAF.src.profiler import (LocalProfileStore, Profiler, fit_runtime_model, predict_runtime,
+                                     recommend, vcpus)
+
+
+def synthetic_history():
+    """Samples from runtime = 200 + 80 * pages / vCPUs + 5 * pages, with some noise."""
+    samples = []
+    for memory in (512, 1024, 1769, 3538):
+        for pages in (5, 20, 50, 120):
+            for noise in (-0.03, 0.0, 0.03):
+                runtime = (200 + 80 * pages / vcpus(memory) + 5 * pages) * (1 + noise)
+                samples.append({'memory': memory, 'pages': pages, 'runtime': runtime, 'utilizedCPUs': 0.9})
+    return samples
+
+def test_fit_recovers_cpu_and_io_work():
+    model = fit_runtime_model(synthetic_history())
+
+    assert not model['cpuBound']
+    assert abs(model['cpuWork'] - 80) < 4
+    assert abs(model['ioWork'] - 5) < 2
+    assert abs(predict_runtime(model, 1769, 50) - (200 + 80 * 50 + 5 * 50)) < 200
+
+def test_recommendation_is_cheapest_setting_meeting_the_target():
+    history = synthetic_history()
+    result = recommend(history, pages=50, latency_slo_ms=3000)
+
+    assert result['meetsTarget']
+    chosen = result['predicted']
+    assert chosen['latency'] <= 3000
+    cheaper = [candidate for candidate in result['candidates'] if candidate['cost'] < chosen['cost']]
+    assert all(candidate['latency'] > 3000 for candidate in cheaper)
+
+    impossible = recommend(history, pages=50, target_pages_per_second=10000)
+    assert not impossible['meetsTarget']
+    assert impossible['recommendedMemory'] == max(candidate['memory'] for candidate in impossible['candidates'])
+
+def test_profiler_persists_invocation_samples(tmp_path):
+    store = LocalProfileStore(str(tmp_path / 'profiles.jsonl'))
+    profiler = Profiler(store)
+    attributes = {'uuid': 'container', 'functionMemory': '1024', 'runtime': 900, 'userRuntime': 880,
+                  'cpuUserDelta': 700, 'cpuKernelDelta': 60,
+                  'spans': [{'name': 'lambda_handler', 'runtime': 880, 'children': [{'name': 'download', 'runtime': 12}]}]}
+
+    profiler.observe_document(30, 90000, 0.8)
+    profiler.end_invocation(attributes)
+    # Invocations without a processed document leave no sample
+    profiler.end_invocation(attributes)
+
+    samples = store.load()
+    assert len(samples) == 1
+    sample = samples[0]
+    assert sample['memory'] == 1024 and sample['pages'] == 30 and sample['characters'] == 90000
+    assert sample['stages'] == {'lambda_handler': 880, 'lambda_handler/download': 12}
+    assert sample['utilizedCPUs'] == round(760 / 880, 3)
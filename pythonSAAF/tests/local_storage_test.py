@@ -0,0 +1,49 @@
+import gzip
+import json
+from pythonSAAF.src.storage import (LocalStorage, PagedTextWriter, S3Storage, index_key_for,
+                                    read_page, text_key_for)
+from pythonSAAF.tests.fakes import FakeS3
+
+
+def make_pages(count=25):
+    pages = [f"--- PAGE {page} ---\n" + f"Page {page} says something worth reading. " * 50 for page in range(1, count + 1)]
+    return [pages[0]] + ["\n" + page for page in pages[1:]]
+
+def test_paged_text_pages_are_range_readable():
+    s3 = FakeS3()
+    storage = S3Storage(s3, 'bucket')
+    # Paged text is opt-in; the default keeps the plain .txt key
+    assert text_key_for('docs/report.pdf') == 'extracted-text/docs/report.txt'
+    text_key = text_key_for('docs/report.pdf', text_format='paged')
+    assert text_key == 'extracted-text/docs/report.txt.gz'
+    assert index_key_for(text_key) == 'extracted-text/docs/report.index.json'
+
+    pages = make_pages()
+    with storage.text_writer(text_key, content_type='application/gzip') as writer:
+        paged = PagedTextWriter(writer)
+        for page in pages:
+            paged.write_page(page)
+    index = paged.index()
+
+    stored = s3.objects[('bucket', text_key)]['Body']
+    # The concatenated members are one ordinary .gz of the whole text
+    assert gzip.decompress(stored).decode('utf-8') == "".join(pages)
+    assert index['compressedBytes'] == len(stored) < len("".join(pages)) / 5
+    assert index['pageCount'] == len(pages)
+    for entry, page in zip(index['pages'], pages):
+        assert read_page(s3, 'bucket', text_key, entry) == page
+    assert json.loads(json.dumps(index)) == index
+
+def test_local_text_appears_only_when_complete(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    path = storage.location(text_key_for('report.pdf', text_format='plain'))
+
+    writer = storage.text_writer(text_key_for('report.pdf', text_format='plain'))
+    writer.write("partial text")
+    writer.abort()
+    assert not (tmp_path / 'extracted-text').joinpath('report.txt').exists()
+
+    with storage.text_writer(text_key_for('report.pdf', text_format='plain')) as writer:
+        writer.write("complete text")
+    with open(path, encoding='utf-8') as file:
+        assert file.read() == "complete text"
@@ -0,0 +1,34 @@
+import pytest
+from pythonSAAF.src.streaming import MULTIPART_PART_SIZE, S3MultipartWriter
+from pythonSAAF.tests.fakes import FakeS3
+
+
+def test_small_text_is_one_put_and_large_text_is_multipart():
+    s3 = FakeS3()
+    with S3MultipartWriter(s3, 'bucket', 'small.txt') as writer:
+        writer.write("x" * (MULTIPART_PART_SIZE - 1))
+    assert s3.calls == {'PutObject': 1}
+    assert len(s3.objects[('bucket', 'small.txt')]['Body']) == MULTIPART_PART_SIZE - 1
+
+    s3 = FakeS3()
+    page = "y" * (1024 * 1024)
+    with S3MultipartWriter(s3, 'bucket', 'large.txt') as writer:
+        for _ in range(MULTIPART_PART_SIZE // len(page) * 2 + 1):
+            writer.write(page)
+    assert 'PutObject' not in s3.calls
+    assert s3.calls['CreateMultipartUpload'] == 1
+    # Two full parts and the remainder sent on close
+    assert s3.calls['UploadPart'] == 3
+    assert s3.calls['CompleteMultipartUpload'] == 1
+    assert s3.objects[('bucket', 'large.txt')]['Body'] == page.encode('utf-8') * 17
+
+def test_failed_upload_is_aborted():
+    s3 = FakeS3()
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(s3, 'bucket', 'failed.txt') as writer:
+            writer.write("z" * (MULTIPART_PART_SIZE + 1))
+            raise RuntimeError("extraction failed")
+    assert s3.calls['UploadPart'] == 1
+    assert s3.calls['AbortMultipartUpload'] == 1
+    assert 'CompleteMultipartUpload' not in s3.calls
+    assert s3._uploads == {} and ('bucket', 'failed.txt') not in s3.objects
@@ -0,0 +1,92 @@
+import json
+import logging
+import time
+import pytest
+from pythonSAAF.src.synthesis import (iter_text_chunks, save_playlist, split_pages,
+                                      stitch_audio, synthesize_chunks)
+from pythonSAAF.src.tracking import TaskFailed
+from pythonSAAF.tests.fakes import FakePolly, FakeS3
+
+
+def make_document(pages=40, sentences_per_page=30):
+    return "\n".join(
+        f"\n--- PAGE {page} ---\n" + " ".join(
+            f"Sentence {sentence} of page {page} reads a little text aloud." for sentence in range(sentences_per_page)
+        )
+        for page in range(1, pages + 1)
+    ).strip()
+
+def test_chunks_respect_limit_and_keep_text():
+    text = make_document()
+    chunks = list(iter_text_chunks(split_pages(text), max_chars=5000))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 5000 for chunk in chunks)
+    assert "".join(chunks).split() == text.split()
+    # Every chunk but the last ends on a page or sentence boundary
+    assert all(chunk.rstrip().endswith('.') for chunk in chunks[:-1])
+
+def test_oversized_sentence_is_split():
+    chunks = list(iter_text_chunks(["word " * 2000], max_chars=1000))
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert " ".join(chunks).split() == ["word"] * 2000
+
+def test_concurrent_synthesis_is_ordered_and_bounded():
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=0.2)
+    chunks = list(iter_text_chunks(split_pages(make_document()), max_chars=5000))
+
+    start = time.time()
+    segments = synthesize_chunks(polly, chunks, 'bucket', 'doc', max_in_flight=len(chunks), poll_interval=0.01)
+    elapsed = time.time() - start
+
+    assert [segment['index'] for segment in segments] == list(range(len(chunks)))
+    assert all(('bucket', segment['key']) in s3.objects for segment in segments)
+    # All chunks ran side by side, so the wall time is close to a single task
+    assert elapsed < 0.2 * len(chunks) / 2
+
+    playlist_key = save_playlist(s3, 'bucket', 'doc', segments)
+    playlist = json.loads(s3.objects[('bucket', playlist_key)]['Body'])
+    assert [segment['key'] for segment in playlist['segments']] == [segment['key'] for segment in segments]
+
+    stitched_key = stitch_audio(s3, 'bucket', segments, 'audio/doc/document.mp3')
+    assert s3.objects[('bucket', stitched_key)]['Body'] == b''.join(
+        s3.objects[('bucket', segment['key'])]['Body'] for segment in segments
+    )
+
+def test_in_flight_tasks_are_bounded():
+    polly = FakePolly(FakeS3(), task_latency=0.05)
+    chunks = list(iter_text_chunks(split_pages(make_document(pages=10)), max_chars=3000))
+
+    segments = synthesize_chunks(polly, chunks, 'bucket', 'doc', max_in_flight=2, poll_interval=0.01)
+    assert len(segments) == len(chunks) > 4
+    assert polly.peak_in_flight == 2
+
+def test_failed_chunk_cancels_the_rest():
+    # Many more chunks than workers, so the cancelled ones outnumber any started during the failure
+    chunks = list(iter_text_chunks(split_pages(make_document(pages=10)), max_chars=500))
+    polly = FakePolly(FakeS3(), task_latency=0.05, fail_text="of page 1 ")
+
+    with pytest.raises(TaskFailed):
+        synthesize_chunks(polly, chunks, 'bucket', 'doc', max_in_flight=2, poll_interval=0.01)
+    # Chunks still queued behind the failed one were never sent to Polly
+    time.sleep(0.1)
+    assert polly.calls['StartSpeechSynthesisTask'] < len(chunks) // 2
+
+def test_wait_stops_at_the_deadline():
+    polly = FakePolly(FakeS3(), task_latency=0.5)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        synthesize_chunks(polly, ["One chunk.", "Another chunk."], 'bucket', 'doc', poll_interval=0.01,
+                          deadline=start + 0.1)
+    assert time.monotonic() - start < 0.4
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    test_chunks_respect_limit_and_keep_text()
+    test_oversized_sentence_is_split()
+    test_concurrent_synthesis_is_ordered_and_bounded()
+    test_in_flight_tasks_are_bounded()
+    test_failed_chunk_cancels_the_rest()
+    test_wait_stops_at_the_deadline()
+    print("Synthesis pipeline checks passed")
@@ -0,0 +1,88 @@
+import json
+import time
+import pytest
+from pythonSAAF.src import clients, handler
+from pythonSAAF.src.tracking import TaskFailed, TaskTracker, status_key_for
+from pythonSAAF.tests.fakes import FakePolly, FakeS3
+
+
+def test_tracker_checks_many_tasks_per_sweep():
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=0.1)
+    tasks = [polly.start_speech_synthesis_task(Text=f"Chunk {index}.", OutputS3BucketName='bucket',
+                                               OutputS3KeyPrefix=f"audio/doc/{index}")['SynthesisTask']
+             for index in range(10)]
+    tracker = TaskTracker(polly, poll_interval=0.01)
+
+    futures = [tracker.track(task['TaskId'], task['CreationTime']) for task in tasks]
+    results = [future.result(timeout=5) for future in futures]
+
+    assert [task['TaskStatus'] for task in results] == ['completed'] * 10
+    assert tracker.pending() == 0
+    # Running tasks are answered by the in-progress listing; each task is fetched about once, when it has finished
+    assert polly.calls['GetSpeechSynthesisTask'] <= 2 * len(tasks)
+    assert polly.calls['ListSpeechSynthesisTasks'] <= tracker.sweeps
+
+def test_listing_stops_at_the_oldest_tracked_task():
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=60)
+    # Other containers' tasks, started before ours, fill several pages
+    for index in range(250):
+        polly.start_speech_synthesis_task(Text="Other.", OutputS3BucketName='bucket', OutputS3KeyPrefix=f"other/{index}")
+    time.sleep(0.01)
+    ours = [polly.start_speech_synthesis_task(Text="Ours.", OutputS3BucketName='bucket',
+                                              OutputS3KeyPrefix=f"audio/doc/{index}")['SynthesisTask']
+            for index in range(3)]
+    tracker = TaskTracker(polly, poll_interval=60)
+    oldest = min(task['CreationTime'] for task in ours)
+
+    tasks = tracker._fetch({task['TaskId'] for task in ours}, {task['TaskId'] for task in ours}, oldest)
+    assert polly.calls['ListSpeechSynthesisTasks'] == 1
+    assert 'GetSpeechSynthesisTask' not in polly.calls
+    assert {task_id: task['TaskStatus'] for task_id, task in tasks.items()} == {
+        task['TaskId']: 'inProgress' for task in ours}
+
+def test_unknown_task_fails():
+    tracker = TaskTracker(FakePolly(FakeS3()), poll_interval=0.01)
+    with pytest.raises(TaskFailed):
+        tracker.wait('no-such-task')
+
+def test_status_index_is_finalized_after_the_invocation(monkeypatch):
+    monkeypatch.setattr(handler, 'NOTIFY_TOPIC_ARN', 'arn:aws:sns:us-east-1:123456789012:polly-tasks')
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=0.2)
+    clients.set_client('s3', s3)
+    clients.set_client('polly', polly)
+    try:
+        audio_info = handler.generate_audio_and_url(iter(["One short page."]), 'bucket', 'doc')
+        status = json.loads(s3.objects[('bucket', status_key_for('doc'))]['Body'])
+        assert status == {'status': 'pending', 'key': audio_info['audio_key'], 'tasks': [audio_info['task_id']],
+                          'updated': status['updated']}
+
+        # The task ends after the invocation returned, and Polly's notification completes the index
+        time.sleep(0.2)
+        message = polly.notification(audio_info['task_id'])
+        event = {'Records': [{'EventSource': 'aws:sns',
+                              'Sns': {'MessageId': 'message-1', 'Message': json.dumps(message)}}]}
+        result = handler.lambda_handler(event, None)
+        assert result['statusCode'] == 200 and result['batchItemFailures'] == []
+        status = json.loads(s3.objects[('bucket', status_key_for('doc'))]['Body'])
+        assert status['status'] == 'complete' and status['key'] == audio_info['audio_key']
+        assert ('bucket', status['key']) in s3.objects
+        # Nothing in the container polled the task
+        assert 'GetSpeechSynthesisTask' not in polly.calls
+    finally:
+        clients.reset_clients()
+
+def test_failed_task_notification_fails_the_index():
+    s3 = FakeS3()
+    polly = FakePolly(s3, task_latency=0, fail_text="broken")
+    task = polly.start_speech_synthesis_task(Text="A broken page.", OutputS3BucketName='bucket',
+                                             OutputS3KeyPrefix='audio/docs/report')['SynthesisTask']
+    key = f"audio/docs/report.{task['TaskId']}.mp3"
+    handler.write_status(s3, 'bucket', 'docs/report', 'pending', key, [task['TaskId']])
+
+    index = handler.finalize_from_notification(s3, polly.notification(task['TaskId']))
+    assert index['status'] == 'failed' and index['reason'] == 'Simulated failure'
+    # A repeated notification leaves the final index alone
+    assert handler.finalize_from_notification(s3, polly.notification(task['TaskId'])) is None
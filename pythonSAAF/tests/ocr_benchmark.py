@@ -0,0 +1,74 @@
+"""
+OCR throughput benchmark: pages per second against batch size.
+
+Transcribes the same pages with SmolVLM at each batch size and CPU weight
+type and reports pages/sec, generated tokens/sec and the model load time.
+The pages are the scanned images of a PDF, or image files.
+Needs the packages in pythonSAAF/requirements-ocr.txt.
+
+Usage:
+    python -m pythonSAAF.tests.ocr_benchmark [--pdf scanned.pdf | --images a.png b.png]
+                                             [--pages 8] [--batch-sizes 1 2 4 8] [--dtypes float32 int8]
+"""
+import argparse
+import json
+import os
+import time
+from pythonSAAF.src.ocr import SmolVLMTranscriber, page_image
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(__file__), '..', '..', 'smolVLM', 'rabbit.jpg')
+
+
+def load_pages(pdf_path, image_paths, count):
+    """Return `count` page images, repeating the inputs as needed."""
+    from PIL import Image
+    if pdf_path:
+        from pythonSAAF.src.extraction import open_pdf_reader
+        with open(pdf_path, 'rb') as pdf_file:
+            reader = open_pdf_reader(pdf_file)
+            images = [image for image in map(page_image, reader.pages) if image is not None]
+    else:
+        images = [Image.open(path).convert('RGB') for path in image_paths]
+    if not images:
+        raise SystemExit("No page images to transcribe")
+    return [images[index % len(images)] for index in range(count)]
+
+def measure(transcriber, images, batch_size):
+    tokens = transcriber.generated_tokens
+    start = time.perf_counter()
+    for first in range(0, len(images), batch_size):
+        transcriber.transcribe(images[first:first + batch_size])
+    elapsed = time.perf_counter() - start
+    return {
+        'batchSize': batch_size,
+        'pagesPerSecond': round(len(images) / elapsed, 3),
+        'tokensPerSecond': round((transcriber.generated_tokens - tokens) / elapsed, 1)
+    }
+
+def run(images, batch_sizes, dtypes, max_new_tokens):
+    results = {}
+    for dtype in dtypes:
+        transcriber = SmolVLMTranscriber(dtype=dtype, max_new_tokens=max_new_tokens)
+        start = time.perf_counter()
+        transcriber.load()
+        load_time = time.perf_counter() - start
+        # One untimed batch so one-off setup is not counted against the first batch size
+        transcriber.transcribe(images[:1])
+        results[dtype] = {
+            'loadTime': round(load_time, 2),
+            'batches': [measure(transcriber, images, batch_size) for batch_size in batch_sizes]
+        }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pdf', help="PDF whose page images are transcribed")
+    parser.add_argument('--images', nargs='+', default=[SAMPLE_IMAGE])
+    parser.add_argument('--pages', type=int, default=8)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--dtypes', nargs='+', default=['float32', 'int8'])
+    parser.add_argument('--max-new-tokens', type=int, default=200)
+    args = parser.parse_args()
+
+    images = load_pages(args.pdf, args.images, args.pages)
+    print(json.dumps(run(images, args.batch_sizes, args.dtypes, args.max_new_tokens), indent=2))
@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark for the SmolVLM OCR model.
+
+Each run starts a fresh interpreter, loads the model and transcribes one
+image with a single new token, so the time to first token includes the
+torch/transformers import and loading the weights. Three startup paths are
+compared:
+
+    hub         from_pretrained by model name, as smolVLM/main.py does
+    local       a local copy in --model-dir, loaded without network access
+    checkpoint  the local copy plus a converted checkpoint in --checkpoint-dir,
+                memory-mapped instead of converted again
+
+The local copy and checkpoint are prepared before the timed runs.
+Needs the packages in pythonSAAF/requirements-ocr.txt.
+
+Usage:
+    python -m pythonSAAF.tests.ocr_startup_benchmark [--runs N] [--dtype float32|int8]
+                                                     [--model-dir DIR] [--checkpoint-dir DIR]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(__file__), '..', '..', 'smolVLM', 'rabbit.jpg')
+METRICS = ['importTime', 'loadTime', 'timeToFirstToken']
+MODES = ['hub', 'local', 'checkpoint']
+
+
+def measure_once(dtype, model_dir, checkpoint_dir):
+    """Run inside the child interpreter and print one JSON measurement."""
+    start = time.perf_counter()
+    from pythonSAAF.src.ocr import SmolVLMTranscriber
+    import torch, transformers  # noqa: F401
+    import_time = time.perf_counter() - start
+    from PIL import Image
+    image = Image.open(SAMPLE_IMAGE).convert('RGB')
+
+    transcriber = SmolVLMTranscriber(dtype=dtype, max_new_tokens=1, model_dir=model_dir, checkpoint_dir=checkpoint_dir)
+    transcriber.load()
+    load_time = time.perf_counter() - start
+    transcriber.transcribe([image])
+    print(json.dumps({'importTime': import_time, 'loadTime': load_time,
+                      'timeToFirstToken': time.perf_counter() - start}))
+
+def run_mode(mode, runs, dtype, model_dir, checkpoint_dir):
+    arguments = ['--dtype', dtype]
+    if mode in ('local', 'checkpoint'):
+        arguments += ['--model-dir', model_dir]
+    if mode == 'checkpoint':
+        arguments += ['--checkpoint-dir', checkpoint_dir]
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-m', 'pythonSAAF.tests.ocr_startup_benchmark', '--child'] + arguments,
+            check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {metric: round(statistics.median(sample[metric] for sample in samples) * 1000, 2) for metric in METRICS}
+
+def run(runs, dtype, model_dir, checkpoint_dir):
+    from pythonSAAF.src.ocr import prepare
+    prepare(model_dir, checkpoint_dir, dtype=dtype)
+    results = {mode: run_mode(mode, runs, dtype, model_dir, checkpoint_dir) for mode in MODES}
+    results['runs'] = runs
+    results['dtype'] = dtype
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'int8'])
+    parser.add_argument('--model-dir', default=os.path.join(tempfile.gettempdir(), 'talkify-ocr-model'))
+    parser.add_argument('--checkpoint-dir', default=os.path.join(tempfile.gettempdir(), 'talkify-ocr-checkpoints'))
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_once(args.dtype, args.model_dir if '--model-dir' in sys.argv else '',
+                     args.checkpoint_dir if '--checkpoint-dir' in sys.argv else '')
+        sys.exit(0)
+
+    print(json.dumps(run(args.runs, args.dtype, args.model_dir, args.checkpoint_dir), indent=2))
@@ -0,0 +1,186 @@
+"""
+End-to-end benchmark of the PDF-to-audio pipeline.
+
+Every document is processed in a fresh interpreter that runs the handler
+against in-process S3/Polly stand-ins, so peak RSS is measured per document.
+Generated PDFs of 1 to 1000 pages and the PDFs in test_data/ are benchmarked;
+for each the script reports throughput (pages/sec), p50/p95 latency, peak RSS
+and the median time of every Inspector stage. Results can be saved as a
+baseline; later runs fail if they regress beyond the tolerance.
+
+Usage:
+    python -m pythonSAAF.tests.pipeline_benchmark [--runs N] [--pages 1 10 100 1000]
+                                                  [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pythonSAAF.src.profiler import stage_timings
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'benchmarks', 'pipeline_baseline.json')
+TEST_DATA = os.path.join(os.path.dirname(__file__), 'test_data')
+SAMPLE_PDFS = ['sample.pdf', 'sample2.pdf']
+PAGE_COUNTS = [1, 10, 100, 1000]
+GENERATED_DIR = os.path.join(tempfile.gettempdir(), 'talkify-benchmark-pdfs')
+
+LINES_PER_PAGE = 40
+
+
+def generate_pdf(path, pages, lines_per_page=LINES_PER_PAGE):
+    """Write a plain-text PDF with `pages` pages of Helvetica text."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # The page tree is filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_numbers = []
+    for page in range(1, pages + 1):
+        lines = [f"Page {page}, line {line}: the quick brown fox jumps over the lazy dog."
+                 for line in range(1, lines_per_page + 1)]
+        text = " T* ".join(f"({line}) Tj" for line in lines)
+        stream = f"BT /F1 11 Tf 14 TL 50 780 Td {text} ET".encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        page_numbers.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % number for number in page_numbers)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    with open(path, 'wb') as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+def benchmark_documents(page_counts):
+    """Return (name, path) of every document to benchmark, generating PDFs as needed."""
+    os.makedirs(GENERATED_DIR, exist_ok=True)
+    documents = []
+    for pages in page_counts:
+        path = os.path.join(GENERATED_DIR, f"generated-{pages}.pdf")
+        if not os.path.exists(path):
+            generate_pdf(path, pages)
+        documents.append((f"generated-{pages}", path))
+    for name in SAMPLE_PDFS:
+        documents.append((name.replace('.pdf', ''), os.path.join(TEST_DATA, name)))
+    return documents
+
+def measure_once(pdf_path, runs):
+    """Run inside the child interpreter and print one JSON measurement."""
+    # The stand-in Polly finishes tasks in milliseconds; don't wait seconds between polls.
+    # The full Inspector output carries the stage spans.
+    os.environ.setdefault('SYNTHESIS_POLL_INTERVAL', '0.01')
+    os.environ['INSPECTOR_FULL_OUTPUT'] = 'true'
+    os.environ['METRICS_FLUSH_INVOCATIONS'] = str(runs + 1)
+    from pythonSAAF.src import clients, handler
+    from pythonSAAF.tests.fakes import FakePolly, FakeS3
+    s3 = FakeS3()
+    clients.set_client('s3', s3)
+    clients.set_client('polly', FakePolly(s3))
+    with open(pdf_path, 'rb') as pdf_file:
+        s3.put_object(Bucket='benchmark', Key='document.pdf', Body=pdf_file.read())
+    event = {'Records': [{'s3': {'bucket': {'name': 'benchmark'}, 'object': {'key': 'document.pdf'}}}]}
+
+    latencies = []
+    stages = []
+    pages = None
+    for _ in range(runs):
+        # Drop the dedup manifests and cached audio so every run does the full amount of work
+        for key in [key for key in s3.objects if key[1].startswith(('manifests/', 'audio-cache/'))]:
+            del s3.objects[key]
+        start = time.perf_counter()
+        result = handler.lambda_handler(event, None)
+        latencies.append(time.perf_counter() - start)
+        assert result['statusCode'] == 200, result
+        pages = json.loads(result['body'])['Number of Pages']
+        stages.append(stage_timings(result['inspector'].get('spans', [])))
+
+    # Extraction workers are child processes; ru_maxrss is in KiB on Linux
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024
+    print(json.dumps({'pages': pages, 'latencies': latencies, 'peakRss': peak_rss, 'stages': stages}))
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))]
+
+def run_document(pdf_path, runs):
+    output = subprocess.run(
+        [sys.executable, '-m', 'pythonSAAF.tests.pipeline_benchmark', '--child', pdf_path, '--runs', str(runs)],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    ).stdout
+    sample = json.loads(output.strip().splitlines()[-1])
+
+    latencies = sample['latencies']
+    names = sorted({name for stages in sample['stages'] for name in stages})
+    return {
+        'pages': sample['pages'],
+        'pagesPerSecond': round(sample['pages'] / statistics.median(latencies), 2),
+        'p50Latency': round(percentile(latencies, 50) * 1000, 2),
+        'p95Latency': round(percentile(latencies, 95) * 1000, 2),
+        'peakRssMB': round(sample['peakRss'] / (1024 * 1024), 1),
+        'stages': {name: round(statistics.median(stages.get(name, 0) for stages in sample['stages']), 2)
+                   for name in names}
+    }
+
+def run(page_counts, runs):
+    return {
+        'runs': runs,
+        'documents': {name: run_document(path, runs) for name, path in benchmark_documents(page_counts)}
+    }
+
+def compare(results, baseline, tolerance):
+    """Return the documents whose throughput, latency or memory regressed by more than `tolerance`."""
+    regressions = []
+    for name, result in results['documents'].items():
+        expected = baseline.get('documents', {}).get(name)
+        if expected is None:
+            continue
+        if result['pagesPerSecond'] < expected['pagesPerSecond'] * (1 - tolerance):
+            regressions.append(f"{name} pagesPerSecond: {result['pagesPerSecond']} vs baseline {expected['pagesPerSecond']}")
+        for metric in ('p50Latency', 'p95Latency', 'peakRssMB'):
+            if result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {result[metric]} vs baseline {expected[metric]}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--pages', type=int, nargs='+', default=PAGE_COUNTS, help="page counts of the generated PDFs")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed regression, 0.25 = 25%%")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--child', metavar='PDF', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_once(args.child, args.runs)
+        sys.exit(0)
+
+    results = run(args.pages, args.runs)
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {BASELINE_FILE}")
+    elif os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Pipeline regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No pipeline regressions")
@@ -0,0 +1,107 @@
+"""
+Cold-start benchmark for the Lambda handler.
+
+Each run starts a fresh interpreter that imports the handler, then invokes it
+twice against in-process S3/Polly stand-ins: the first call measures the
+first-invocation latency (client creation, lazy PyPDF2 import) and the second
+the warm latency. The median of all runs is compared with a saved baseline.
+
+Usage:
+    python -m pythonSAAF.tests.startup_benchmark [--runs N] [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'benchmarks', 'startup_baseline.json')
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), 'test_data', 'sample.pdf')
+METRICS = ['importTime', 'firstInvocation', 'warmInvocation']
+
+
+def measure_once():
+    """Run inside the child interpreter and print one JSON measurement."""
+    # The stand-in Polly finishes tasks in milliseconds; don't wait seconds between polls
+    os.environ.setdefault('SYNTHESIS_POLL_INTERVAL', '0.01')
+    start = time.perf_counter()
+    from pythonSAAF.src import handler
+    import_time = time.perf_counter() - start
+    pdf_imported_at_load = 'PyPDF2' in sys.modules
+
+    from pythonSAAF.src import clients
+    from pythonSAAF.tests.fakes import FakePolly, FakeS3
+    s3 = FakeS3()
+    clients.set_client('s3', s3)
+    clients.set_client('polly', FakePolly(s3))
+    with open(SAMPLE_PDF, 'rb') as pdf_file:
+        s3.put_object(Bucket='benchmark', Key='sample.pdf', Body=pdf_file.read())
+    event = {'Records': [{'s3': {'bucket': {'name': 'benchmark'}, 'object': {'key': 'sample.pdf'}}}]}
+
+    timings = {'importTime': import_time, 'pdfImportedAtLoad': pdf_imported_at_load}
+    for name in ('firstInvocation', 'warmInvocation'):
+        # Drop the dedup manifests and cached audio so both calls do the full amount of work
+        for key in [key for key in s3.objects if key[1].startswith(('manifests/', 'audio-cache/'))]:
+            del s3.objects[key]
+        start = time.perf_counter()
+        result = handler.lambda_handler(event, None)
+        timings[name] = time.perf_counter() - start
+        assert result['statusCode'] == 200, result
+    print(json.dumps(timings))
+
+def run(runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-m', 'pythonSAAF.tests.startup_benchmark', '--child'],
+            check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {}
+    for metric in METRICS:
+        results[metric] = round(statistics.median(sample[metric] for sample in samples) * 1000, 2)
+    results['pdfImportedAtLoad'] = any(sample['pdfImportedAtLoad'] for sample in samples)
+    results['runs'] = runs
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return the metrics that are slower than the baseline by more than `tolerance`."""
+    regressions = []
+    for metric in METRICS:
+        if metric in baseline and results[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(f"{metric}: {results[metric]}ms vs baseline {baseline[metric]}ms")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_once()
+        sys.exit(0)
+
+    results = run(args.runs)
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_FILE), exist_ok=True)
+        with open(BASELINE_FILE, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {BASELINE_FILE}")
+    elif os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if results['pdfImportedAtLoad']:
+            regressions.append("PyPDF2 is imported when the handler module loads")
+        if regressions:
+            print("Startup regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No startup regressions")